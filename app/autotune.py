@@ -0,0 +1,208 @@
+"""
+Tunes the runtime for this machine: loads the configured classifiers, measures their forward passes on synthetic
+inputs of their input shape for every thread count and batch size of the sweep, and writes the fastest settings
+to a profile which the service applies at startup.
+
+    python -m app.autotune --threads 1 2 4 8 --batch-sizes 1 2 4 8 16 32 --max-latency-ms 200
+
+Thread pools are sized once per process, so every thread count is measured in fresh processes, APP_WORKERS of
+them at once like the served workers competing for the cores. Run it on the serving hardware with the serving
+APP_WORKERS and PREDICTION_MODEL_BACKEND, a profile is only applied where those, the CPU count and the GPUs match.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Optional
+
+import numpy as np
+
+from app.config import get_settings, logger, runtime_hardware
+
+settings = get_settings()
+
+MODELS = ["binary", "multiclass"]
+# Batch sizes within this fraction of the best throughput are as good, the smallest of them has the lowest latency
+THROUGHPUT_TOLERANCE = 0.95
+
+
+def default_thread_counts(app_workers: int) -> list[int]:
+    # Powers of two up to the worker's share of the cores, which is always tried itself
+    share = max(1, (os.cpu_count() or 1) // app_workers)
+    counts = [1]
+    while counts[-1] * 2 < share:
+        counts.append(counts[-1] * 2)
+    return sorted(set(counts + [share]))
+
+
+def measure_forward(classifier, batch_size: int, iterations: int, seed: int = 0) -> dict:
+    from app.services.prediction_service import model_input_size
+
+    width, height = model_input_size(classifier)
+    batch = np.random.default_rng(seed).random((batch_size, height, width, 3), dtype=np.float32)
+    batch *= 255 * settings.prediction_input_scale
+
+    classifier.predict(batch)
+    durations = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        classifier.predict(batch)
+        durations.append(time.perf_counter() - started)
+
+    durations = np.array(durations)
+    return {
+        "throughput": float(batch_size * iterations / durations.sum()),
+        "p50_ms": float(np.percentile(durations, 50) * 1000),
+        "p95_ms": float(np.percentile(durations, 95) * 1000),
+    }
+
+
+def measure(models: list[str], batch_sizes: list[int], iterations: int) -> dict:
+    """
+    Measures every batch size of the models with the thread counts of this process' settings.
+    """
+    from app.classifier_models import configure_devices, load_binary_classifier, load_multiclass_classifier
+
+    configure_devices()
+    loaders = {"binary": load_binary_classifier, "multiclass": load_multiclass_classifier}
+    results = {}
+    for model in models:
+        classifier = loaders[model]()
+        classifier.warmup()
+        results[model] = {
+            "version": classifier.version,
+            "batches": {
+                str(batch_size): measure_forward(classifier, batch_size, iterations) for batch_size in batch_sizes
+            },
+        }
+    return results
+
+
+def thread_settings(threads: int) -> dict:
+    if settings.prediction_model_backend == "tflite":
+        return {"prediction_tflite_threads": threads}
+    # A single inter-op thread, the classifiers' graphs are sequential and requests are batched instead
+    return {"tf_intra_op_threads": threads, "tf_inter_op_threads": 1, "omp_num_threads": threads}
+
+
+def measure_threads(threads: int, models: list[str], batch_sizes: list[int], iterations: int, processes: int) -> dict:
+    env = {
+        **os.environ,
+        **{field.upper(): str(value) for field, value in thread_settings(threads).items()},
+        "PREDICTION_MAX_BATCH_SIZE": str(max(batch_sizes)),
+        # Measure with the thread counts of the sweep, not with a previous profile
+        "AUTOTUNE_PROFILE_PATH": "",
+    }
+    command = [
+        sys.executable, "-m", "app.autotune", "--measure",
+        "--models", *models,
+        "--batch-sizes", *map(str, batch_sizes),
+        "--iterations", str(iterations),
+    ]
+    workers = [
+        subprocess.Popen(command, env=env, stdout=subprocess.PIPE, text=True, cwd=settings.project_root)
+        for _ in range(processes)
+    ]
+    outputs = [worker.communicate()[0] for worker in workers]
+    if any(worker.returncode for worker in workers):
+        raise RuntimeError(f"Measuring {threads} threads failed")
+
+    # The workers serve together, their throughputs add up and a request waits for the slowest
+    runs = [json.loads(output.strip().splitlines()[-1]) for output in outputs]
+    results = {}
+    for model in models:
+        results[model] = {
+            "version": runs[0][model]["version"],
+            "batches": {
+                batch_size: {
+                    "throughput": sum(run[model]["batches"][batch_size]["throughput"] for run in runs),
+                    "p50_ms": max(run[model]["batches"][batch_size]["p50_ms"] for run in runs),
+                    "p95_ms": max(run[model]["batches"][batch_size]["p95_ms"] for run in runs),
+                }
+                for batch_size in runs[0][model]["batches"]
+            },
+        }
+    return results
+
+
+def select_profile(measurements: dict[int, dict], max_latency_ms: Optional[float]) -> tuple[int, int]:
+    """
+    Picks the thread count and batch size with the best throughput over every model, normalized by the model's best
+    throughput so a fast model does not outweigh a slow one, among those whose p95 forward time fits the latency
+    budget. Returns the thread count and the smallest batch size within THROUGHPUT_TOLERANCE of the best.
+    """
+    models = next(iter(measurements.values())).keys()
+    best_throughput = {
+        model: max(
+            result["throughput"]
+            for threads in measurements.values()
+            for result in threads[model]["batches"].values()
+        )
+        for model in models
+    }
+
+    candidates = []
+    for threads, results in measurements.items():
+        for batch_size in next(iter(results.values()))["batches"]:
+            batches = [results[model]["batches"][batch_size] for model in models]
+            if max_latency_ms is not None and max(batch["p95_ms"] for batch in batches) > max_latency_ms:
+                continue
+            score = sum(batch["throughput"] / best_throughput[model] for model, batch in zip(models, batches))
+            candidates.append((score, threads, int(batch_size)))
+    if not candidates:
+        raise ValueError(f"No thread count and batch size fits the {max_latency_ms} ms latency budget")
+
+    best_score = max(score for score, _, _ in candidates)
+    _, threads, batch_size = min(
+        (candidate for candidate in candidates if candidate[0] >= best_score * THROUGHPUT_TOLERANCE),
+        key=lambda candidate: (candidate[2], -candidate[0])
+    )
+    return threads, batch_size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--models", nargs="+", choices=MODELS, default=MODELS)
+    parser.add_argument("--threads", type=int, nargs="+", help="Thread counts, defaults to powers of two up to "
+                                                               "the worker's share of the cores")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32, 64])
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--max-latency-ms", type=float, help="Budget of the p95 forward pass of a full batch")
+    parser.add_argument("--output", default=settings.autotune_profile_path or "autotune_profile.json",
+                        help="Profile path, relative to the project root")
+    parser.add_argument("--measure", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        print(json.dumps(measure(args.models, args.batch_sizes, args.iterations)))
+        return
+
+    measurements = {}
+    for threads in args.threads or default_thread_counts(settings.app_workers):
+        logger.info(f"Measuring {args.models} with {threads} threads in {settings.app_workers} processes")
+        measurements[threads] = measure_threads(
+            threads, args.models, args.batch_sizes, args.iterations, settings.app_workers
+        )
+
+    threads, batch_size = select_profile(measurements, args.max_latency_ms)
+    profile = {
+        "hardware": runtime_hardware(settings.app_workers, settings.prediction_model_backend),
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "model_versions": {model: results["version"] for model, results in measurements[threads].items()},
+        "settings": {**thread_settings(threads), "prediction_max_batch_size": batch_size},
+        "max_latency_ms": args.max_latency_ms,
+        "measurements": measurements,
+    }
+
+    output_path = os.path.join(settings.project_root, args.output)
+    with open(output_path, "w") as profile_file:
+        json.dump(profile, profile_file, indent=2)
+    logger.info(f"Wrote autotune profile {output_path}")
+    print(json.dumps(profile["settings"], indent=2))
+
+
+if __name__ == "__main__":
+    main()
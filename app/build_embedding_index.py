@@ -0,0 +1,114 @@
+"""
+Builds the reference index of similar image search: every image of a folder is embedded with the penultimate
+layer of the configured multiclass classifier, and the embeddings are written as a memory-mapped float16 matrix.
+
+    python -m app.build_embedding_index --images-dir prediction_models --output embeddings
+
+Large reference sets can be indexed for approximate search, with inverted lists and product quantization:
+
+    python -m app.build_embedding_index --images-dir references --ivf-lists 1024 --pq-subspaces 32
+
+The service searches the index with EMBEDDING_INDEX_PATH set to the output directory. An index only answers
+queries of the model version it was built with, rebuild it whenever the multiclass model changes.
+"""
+import argparse
+import json
+import os
+import pathlib
+
+import numpy as np
+
+from app.classifier_models import model_version
+from app.config import get_settings, logger
+from app.services.embedding_index import EmbeddingIndex
+from app.services.prediction_service import model_input_size, prepare_input_tensor
+
+settings = get_settings()
+
+IMAGE_SUFFIXES = {".jpg", ".jpeg", ".png", ".webp"}
+
+
+def reference_images(directory: str) -> list[tuple[pathlib.Path, dict]]:
+    # Images of a sub-folder are labelled with the folder's name, e.g. references/Renard/0001.jpg
+    root = pathlib.Path(directory)
+    paths = sorted(path for path in root.rglob("*") if path.suffix.lower() in IMAGE_SUFFIXES)
+    return [
+        (path, {
+            "reference": path.relative_to(root).as_posix(),
+            "label": path.parent.name if path.parent != root else None,
+        })
+        for path in paths
+    ]
+
+
+def embed_images(embedder, paths: list[pathlib.Path], batch_size: int) -> np.ndarray:
+    input_size = model_input_size(embedder)
+    embeddings = []
+    for start in range(0, len(paths), batch_size):
+        batch = np.concatenate([
+            prepare_input_tensor(path.read_bytes(), input_size) for path in paths[start:start + batch_size]
+        ])
+        embeddings.append(embedder.predict(batch))
+        logger.info(f"Embedded {min(start + batch_size, len(paths))}/{len(paths)} images")
+    return np.concatenate(embeddings)
+
+
+def build_index(
+        images_dir: str,
+        output: str,
+        ivf_lists: int,
+        pq_subspaces: int,
+        batch_size: int
+) -> dict:
+    import keras
+    from app.services.inference_service import embedding_model
+
+    model_path = os.path.join(settings.project_root, settings.wildlens_footprint_multiclass_classifier_model_path)
+    embedder = embedding_model(keras.models.load_model(model_path), settings.embedding_layer_name)
+
+    images = reference_images(images_dir)
+    if not images:
+        raise ValueError(f"No images found in {images_dir}")
+    embeddings = embed_images(embedder, [path for path, _ in images], batch_size)
+
+    output_path = os.path.join(settings.project_root, output)
+    version = model_version(model_path)
+    EmbeddingIndex.build(
+        output_path,
+        embeddings,
+        [reference for _, reference in images],
+        version,
+        ivf_lists=ivf_lists,
+        pq_subspaces=pq_subspaces
+    )
+    logger.info(f"Wrote the embeddings of {len(images)} images to {output_path}")
+
+    return {
+        "output": output_path,
+        "model_version": version,
+        "images": len(images),
+        "dimension": int(embeddings.shape[1]),
+        "ivf_lists": ivf_lists,
+        "pq_subspaces": pq_subspaces,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--images-dir", default=os.path.join(settings.project_root, "prediction_models"))
+    parser.add_argument("--output", default="embeddings", help="Index directory, relative to the project root")
+    parser.add_argument("--ivf-lists", type=int, default=0, help="Inverted lists of approximate search, 0 for exact")
+    parser.add_argument("--pq-subspaces", type=int, default=0,
+                        help="Product quantization subspaces pre-scoring the candidates, needs --ivf-lists")
+    parser.add_argument("--batch-size", type=int, default=settings.prediction_max_batch_size)
+    args = parser.parse_args()
+
+    if args.pq_subspaces and not args.ivf_lists:
+        parser.error("--pq-subspaces needs --ivf-lists")
+
+    report = build_index(args.images_dir, args.output, args.ivf_lists, args.pq_subspaces, args.batch_size)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
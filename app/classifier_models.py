@@ -1,38 +1,119 @@
+import hashlib
 import os
+from typing import Optional
 
-import keras
-import tensorflow as tf
-
-from app.config import get_settings
+from app.config import get_settings, logger
 
 settings = get_settings()
 
-gpus = tf.config.list_physical_devices('GPU')
-if gpus:
-  # Restrict TensorFlow to only use the first GPU
-  try:
-    tf.config.set_visible_devices(gpus[0], 'GPU')
-    logical_gpus = tf.config.list_logical_devices('GPU')
-    tf.config.experimental.set_memory_growth(gpus[0], True)
-  except RuntimeError as e:
-    # Visible devices must be set before GPUs have been initialized
-    print(e)
+# TensorFlow and Keras are imported lazily, so importing the application does not load them
 
 
-# Model which predicts whether an image contains a footprint or not
-project_root = settings.project_root
+def configure_devices():
+    if settings.omp_num_threads:
+        # Read by the OpenMP runtime when it starts, so before TensorFlow is loaded
+        os.environ["OMP_NUM_THREADS"] = str(settings.omp_num_threads)
+
+    if settings.prediction_model_backend == "tflite":
+        # TFLite interpreters run on the CPU with their own thread count, TensorFlow is not loaded at all
+        return
+
+    import tensorflow as tf
+
+    # Thread pools and devices can only be configured before the TensorFlow runtime is initialized,
+    # which listing the logical devices or running any op does
+    intra_op_threads = settings.tf_intra_op_threads
+    inter_op_threads = settings.tf_inter_op_threads
+    if settings.app_workers > 1:
+        # Share the cores between workers instead of sizing every worker's thread pools for the whole machine
+        threads = max(1, (os.cpu_count() or 1) // settings.app_workers)
+        intra_op_threads = intra_op_threads or threads
+        inter_op_threads = inter_op_threads or min(2, threads)
+    try:
+        if intra_op_threads:
+            tf.config.threading.set_intra_op_parallelism_threads(intra_op_threads)
+        if inter_op_threads:
+            tf.config.threading.set_inter_op_parallelism_threads(inter_op_threads)
+    except RuntimeError as e:
+        logger.warning(f"TensorFlow thread pools keep their default size, the runtime is already initialized: {e}")
+
+    gpus = tf.config.list_physical_devices('GPU')
+    if gpus:
+      # Restrict TensorFlow to only use the first GPU
+      try:
+        tf.config.set_visible_devices(gpus[0], 'GPU')
+        tf.config.experimental.set_memory_growth(gpus[0], True)
+      except RuntimeError as e:
+        # Visible devices must be set before GPUs have been initialized
+        print(e)
+
+
+def model_version(path: str) -> str:
+    # Content digest, so every worker and host reports the same version for the same file
+    if os.path.isdir(path):
+        digest = hashlib.blake2b(str(os.stat(path).st_mtime_ns).encode(), digest_size=6)
+    else:
+        with open(path, "rb") as model_file:
+            digest = hashlib.file_digest(model_file, lambda: hashlib.blake2b(digest_size=6))
+    return digest.hexdigest()
+
+
+def load_classifier(model_path: str):
+    if settings.prediction_model_backend == "tflite":
+        return load_tflite_classifier(model_path)
+
+    import keras
+    from app.services.inference_service import CompiledClassifier
+
+    path = os.path.join(settings.project_root, model_path)
+    model = keras.models.load_model(filepath=path)
+
+    classifier = CompiledClassifier(model, settings.prediction_max_batch_size)
+    classifier.source_path = path
+    classifier.version = model_version(path)
+    logger.info(f"Loaded model {model.name} version {classifier.version} from {model_path}")
 
-binary_classifier_path = os.path.join(
-    project_root,
-    settings.wildlens_footprint_binary_classifier_model_path
-)
+    return classifier
+
+
+def load_tflite_classifier(model_path: str):
+    from app.services.tflite_inference_service import TFLiteClassifier, tflite_model_path
+
+    path = os.path.join(settings.project_root, tflite_model_path(model_path))
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"TFLite model {path} not found, export it with python -m app.export_models")
+
+    classifier = TFLiteClassifier(path, settings.prediction_max_batch_size)
+    classifier.source_path = path
+    classifier.version = model_version(path)
+    logger.info(f"Loaded TFLite model {classifier.name} version {classifier.version} from {path}")
+
+    return classifier
+
+
+# Model which predicts whether an image contains a footprint or not
+def load_binary_classifier(model_path: Optional[str] = None):
+    return load_classifier(model_path or settings.wildlens_footprint_binary_classifier_model_path)
 
-binary_classifier_model = keras.models.load_model(filepath=binary_classifier_path)
 
 # Model which classifies a footprint image into classes of species
+def load_multiclass_classifier(model_path: Optional[str] = None):
+    return load_classifier(model_path or settings.wildlens_footprint_multiclass_classifier_model_path)
+
+
+# Penultimate layer of a loaded multiclass classifier, whose embeddings find similar reference images
+def load_embedder(classifier):
+    if not hasattr(classifier, "model"):
+        raise ValueError("Image embeddings need the keras model backend")
+
+    from app.services.inference_service import CompiledClassifier, embedding_model
+
+    embedder = CompiledClassifier(
+        embedding_model(classifier.model, settings.embedding_layer_name),
+        settings.prediction_max_batch_size
+    )
+    embedder.source_path = classifier.source_path
+    embedder.version = classifier.version
+    logger.info(f"Embedding images with layer outputs of {classifier.name} version {classifier.version}")
 
-multiclass_classifier_path = os.path.join(
-    project_root,
-    settings.wildlens_footprint_multiclass_classifier_model_path
-)
-multiclass_classifier_model = keras.models.load_model(multiclass_classifier_path)
\ No newline at end of file
+    return embedder
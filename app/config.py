@@ -1,6 +1,8 @@
 import os
+import json
 import logging
 import pathlib
+import platform
 from functools import lru_cache
 from typing import List, Optional
 
@@ -11,12 +13,54 @@ from pydantic_settings import BaseSettings, SettingsConfigDict
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Settings a profile written by python -m app.autotune may set
+TUNED_SETTINGS = (
+    "tf_intra_op_threads",
+    "tf_inter_op_threads",
+    "omp_num_threads",
+    "prediction_tflite_threads",
+    "prediction_max_batch_size",
+)
+
+
+def gpu_names() -> list[str]:
+    # NVML lists the GPUs without initializing TensorFlow, CPU-only nodes have no NVML library or driver
+    try:
+        import pynvml
+        pynvml.nvmlInit()
+    except Exception:
+        return []
+    try:
+        names = [
+            pynvml.nvmlDeviceGetName(pynvml.nvmlDeviceGetHandleByIndex(index))
+            for index in range(pynvml.nvmlDeviceGetCount())
+        ]
+        return [name.decode() if isinstance(name, bytes) else name for name in names]
+    except Exception:
+        return []
+    finally:
+        pynvml.nvmlShutdown()
+
+
+def runtime_hardware(app_workers: int, model_backend: str) -> dict:
+    """
+    What a tuned profile depends on, a profile tuned for other hardware or another worker count is not applied.
+    """
+    return {
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "gpus": gpu_names(),
+        "app_workers": app_workers,
+        "model_backend": model_backend,
+    }
+
 
 class Settings(BaseSettings):
     # Environment
     environment: str = Field(default="development", description="Runtime environment")
     debug: bool = Field(default=True, description="Debug mode")
     app_port: int = Field(default=5002, description="Application port")
+    app_workers: int = Field(default=1, ge=1, description="Number of worker processes serving the application")
 
     # Wildlens API Configuration
     wildlens_prediction_api_key: Optional[str] = Field(
@@ -25,6 +69,12 @@ class Settings(BaseSettings):
         validation_alias="WILDLENS_PREDICTION_API_KEY"
     )
 
+    wildlens_prediction_admin_api_key: Optional[str] = Field(
+        default=None,
+        description="Key required by the admin endpoints, which are disabled when it is not set",
+        validation_alias="WILDLENS_PREDICTION_ADMIN_API_KEY"
+    )
+
     # Model Paths
     wildlens_footprint_multiclass_classifier_model_path: Optional[str] = Field(
         default=None,
@@ -36,6 +86,85 @@ class Settings(BaseSettings):
         description="Path to the binary classifier model",
         validation_alias="WILDLENS_FOOTPRINT_BINARY_CLASSIFIER_MODEL_PATH"
     )
+    prediction_model_backend: str = Field(
+        default="keras",
+        description="Runtime of the classifiers: keras, or tflite to run the models exported by app.export_models"
+    )
+    prediction_tflite_threads: Optional[int] = Field(
+        default=None,
+        ge=1,
+        description="Threads of each TFLite interpreter, defaults to the worker's share of the cores"
+    )
+    prediction_tflite_shared_weights: bool = Field(
+        default=False,
+        description="Run TFLite models with the built-in kernels only. They read the weights from the read-only "
+                    "memory mapping of the model file, which every worker process shares through the page cache. "
+                    "The default XNNPACK delegate is faster but packs a private copy of the weights per interpreter, "
+                    "that is per model, inference thread and worker process"
+    )
+    candidate_binary_model_path: Optional[str] = Field(
+        default=None,
+        description="Path to a candidate version of the binary classifier, compared with the primary one"
+    )
+    candidate_multiclass_model_path: Optional[str] = Field(
+        default=None,
+        description="Path to a candidate version of the multiclass classifier, compared with the primary one"
+    )
+    candidate_canary_percent: float = Field(
+        default=0,
+        ge=0,
+        le=100,
+        description="Percentage of the predictions served by the candidate models instead of the primary ones"
+    )
+    candidate_shadow_percent: float = Field(
+        default=100,
+        ge=0,
+        le=100,
+        description="Percentage of the primary predictions replayed on the candidate models in the background"
+    )
+    candidate_shadow_max_pending: int = Field(
+        default=64,
+        ge=1,
+        description="Maximum number of pending shadow predictions, further ones are dropped"
+    )
+    candidate_shadow_max_wait_ms: float = Field(
+        default=200,
+        gt=0,
+        description="Estimated wait of the primary or the canary model above which shadow predictions are dropped"
+    )
+    model_watch_interval_seconds: float = Field(
+        default=0,
+        ge=0,
+        description="Interval in seconds between checks of the model files, which are reloaded when they change. "
+                    "0 disables the watcher"
+    )
+    model_reload_drain_seconds: float = Field(
+        default=30,
+        ge=0,
+        description="Time in seconds given to in-flight requests to finish on the previous model version after a reload"
+    )
+
+    # Runtime Tuning Configuration
+    tf_intra_op_threads: Optional[int] = Field(
+        default=None,
+        ge=1,
+        description="Threads of TensorFlow's intra-op pool, defaults to the worker's share of the cores"
+    )
+    tf_inter_op_threads: Optional[int] = Field(
+        default=None,
+        ge=1,
+        description="Threads of TensorFlow's inter-op pool, defaults to at most 2 with several workers"
+    )
+    omp_num_threads: Optional[int] = Field(
+        default=None,
+        ge=1,
+        description="OMP_NUM_THREADS exported before TensorFlow is loaded, for its OpenMP kernels"
+    )
+    autotune_profile_path: Optional[str] = Field(
+        default="autotune_profile.json",
+        description="Profile written by python -m app.autotune, relative to the project root. "
+                    "Applied at startup when it exists, settings given in the environment take precedence"
+    )
 
     # API Configuration
     api_prefix: str = Field(
@@ -43,6 +172,258 @@ class Settings(BaseSettings):
         description="Prefix for API routes"
     )
 
+    # Batching Configuration
+    prediction_max_batch_size: int = Field(
+        default=16,
+        ge=1,
+        description="Maximum number of requests grouped into a single forward pass"
+    )
+    prediction_max_batch_wait_ms: float = Field(
+        default=5.0,
+        ge=0,
+        description="Maximum time in milliseconds a request waits for a batch to fill"
+    )
+
+    # Preprocessing Configuration
+    prediction_default_input_size: int = Field(
+        default=224,
+        ge=1,
+        description="Input size used when a model does not declare a fixed input height and width"
+    )
+    prediction_input_scale: float = Field(
+        default=1.0,
+        gt=0,
+        description="Factor applied to pixel values after conversion to float32"
+    )
+    prediction_decoder_backend: str = Field(
+        default="auto",
+        description="Image decoder: auto, pillow, turbojpeg or tensorflow. "
+                    "auto uses libjpeg-turbo when PyTurboJPEG is installed and PIL otherwise"
+    )
+
+    # Cascade Configuration
+    cascade_footprint_threshold: float = Field(
+        default=0.5,
+        ge=0,
+        le=1,
+        description="Binary footprint probability above which the multiclass classifier runs"
+    )
+
+    # Multiclass Output Configuration
+    multiclass_class_labels: List[str] = Field(
+        default=[],
+        description="Names of the multiclass classifier's classes in output order, used by top_k responses. "
+                    "Classes without a name are labelled with their index"
+    )
+
+    # Similar Image Configuration
+    embedding_index_path: Optional[str] = Field(
+        default=None,
+        description="Directory of the reference image index built with python -m app.build_embedding_index, "
+                    "relative to the project root. Similar image search is disabled without it"
+    )
+    embedding_layer_name: Optional[str] = Field(
+        default=None,
+        description="Layer of the multiclass classifier whose outputs are the image embeddings, the penultimate one by default"
+    )
+    embedding_max_k: int = Field(
+        default=50,
+        ge=1,
+        description="Maximum number of similar images returned by one query"
+    )
+    embedding_ivf_probes: int = Field(
+        default=8,
+        ge=1,
+        description="Number of inverted lists searched per query by an approximate index"
+    )
+    embedding_rerank_candidates: int = Field(
+        default=256,
+        ge=1,
+        description="Number of candidates pre-selected with product quantization codes and scored exactly"
+    )
+
+    # Cache Configuration
+    prediction_cache_enabled: bool = Field(
+        default=True,
+        description="Reuse predictions of identical uploads"
+    )
+    prediction_cache_max_entries: int = Field(
+        default=10000,
+        ge=1,
+        description="Maximum number of cached predictions"
+    )
+    prediction_cache_max_bytes: int = Field(
+        default=16 * 1024 * 1024,
+        ge=1,
+        description="Maximum size in bytes of the cached predictions"
+    )
+    prediction_cache_ttl_seconds: float = Field(
+        default=3600,
+        gt=0,
+        description="Time in seconds after which a cached prediction expires"
+    )
+
+    # Near-duplicate Configuration
+    prediction_dedupe_enabled: bool = Field(
+        default=False,
+        description="Reuse the prediction of a recent near-identical image, such as the frames of a burst"
+    )
+    prediction_dedupe_max_distance: int = Field(
+        default=4,
+        ge=0,
+        le=64,
+        description="Maximum number of differing bits between the 64 bits perceptual hashes of near-identical images"
+    )
+    prediction_dedupe_window_seconds: float = Field(
+        default=10,
+        gt=0,
+        description="Time in seconds during which a prediction is reused for near-identical images"
+    )
+    prediction_dedupe_max_entries: int = Field(
+        default=1024,
+        ge=1,
+        description="Number of recent image hashes kept per model"
+    )
+
+    # Upload Configuration
+    upload_max_bytes: int = Field(
+        default=20 * 1024 * 1024,
+        ge=1,
+        description="Maximum size in bytes of an uploaded image"
+    )
+    upload_max_pixels: int = Field(
+        default=50_000_000,
+        ge=1,
+        description="Maximum number of pixels (width x height) of an uploaded image"
+    )
+    upload_allowed_formats: List[str] = Field(
+        default=["JPEG", "PNG", "WEBP"],
+        description="Image formats accepted by the prediction routes, as detected from their magic bytes"
+    )
+
+    # Bulk Prediction Configuration
+    batch_max_files: int = Field(
+        default=1000,
+        ge=1,
+        description="Maximum number of images processed in one bulk request, extra files are reported as skipped"
+    )
+    batch_max_file_bytes: int = Field(
+        default=20 * 1024 * 1024,
+        ge=1,
+        description="Maximum size in bytes of a single image in a bulk request"
+    )
+
+    # Prediction Job Configuration
+    jobs_enabled: bool = Field(
+        default=True,
+        description="Whether this process drains the prediction job queue"
+    )
+    jobs_database_path: str = Field(
+        default="jobs/prediction_jobs.sqlite3",
+        description="SQLite database of the prediction job queue, relative to the project root, shared by the workers of a host"
+    )
+    jobs_max_files: int = Field(
+        default=10000,
+        ge=1,
+        description="Maximum number of images in one prediction job, extra files are reported as skipped"
+    )
+    jobs_concurrency: int = Field(
+        default=2,
+        ge=1,
+        description="Number of job batches a process predicts concurrently"
+    )
+    jobs_poll_interval_seconds: float = Field(
+        default=0.2,
+        gt=0,
+        description="Interval in seconds between two checks of the job queue when it is empty, and of a long-polled job"
+    )
+    jobs_max_wait_seconds: float = Field(
+        default=30,
+        ge=0,
+        description="Longest time in seconds a client can long-poll a job for"
+    )
+    jobs_claim_timeout_seconds: float = Field(
+        default=300,
+        gt=0,
+        description="Time in seconds after which images claimed by a worker that died are queued again"
+    )
+    jobs_retention_seconds: float = Field(
+        default=86400,
+        gt=0,
+        description="Time in seconds finished jobs and their results are kept"
+    )
+
+    # Websocket Configuration
+    ws_max_in_flight: int = Field(
+        default=32,
+        ge=1,
+        description="Maximum number of binary frames of one websocket connection predicted concurrently"
+    )
+
+    # Executor Configuration
+    prediction_decode_workers: int = Field(
+        default=4,
+        ge=1,
+        description="Number of threads decoding uploaded images"
+    )
+    prediction_inference_workers: int = Field(
+        default=1,
+        ge=1,
+        description="Number of threads running model forward passes"
+    )
+    prediction_max_in_flight: int = Field(
+        default=64,
+        ge=1,
+        description="Maximum number of predictions processed concurrently before rejecting with 503"
+    )
+    prediction_retry_after_seconds: int = Field(
+        default=1,
+        ge=0,
+        description="Retry-After value returned when the prediction service is overloaded"
+    )
+
+    # Deadline and Load Shedding Configuration
+    prediction_default_timeout_ms: float = Field(
+        default=10000,
+        ge=0,
+        description="Deadline of prediction requests without an X-Request-Timeout-Ms header, 0 for none"
+    )
+    prediction_max_timeout_ms: float = Field(
+        default=60000,
+        gt=0,
+        description="Longest deadline a client can ask for with the X-Request-Timeout-Ms header"
+    )
+    prediction_shed_queue_depth: int = Field(
+        default=256,
+        ge=1,
+        description="Number of inputs queued for a model above which normal priority requests are shed with 503"
+    )
+    prediction_shed_max_wait_ms: float = Field(
+        default=2000,
+        gt=0,
+        description="Estimated wait for a model above which normal priority requests are shed with 503"
+    )
+    prediction_shed_low_priority_fraction: float = Field(
+        default=0.5,
+        gt=0,
+        le=1,
+        description="Fraction of the shedding limits above which low priority requests are already shed"
+    )
+
+    # Metrics Configuration
+    system_metrics_interval_seconds: float = Field(
+        default=5.0,
+        gt=0,
+        description="Interval in seconds between two samples of the CPU, memory and GPU usage"
+    )
+
+    # Profiling Configuration
+    profiling_max_seconds: float = Field(
+        default=60,
+        gt=0,
+        description="Maximum duration in seconds of a profile captured from the admin endpoint"
+    )
+
     # Computed properties
     @property
     def project_root(self) -> pathlib.Path:
@@ -54,7 +435,8 @@ class Settings(BaseSettings):
         return [
             "/docs",
             "/openapi.json",
-            "/metrics"
+            "/metrics",
+            "/health"
         ]
 
     @property
@@ -78,6 +460,22 @@ class Settings(BaseSettings):
             raise ValueError(f'Environment must be one of: {allowed}')
         return v.lower()
 
+    @field_validator('prediction_decoder_backend')
+    @classmethod
+    def validate_prediction_decoder_backend(cls, v: str) -> str:
+        allowed = ['auto', 'pillow', 'turbojpeg', 'tensorflow']
+        if v.lower() not in allowed:
+            raise ValueError(f'Prediction decoder backend must be one of: {allowed}')
+        return v.lower()
+
+    @field_validator('prediction_model_backend')
+    @classmethod
+    def validate_prediction_model_backend(cls, v: str) -> str:
+        allowed = ['keras', 'tflite']
+        if v.lower() not in allowed:
+            raise ValueError(f'Prediction model backend must be one of: {allowed}')
+        return v.lower()
+
     @field_validator('wildlens_footprint_multiclass_classifier_model_path')
     @classmethod
     def validate_multiclass_model_path(cls, v: Optional[str]) -> Optional[str]:
@@ -118,6 +516,38 @@ class Settings(BaseSettings):
                 raise ValueError('WILDLENS_FOOTPRINT_BINARY_CLASSIFIER_MODEL_PATH is required in production')
         return self
 
+    @model_validator(mode='after')
+    def apply_autotune_profile(self) -> 'Settings':
+        if not self.autotune_profile_path:
+            return self
+        path = self.project_root / self.autotune_profile_path
+        if not path.exists():
+            return self
+        try:
+            profile = json.loads(path.read_text())
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable autotune profile {path}: {e}")
+            return self
+
+        hardware = runtime_hardware(self.app_workers, self.prediction_model_backend)
+        if profile.get("hardware") != hardware:
+            logger.warning(
+                f"Ignoring autotune profile {path} tuned for {profile.get('hardware')}, running on {hardware}, "
+                f"run python -m app.autotune again"
+            )
+            return self
+
+        # Fields set explicitly, from the environment or the .env file, win over the profile
+        tuned = {
+            field: value
+            for field, value in profile.get("settings", {}).items()
+            if field in TUNED_SETTINGS and field not in self.model_fields_set
+        }
+        for field, value in tuned.items():
+            setattr(self, field, value)
+        logger.info(f"Applied autotune profile {path}: {tuned}")
+        return self
+
     def __post_init__(self):
         # Log model paths after initialization
         if self.wildlens_footprint_multiclass_classifier_model_path:
@@ -191,6 +621,8 @@ class TestingSettings(Settings):
         default="tests/fixtures/mock_binary_model.keras",
         description="Mock binary model path for testing"
     )
+    # Tests run with the default tuning whatever was tuned on the machine
+    autotune_profile_path: Optional[str] = None
 
 
 @lru_cache()
@@ -1,8 +1,65 @@
+from typing import Optional
+
 from pydantic import BaseModel
 
 
 class BinaryClassifierPredictionResponse(BaseModel):
     predictions: list[float]
+    model_version: str
+
+class LabelScore(BaseModel):
+    label: str
+    score: float
 
 class MulticlassClassifierPredictionResponse(BaseModel):
-    predictions: list[float]
+    # Either every class probability, or only the top_k best classes when asked for
+    predictions: Optional[list[float]] = None
+    top_k: Optional[list[LabelScore]] = None
+    model_version: str
+
+class CascadePredictionResponse(BaseModel):
+    footprint_probability: float
+    is_footprint: bool
+    predictions: Optional[list[float]] = None
+    top_k: Optional[list[LabelScore]] = None
+    binary_model_version: str
+    multiclass_model_version: Optional[str] = None
+
+class BatchPredictionItem(BaseModel):
+    predictions: Optional[list[float]] = None
+    model_version: Optional[str] = None
+    error: Optional[str] = None
+
+class BatchPredictionResponse(BaseModel):
+    results: dict[str, BatchPredictionItem]
+
+class PredictionJobResponse(BaseModel):
+    job_id: str
+    model: str
+    status: str
+    total: int
+    completed: int
+    failed: int
+    created_at: float
+    finished_at: Optional[float] = None
+    results: Optional[dict[str, BatchPredictionItem]] = None
+
+class SimilarImage(BaseModel):
+    reference: str
+    label: Optional[str] = None
+    score: float
+
+class SimilarImagesResponse(BaseModel):
+    matches: list[SimilarImage]
+    model_version: str
+    # Whether the index searched only part of the reference images
+    approximate: bool
+
+class ModelVersionsResponse(BaseModel):
+    binary: str
+    multiclass: str
+    candidates: dict[str, str] = {}
+
+class ModelReloadRequest(BaseModel):
+    binary_model_path: Optional[str] = None
+    multiclass_model_path: Optional[str] = None
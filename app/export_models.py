@@ -0,0 +1,136 @@
+"""
+Exports the configured classifiers to TFLite, optionally with post-training quantization, and reports
+how far the exported models drift from the Keras ones on a folder of sample images.
+
+    python -m app.export_models --quantization int8 --calibration-dir prediction_models
+
+The service runs the exported models with PREDICTION_MODEL_BACKEND=tflite.
+"""
+import argparse
+import json
+import os
+import pathlib
+
+import numpy as np
+from numpy import ndarray
+
+from app.config import get_settings, logger
+from app.services.prediction_service import model_input_size, prepare_input_tensor
+from app.services.tflite_inference_service import TFLiteClassifier, tflite_model_path
+
+settings = get_settings()
+
+QUANTIZATIONS = ["none", "float16", "int8"]
+IMAGE_SUFFIXES = {".jpg", ".jpeg", ".png", ".webp"}
+BINARY_THRESHOLD = 0.5
+
+
+def load_sample_tensors(directory: str, input_size: tuple[int, int], limit: int) -> list[ndarray]:
+    paths = sorted(
+        path for path in pathlib.Path(directory).rglob("*") if path.suffix.lower() in IMAGE_SUFFIXES
+    )[:limit]
+    return [prepare_input_tensor(path.read_bytes(), input_size) for path in paths]
+
+
+def convert_to_tflite(model, quantization: str, calibration_tensors: list[ndarray]) -> bytes:
+    import tensorflow as tf
+
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    if quantization == "float16":
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.target_spec.supported_types = [tf.float16]
+    elif quantization == "int8":
+        if not calibration_tensors:
+            raise ValueError("int8 quantization needs calibration images")
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.representative_dataset = lambda: ([tensor] for tensor in calibration_tensors)
+        # Integer kernels only, inputs and outputs stay float32 so both runtimes are fed the same tensors
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+    return converter.convert()
+
+
+def accuracy_delta(reference: ndarray, exported: ndarray) -> dict:
+    """
+    Compares the predictions of the exported model with the Keras ones, image by image.
+    """
+    difference = np.abs(exported - reference)
+    if reference.shape[-1] == 1:
+        agreement = (reference[:, 0] >= BINARY_THRESHOLD) == (exported[:, 0] >= BINARY_THRESHOLD)
+    else:
+        agreement = reference.argmax(axis=-1) == exported.argmax(axis=-1)
+
+    return {
+        "images": int(reference.shape[0]),
+        "max_abs_diff": float(difference.max()) if difference.size else 0.0,
+        "mean_abs_diff": float(difference.mean()) if difference.size else 0.0,
+        "top1_agreement": float(agreement.mean()) if agreement.size else 1.0,
+    }
+
+
+def export_model(
+        model_path: str,
+        quantization: str,
+        calibration_dir: str,
+        evaluation_dir: str,
+        max_images: int
+) -> dict:
+    import keras
+
+    keras_model = keras.models.load_model(os.path.join(settings.project_root, model_path))
+    input_size = model_input_size(keras_model)
+    calibration_tensors = load_sample_tensors(calibration_dir, input_size, max_images)
+
+    output_path = os.path.join(settings.project_root, tflite_model_path(model_path))
+    pathlib.Path(output_path).write_bytes(convert_to_tflite(keras_model, quantization, calibration_tensors))
+    logger.info(f"Exported {model_path} to {output_path} ({quantization} quantization)")
+
+    report = {
+        "model": model_path,
+        "output": output_path,
+        "quantization": quantization,
+        "keras_bytes": os.path.getsize(os.path.join(settings.project_root, model_path)),
+        "tflite_bytes": os.path.getsize(output_path),
+    }
+
+    evaluation_tensors = load_sample_tensors(evaluation_dir, input_size, max_images)
+    if evaluation_tensors:
+        batch = np.concatenate(evaluation_tensors)
+        classifier = TFLiteClassifier(output_path, settings.prediction_max_batch_size)
+        report["accuracy_delta"] = accuracy_delta(
+            keras_model.predict(batch, verbose=0),
+            classifier.predict(batch)
+        )
+
+    pathlib.Path(output_path).with_suffix(".report.json").write_text(json.dumps(report, indent=2))
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--models", nargs="+", choices=["binary", "multiclass"], default=["binary", "multiclass"])
+    parser.add_argument("--quantization", choices=QUANTIZATIONS, default="none")
+    parser.add_argument("--calibration-dir", default=os.path.join(settings.project_root, "prediction_models"))
+    parser.add_argument("--evaluation-dir", help="Images of the accuracy report, defaults to the calibration images")
+    parser.add_argument("--max-images", type=int, default=200)
+    args = parser.parse_args()
+
+    model_paths = {
+        "binary": settings.wildlens_footprint_binary_classifier_model_path,
+        "multiclass": settings.wildlens_footprint_multiclass_classifier_model_path,
+    }
+
+    reports = [
+        export_model(
+            model_paths[model],
+            args.quantization,
+            args.calibration_dir,
+            args.evaluation_dir or args.calibration_dir,
+            args.max_images
+        )
+        for model in args.models
+    ]
+    print(json.dumps(reports, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,15 +1,23 @@
 from dotenv import load_dotenv
 
 from app.middlewares.exception_logging_middleware import ExceptionLoggingMiddleware
-from app.services.prometeus_metrics_service import create_instrumentator, init_nvml, shutdown_nvml
+from app.services.prometeus_metrics_service import create_instrumentator, mark_worker_process_dead, \
+    prepare_multiprocess_directory
+from app.services.system_metrics_sampler import SystemMetricsSampler
 
 load_dotenv()
+import asyncio
 from contextlib import asynccontextmanager
 
 from app.config import logger, get_settings
 from app.middlewares.auth_middleware import AuthMiddleware
 
+from app.routes.admin_routes import router as admin_router
+from app.routes.health_routes import router as health_router
+from app.routes.job_routes import router as job_router
 from app.routes.prediction_routes import router as prediction_router
+from app.services.job_service import JobWorker, get_job_store
+from app.services.model_registry import get_model_registry
 
 import uvicorn
 from fastapi import FastAPI
@@ -19,18 +27,32 @@ settings = get_settings()
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Executed before startup (setup):
+    system_metrics_sampler = SystemMetricsSampler(settings.system_metrics_interval_seconds)
+    system_metrics_sampler.start()
 
+    # Models load in the background so liveness probes answer while they warm up
+    model_registry = get_model_registry()
+    loading_task = asyncio.create_task(model_registry.load())
+
+    # Job workers wait for the models, then drain the job queue shared with the other processes
+    job_worker = JobWorker(get_job_store(), model_registry) if settings.jobs_enabled else None
+    if job_worker is not None:
+        job_worker.start()
     # ------------------------------
     yield  # <--- This is where the context manager pauses and the application starts
     # ------------------------------
     # Executed after shutdown (cleanup):
-    shutdown_nvml()
+    loading_task.cancel()
+    await asyncio.gather(loading_task, return_exceptions=True)
+    if job_worker is not None:
+        await job_worker.stop()
+    await model_registry.close()
+    await system_metrics_sampler.stop()
+    mark_worker_process_dead()
 
 
 
 def create_app():
-    init_nvml()
-
     wildlens_prediction_api_app = FastAPI(root_path=settings.api_prefix, lifespan=lifespan)
 
     # Exposing Prometheus metrics endpoints
@@ -42,12 +64,31 @@ def create_app():
     wildlens_prediction_api_app.add_middleware(ExceptionLoggingMiddleware)
 
     # Routers
+    wildlens_prediction_api_app.include_router(health_router)
     wildlens_prediction_api_app.include_router(prediction_router)
+    wildlens_prediction_api_app.include_router(job_router)
+    wildlens_prediction_api_app.include_router(admin_router)
 
     return wildlens_prediction_api_app
 
 app = create_app()
 
+def run():
+    logger.info(f"Starting server on port {settings.app_port} with {settings.app_workers} worker(s)")
+    if settings.app_workers > 1:
+        # Each worker process imports the application and loads the models after the fork, TensorFlow is not
+        # fork-safe. Only memory-mapped TFLite models without the XNNPACK delegate share their weights
+        if settings.prediction_model_backend != "tflite" or not settings.prediction_tflite_shared_weights:
+            logger.warning(
+                f"Every one of the {settings.app_workers} workers holds its own copy of the model weights, "
+                f"PREDICTION_MODEL_BACKEND=tflite with PREDICTION_TFLITE_SHARED_WEIGHTS=true shares them"
+            )
+        metrics_directory = prepare_multiprocess_directory()
+        logger.info(f"Workers aggregate their metrics in {metrics_directory}")
+        uvicorn.run("app.main:app", host="0.0.0.0", port=settings.app_port, workers=settings.app_workers)
+    else:
+        uvicorn.run(app, host="0.0.0.0", port=settings.app_port, reload=False)
+
+
 if __name__ == "__main__":
-    logger.info(f"Starting server on port {settings.app_port}")
-    uvicorn.run(app, host="0.0.0.0", port=settings.app_port, reload=False)
+    run()
@@ -1,10 +1,87 @@
-from app.dto.prediction import BinaryClassifierPredictionResponse, \
-    MulticlassClassifierPredictionResponse
+from typing import Optional
 
+import numpy as np
+from numpy import ndarray
 
-async def binary_predictions_to_response(predictions: list[float]):
-    return BinaryClassifierPredictionResponse(predictions=predictions)
+from app.config import get_settings
+from app.dto.prediction import BatchPredictionItem, PredictionJobResponse
+from app.services.serialization_service import NumpyJSONResponse
 
+settings = get_settings()
 
-async def multiclass_predictions_to_response(predictions: list[float]):
-    return MulticlassClassifierPredictionResponse(predictions=predictions)
\ No newline at end of file
+# Prediction responses are built as plain content with the NumPy arrays left as they are,
+# their shape is documented by the response models of app.dto.prediction
+
+
+def top_k_scores(predictions: ndarray, k: int) -> list[dict]:
+    k = min(k, predictions.shape[-1])
+    # Partial selection of the k best classes, only those are sorted
+    indices = np.argpartition(predictions, -k)[-k:]
+    indices = indices[np.argsort(predictions[indices])[::-1]]
+    labels = settings.multiclass_class_labels
+    return [
+        {"label": labels[index] if index < len(labels) else str(index), "score": float(predictions[index])}
+        for index in indices
+    ]
+
+
+def _multiclass_content(predictions: ndarray, top_k: Optional[int]) -> dict:
+    if top_k is None:
+        return {"predictions": predictions}
+    return {"top_k": top_k_scores(predictions, top_k)}
+
+
+async def binary_predictions_to_response(predictions: ndarray, model_version: str):
+    return NumpyJSONResponse({"predictions": predictions, "model_version": model_version})
+
+
+async def multiclass_predictions_to_response(
+        predictions: ndarray,
+        model_version: str,
+        top_k: Optional[int] = None
+):
+    return NumpyJSONResponse({**_multiclass_content(predictions, top_k), "model_version": model_version})
+
+
+async def cascade_predictions_to_response(
+        footprint_probability: float,
+        predictions: Optional[ndarray],
+        model_versions: dict[str, str],
+        top_k: Optional[int] = None
+):
+    content = {
+        "footprint_probability": footprint_probability,
+        "is_footprint": predictions is not None,
+    }
+    if predictions is not None:
+        content.update(_multiclass_content(predictions, top_k))
+    else:
+        content["predictions"] = None
+    content["binary_model_version"] = model_versions["binary"]
+    content["multiclass_model_version"] = model_versions.get("multiclass")
+    return NumpyJSONResponse(content)
+
+
+async def batch_predictions_to_response(results: dict[str, dict]):
+    return NumpyJSONResponse({"results": {
+        filename: {
+            "predictions": result.get("predictions"),
+            "model_version": result.get("model_version"),
+            "error": result.get("error")
+        }
+        for filename, result in results.items()
+    }})
+
+
+async def similar_images_to_response(matches: list[dict], model_version: str, approximate: bool):
+    return NumpyJSONResponse({"matches": matches, "model_version": model_version, "approximate": approximate})
+
+
+async def job_to_response(job: dict):
+    results = job.get("results")
+    return PredictionJobResponse(
+        **{key: value for key, value in job.items() if key != "results"},
+        results={
+            filename: BatchPredictionItem(**result) for filename, result in results.items()
+        } if results is not None else None
+    )
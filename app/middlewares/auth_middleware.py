@@ -1,17 +1,37 @@
+import hmac
+
 from fastapi import HTTPException
 from starlette import status
-from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.types import ASGIApp, Receive, Scope, Send
 
 from app.config import get_settings
 from app.services.auth_service import extract_api_key
 
 settings = get_settings()
 
-class AuthMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request, call_next):
-        if  request.url.path.startswith(tuple(settings.excluded_paths)):
-            return await call_next(request)
-        auth_header = request.headers.get("Authorization")
+class AuthMiddleware:
+    """
+    Pure ASGI middleware checking the API key of HTTP requests, outside of the excluded paths.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+        self.excluded_paths = tuple(settings.excluded_paths)
+        api_key = settings.wildlens_prediction_api_key
+        self.expected_api_key = api_key.encode() if api_key else None
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        # Websockets check the API key themselves
+        if scope["type"] != "http" or scope["path"].startswith(self.excluded_paths):
+            await self.app(scope, receive, send)
+            return
+
+        auth_header = None
+        for name, value in scope["headers"]:
+            if name == b"authorization":
+                auth_header = value.decode("latin-1")
+                break
+
         if not auth_header:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
@@ -20,11 +40,10 @@ class AuthMiddleware(BaseHTTPMiddleware):
 
         api_key = extract_api_key(auth_header)
 
-        if api_key != settings.wildlens_prediction_api_key:
+        if self.expected_api_key is None or not hmac.compare_digest(api_key.encode(), self.expected_api_key):
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Invalid API Key"
             )
 
-        response = await call_next(request)
-        return response
\ No newline at end of file
+        await self.app(scope, receive, send)
@@ -1,27 +1,54 @@
 import traceback
 
 from fastapi import HTTPException
-from starlette.middleware.base import BaseHTTPMiddleware
 from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 
 from app.config import logger
 
 
-class ExceptionLoggingMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request, call_next):
+class ExceptionLoggingMiddleware:
+    """
+    Pure ASGI middleware turning exceptions into JSON error responses, without wrapping the response body.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        response_started = False
+
+        async def send_tracking_start(message: Message):
+            nonlocal response_started
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+
         try:
-            response = await call_next(request)
-            return response
+            await self.app(scope, receive, send_tracking_start)
+            return
         except HTTPException as http_exc:
             logger.info(f"HTTP error: {http_exc.detail} (status: {http_exc.status_code})")
-            return JSONResponse(
+            # Once headers are sent the status can no longer be changed
+            if response_started:
+                raise
+            response = JSONResponse(
                 status_code=http_exc.status_code,
-                content={"detail": http_exc.detail}
+                content={"detail": http_exc.detail},
+                headers=http_exc.headers
             )
         except Exception as e:
             logger.error(f"Unhandled error: {e}")
             logger.debug(traceback.format_exc())
-            return JSONResponse(
+            if response_started:
+                raise
+            response = JSONResponse(
                 status_code=500,
                 content={"detail": "An unexpected error occurred."}
             )
+
+        await response(scope, receive, send)
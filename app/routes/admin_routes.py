@@ -0,0 +1,107 @@
+import hmac
+import time
+from typing import Literal, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from starlette import status
+from starlette.responses import Response
+
+from app.config import get_settings
+from app.dto.prediction import ModelReloadRequest, ModelVersionsResponse
+from app.routes.prediction_routes import get_prediction_service
+from app.services.model_registry import get_model_registry
+from app.services.prediction_service import PredictionService
+from app.services.profiling_service import capture_profile
+
+settings = get_settings()
+
+
+def require_admin_key(request: Request):
+    admin_api_key = settings.wildlens_prediction_admin_api_key
+    # Admin endpoints do not exist unless an admin key is configured
+    if not admin_api_key:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+
+    provided_key = request.headers.get("X-Admin-Key", "")
+    if not hmac.compare_digest(provided_key.encode(), admin_api_key.encode()):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Invalid admin key"
+        )
+
+
+router = APIRouter(
+    prefix="/admin",
+    tags=["admin"],
+    dependencies=[Depends(require_admin_key)]
+)
+
+
+@router.post(
+    "/profile",
+    description="Profiles live traffic for a few seconds and returns the profile as a downloadable file. "
+                "cprofile returns pstats data, tensorflow returns a zipped TensorBoard trace",
+    status_code=status.HTTP_200_OK,
+)
+async def profile(
+        mode: Literal["cprofile", "tensorflow"] = "cprofile",
+        seconds: float = Query(default=10, gt=0),
+        prediction_service: PredictionService = Depends(get_prediction_service)
+) -> Response:
+    seconds = min(seconds, settings.profiling_max_seconds)
+
+    content = await capture_profile(mode, seconds, prediction_service.executors)
+
+    extension = "zip" if mode == "tensorflow" else "prof"
+    filename = f"wildlens-{mode}-{time.strftime('%Y%m%d-%H%M%S')}.{extension}"
+    return Response(
+        content=content,
+        media_type="application/octet-stream",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+
+@router.get(
+    "/models",
+    response_model=ModelVersionsResponse,
+    description="Returns the versions of the models currently serving predictions, and of their candidates",
+    status_code=status.HTTP_200_OK,
+)
+async def model_versions(
+        prediction_service: PredictionService = Depends(get_prediction_service)
+) -> ModelVersionsResponse:
+    return ModelVersionsResponse(
+        **prediction_service.model_versions,
+        candidates=prediction_service.candidate_versions
+    )
+
+
+@router.post(
+    "/models/reload",
+    response_model=ModelVersionsResponse,
+    description="Loads and warms up new versions of the models, then swaps them in without dropping requests. "
+                "Reloads both models from their current paths unless new paths are given. "
+                "Only the worker process answering the request reloads, use the model file watcher with several workers",
+    status_code=status.HTTP_200_OK,
+)
+async def reload_models(
+        reload_request: Optional[ModelReloadRequest] = None
+) -> ModelVersionsResponse:
+    model_paths = {}
+    if reload_request is not None:
+        if reload_request.binary_model_path:
+            model_paths["binary"] = reload_request.binary_model_path
+        if reload_request.multiclass_model_path:
+            model_paths["multiclass"] = reload_request.multiclass_model_path
+
+    try:
+        versions = await get_model_registry().reload(model_paths=model_paths)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to reload models, the previous versions are still served: {e}"
+        )
+
+    return ModelVersionsResponse(**versions)
@@ -0,0 +1,34 @@
+from fastapi import APIRouter
+from starlette import status
+from starlette.responses import JSONResponse
+
+from app.services.model_registry import get_model_registry
+
+router = APIRouter(
+    prefix="/health",
+    tags=["health"]
+)
+
+
+@router.get(
+    "/live",
+    description="Returns 200 as long as the process is able to serve requests",
+    status_code=status.HTTP_200_OK,
+)
+async def live():
+    return {"status": "alive"}
+
+
+@router.get(
+    "/ready",
+    description="Returns 200 once the models are loaded and warmed up, 503 otherwise",
+    status_code=status.HTTP_200_OK,
+)
+async def ready():
+    registry = get_model_registry()
+    if not registry.is_ready:
+        return JSONResponse(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            content={"status": registry.state}
+        )
+    return {"status": registry.state}
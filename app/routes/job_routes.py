@@ -0,0 +1,85 @@
+import asyncio
+import time
+from typing import Literal
+
+from fastapi import APIRouter, HTTPException, Query, UploadFile
+from starlette import status
+from starlette.responses import Response
+
+from app.config import get_settings
+from app.dto.prediction import PredictionJobResponse
+from app.mappers.prediction_mapper import job_to_response
+from app.services.job_service import get_job_store
+
+settings = get_settings()
+
+router = APIRouter(
+    prefix="/predictions/jobs",
+    tags=["prediction jobs"]
+)
+
+
+def _job_not_found(job_id: str) -> HTTPException:
+    return HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Prediction job {job_id} not found")
+
+
+@router.post(
+    "/{model}",
+    response_model=PredictionJobResponse,
+    description="Queues several images, uploaded as files or as a zip/tar archive, for prediction by the given "
+                "classifier, and returns the job to poll for their results",
+    status_code=status.HTTP_202_ACCEPTED,
+)
+async def submit_prediction_job(
+        model: Literal["binary", "multiclass"],
+        files: list[UploadFile]
+) -> PredictionJobResponse:
+
+    store = get_job_store()
+    job_id = await asyncio.to_thread(store.create_job, model, files)
+    job = await asyncio.to_thread(store.get_job, job_id, False)
+
+    return await job_to_response(job)
+
+
+@router.get(
+    "/{job_id}",
+    response_model=PredictionJobResponse,
+    description="Returns the progress of a prediction job and the results predicted so far, waiting up to `wait` "
+                "seconds for the job to finish",
+    status_code=status.HTTP_200_OK,
+)
+async def get_prediction_job(
+        job_id: str,
+        wait: float = Query(default=0, ge=0, description="Seconds to wait for the job to finish before answering")
+) -> PredictionJobResponse:
+
+    store = get_job_store()
+    wait_until = time.monotonic() + min(wait, settings.jobs_max_wait_seconds)
+    # Only the progress is read while long-polling, the results once when answering
+    while True:
+        job = await asyncio.to_thread(store.get_job, job_id, False)
+        if job is None:
+            raise _job_not_found(job_id)
+        if job["status"] == "done" or time.monotonic() >= wait_until:
+            break
+        await asyncio.sleep(settings.jobs_poll_interval_seconds)
+
+    job = await asyncio.to_thread(store.get_job, job_id)
+    if job is None:
+        raise _job_not_found(job_id)
+
+    return await job_to_response(job)
+
+
+@router.delete(
+    "/{job_id}",
+    description="Deletes a prediction job and its results, images not predicted yet are dropped",
+    status_code=status.HTTP_204_NO_CONTENT,
+)
+async def delete_prediction_job(job_id: str) -> Response:
+
+    if not await asyncio.to_thread(get_job_store().delete_job, job_id):
+        raise _job_not_found(job_id)
+
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
@@ -1,89 +1,185 @@
-from functools import lru_cache
+import asyncio
+import hmac
+import json
+import struct
+from typing import AsyncIterator, Optional
 
-from fastapi import APIRouter, UploadFile, Depends, WebSocket
+from fastapi import APIRouter, UploadFile, Depends, WebSocket, HTTPException, Query
 from starlette import status
 import base64
-from io import BytesIO
-import numpy as np
-from app.classifier_models import binary_classifier_model, multiclass_classifier_model
 from app.config import get_settings
-from app.dto.prediction import BinaryClassifierPredictionResponse, MulticlassClassifierPredictionResponse
-from app.mappers.prediction_mapper import binary_predictions_to_response
+from app.dto.prediction import BinaryClassifierPredictionResponse, MulticlassClassifierPredictionResponse, \
+    CascadePredictionResponse, BatchPredictionResponse, SimilarImagesResponse
+from app.mappers.prediction_mapper import binary_predictions_to_response, multiclass_predictions_to_response, \
+    cascade_predictions_to_response, batch_predictions_to_response, similar_images_to_response
+from app.services.deadline_service import Deadline, RequestDeadline, deadline_from_headers
+from app.services.ingestion_service import ImageUpload, IMAGE_UPLOAD_OPENAPI, validate_image
+from app.services.model_registry import ModelRegistry, get_model_registry
 from app.services.prediction_service import PredictionService
+from app.services.serialization_service import NumpyJSONResponse, dumps_json
 from dotenv import load_dotenv
-import os
 
 load_dotenv()
 
 settings = get_settings()
 
+TOP_K_QUERY = Query(
+    default=None,
+    ge=1,
+    description="Returns only the labels and scores of the k most probable classes instead of every probability"
+)
+
 router = APIRouter(
     prefix="/predictions",
     tags=["predictions"]
 )
 
-@lru_cache()
-def get_prediction_service():
-    return PredictionService(
-        binary_model=binary_classifier_model,
-        multiclass_model=multiclass_classifier_model
-    )
+async def get_prediction_service() -> AsyncIterator[PredictionService]:
+    registry = get_model_registry()
+    if not registry.is_ready:
+        # Fail fast instead of holding the request until the models are loaded
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Models are not loaded yet",
+            headers={"Retry-After": str(settings.prediction_retry_after_seconds)}
+        )
+    # The request keeps the model version it started with, even if a reload swaps models meanwhile
+    with registry.lease() as prediction_service:
+        yield prediction_service
 
 @router.post(
     "/binary",
     response_model=BinaryClassifierPredictionResponse,
     description="Predicts the class of an image using a binary classifier",
     status_code=status.HTTP_200_OK,
+    openapi_extra=IMAGE_UPLOAD_OPENAPI,
 )
 async def predict_binary(
-        image_file : UploadFile,
+        deadline: RequestDeadline = Depends(Deadline()),
+        image_data: memoryview = Depends(ImageUpload("binary", "binary")),
         prediction_service: PredictionService = Depends(get_prediction_service)
-) -> BinaryClassifierPredictionResponse:
+) -> NumpyJSONResponse:
 
-    predictions = await prediction_service.predict_binary(image_file)
+    predictions, model_version = await prediction_service.predict_binary(image_data, deadline=deadline)
 
-    prediction_response = await binary_predictions_to_response(predictions)
+    prediction_response = await binary_predictions_to_response(predictions, model_version)
 
     return prediction_response
 
 
+# Binary websocket frames start with the request id, followed by the raw image bytes
+WS_FRAME_HEADER = struct.Struct(">I")
+
+
+async def _answer_binary_frame(
+        websocket: WebSocket,
+        send_lock: asyncio.Lock,
+        window: asyncio.Semaphore,
+        registry: ModelRegistry,
+        frame: bytes
+):
+    try:
+        if len(frame) <= WS_FRAME_HEADER.size:
+            response = {"id": None, "error": "Frame is too short"}
+        else:
+            (request_id,) = WS_FRAME_HEADER.unpack_from(frame)
+            try:
+                # Every frame gets the deadline and priority asked for in the connection headers
+                deadline = deadline_from_headers(websocket.headers)
+                image_data = validate_image(memoryview(frame)[WS_FRAME_HEADER.size:])
+                with registry.lease() as prediction_service:
+                    predictions, model_version = await prediction_service.predict_binary(image_data, "ws", deadline)
+                response = {"id": request_id, "predictions": predictions, "model_version": model_version}
+            except HTTPException as http_exc:
+                response = {"id": request_id, "error": http_exc.detail}
+            except Exception as e:
+                response = {"id": request_id, "error": str(e)}
+
+        async with send_lock:
+            await websocket.send_text(dumps_json(response).decode())
+    finally:
+        window.release()
+
+
 @router.websocket("/ws")
 async def socket_binary(websocket: WebSocket):
+    """
+    Accepts JSON frames {"filename", "data"} with base64 data, answered in order, and binary frames
+    made of a 4 bytes big-endian request id followed by the raw image, answered as soon as they are ready.
+    """
     await websocket.accept()
     try:
         auth_header = websocket.headers.get("Authorization")
-        if not auth_header or auth_header != "Key " + settings.wildlens_prediction_api_key:
+        api_key = settings.wildlens_prediction_api_key
+        if not auth_header or not api_key or not hmac.compare_digest(auth_header.encode(), f"Key {api_key}".encode()):
             await websocket.send_json({
                 "error": "Invalid API Key"
             })
             await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
             return
-        
-        prediction_service = get_prediction_service()
-        while True:
-            file = await websocket.receive_json()
-            filename = file.get("filename")
-            data = file.get("data")
-            if filename and data:
-                image_data = base64.b64decode(data)
-                image_file = UploadFile(
-                    filename=filename,
-                    file=BytesIO(image_data)
-                )
-
-                predictions = await prediction_service.predict_binary(image_file)
-                await websocket.send_json({
-                    "predictions": predictions,
-                })
-            else:
-                await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
-
-    except Exception as e:
+
+        registry = get_model_registry()
+        if not registry.is_ready:
+            await websocket.send_json({
+                "error": "Models are not loaded yet"
+            })
+            await websocket.close(code=status.WS_1013_TRY_AGAIN_LATER)
+            return
+
+        # Frames stop being read once the window is full, which pushes back on the client
+        window = asyncio.Semaphore(settings.ws_max_in_flight)
+        send_lock = asyncio.Lock()
+        pending = set()
+
+        try:
+            while True:
+                await window.acquire()
+                message = await websocket.receive()
+                if message["type"] == "websocket.disconnect":
+                    return
+
+                if message.get("bytes") is not None:
+                    task = asyncio.create_task(
+                        _answer_binary_frame(websocket, send_lock, window, registry, message["bytes"])
+                    )
+                    pending.add(task)
+                    task.add_done_callback(pending.discard)
+                    continue
+
+                window.release()
+                file = json.loads(message["text"])
+                filename = file.get("filename")
+                data = file.get("data")
+                if filename and data:
+                    try:
+                        deadline = deadline_from_headers(websocket.headers)
+                        image_data = validate_image(base64.b64decode(data))
+                        # Every frame is served by the current model version, a connection does not pin one
+                        with registry.lease() as prediction_service:
+                            predictions, model_version = await prediction_service.predict_binary(
+                                image_data, "ws", deadline
+                            )
+                    except HTTPException as http_exc:
+                        async with send_lock:
+                            await websocket.send_json({
+                                "error": http_exc.detail
+                            })
+                        continue
+                    async with send_lock:
+                        await websocket.send_text(dumps_json({
+                            "predictions": predictions,
+                            "model_version": model_version
+                        }).decode())
+                else:
+                    await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+                    return
+        finally:
+            for task in pending:
+                task.cancel()
+
+    except Exception:
         await websocket.close(code=1008)
         return
-    
-    
-
 
 
 @router.post(
@@ -91,20 +187,103 @@ async def socket_binary(websocket: WebSocket):
     response_model=MulticlassClassifierPredictionResponse,
     description="Predicts the class of an image using a multiclass classifier",
     status_code=status.HTTP_200_OK,
+    openapi_extra=IMAGE_UPLOAD_OPENAPI,
 )
 async def predict_multiclass(
-        image_file : UploadFile,
-        prediction_service: PredictionService = Depends(get_prediction_service)
-) -> MulticlassClassifierPredictionResponse:
+        deadline: RequestDeadline = Depends(Deadline()),
+        image_data: memoryview = Depends(ImageUpload("multiclass", "multiclass")),
+        prediction_service: PredictionService = Depends(get_prediction_service),
+        top_k: Optional[int] = TOP_K_QUERY
+) -> NumpyJSONResponse:
+
+    predictions, model_version = await prediction_service.predict_multiclass(image_data, deadline=deadline)
 
-    num_classes = 13
-    random_values = np.random.random(num_classes)
-    normalized_predictions = (random_values / random_values.sum()).tolist()
+    prediction_response = await multiclass_predictions_to_response(predictions, model_version, top_k)
 
-    return MulticlassClassifierPredictionResponse(
-        # TODO : when the MultiClassClassifier is implemented, replace the following predictions with the actual predictions
-        predictions=normalized_predictions
+    return prediction_response
+
+
+@router.post(
+    "/cascade",
+    response_model=CascadePredictionResponse,
+    description="Checks whether an image contains a footprint, and classifies it with the multiclass classifier if so",
+    status_code=status.HTTP_200_OK,
+    openapi_extra=IMAGE_UPLOAD_OPENAPI,
+)
+async def predict_cascade(
+        deadline: RequestDeadline = Depends(Deadline()),
+        image_data: memoryview = Depends(ImageUpload("binary", "cascade")),
+        prediction_service: PredictionService = Depends(get_prediction_service),
+        top_k: Optional[int] = TOP_K_QUERY
+) -> NumpyJSONResponse:
+
+    footprint_probability, predictions, model_versions = await prediction_service.predict_cascade(
+        image_data, deadline=deadline
+    )
+
+    prediction_response = await cascade_predictions_to_response(
+        footprint_probability,
+        predictions,
+        model_versions,
+        top_k
     )
 
+    return prediction_response
+
+
+@router.post(
+    "/binary/batch",
+    response_model=BatchPredictionResponse,
+    description="Predicts several images, uploaded as files or as a zip/tar archive, using a binary classifier",
+    status_code=status.HTTP_200_OK,
+)
+async def predict_binary_batch(
+        files: list[UploadFile],
+        # Bulk uploads only get a deadline when the client asks for one
+        deadline: RequestDeadline = Depends(Deadline(apply_default=False)),
+        prediction_service: PredictionService = Depends(get_prediction_service)
+) -> NumpyJSONResponse:
+
+    results = await prediction_service.predict_batch("binary", files, deadline=deadline)
+
+    return await batch_predictions_to_response(results)
+
+
+@router.post(
+    "/multiclass/batch",
+    response_model=BatchPredictionResponse,
+    description="Predicts several images, uploaded as files or as a zip/tar archive, using a multiclass classifier",
+    status_code=status.HTTP_200_OK,
+)
+async def predict_multiclass_batch(
+        files: list[UploadFile],
+        # Bulk uploads only get a deadline when the client asks for one
+        deadline: RequestDeadline = Depends(Deadline(apply_default=False)),
+        prediction_service: PredictionService = Depends(get_prediction_service)
+) -> NumpyJSONResponse:
+
+    results = await prediction_service.predict_batch("multiclass", files, deadline=deadline)
+
+    return await batch_predictions_to_response(results)
 
 
+@router.post(
+    "/similar",
+    response_model=SimilarImagesResponse,
+    description="Finds the reference footprint images most similar to an image, "
+                "by the embeddings of the multiclass classifier",
+    status_code=status.HTTP_200_OK,
+    openapi_extra=IMAGE_UPLOAD_OPENAPI,
+)
+async def find_similar(
+        deadline: RequestDeadline = Depends(Deadline()),
+        image_data: memoryview = Depends(ImageUpload("multiclass", "similar")),
+        prediction_service: PredictionService = Depends(get_prediction_service),
+        k: int = Query(default=5, ge=1, le=settings.embedding_max_k, description="Number of similar images returned")
+) -> NumpyJSONResponse:
+
+    matches, model_version = await prediction_service.find_similar(image_data, k, deadline=deadline)
+
+    return await similar_images_to_response(
+        matches, model_version, prediction_service.embedding_index.is_approximate
+    )
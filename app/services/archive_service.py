@@ -0,0 +1,121 @@
+import os
+import tarfile
+import zipfile
+from functools import partial
+from itertools import islice
+from typing import BinaryIO, Callable, Container, Iterator, Optional
+
+from fastapi import HTTPException, UploadFile
+
+from app.config import get_settings
+from app.services.ingestion_service import validate_image
+
+settings = get_settings()
+
+ZIP_MAGIC = b"PK\x03\x04"
+GZIP_MAGIC = b"\x1f\x8b"
+BZIP2_MAGIC = b"BZh"
+XZ_MAGIC = b"\xfd7zXZ\x00"
+TAR_MAGIC_OFFSET = 257
+
+# (filename, image data, error) where exactly one of image bytes and error is set
+BatchItem = tuple[str, Optional[bytes | memoryview], Optional[str]]
+
+
+def _archive_type(file: BinaryIO) -> Optional[str]:
+    head = file.read(TAR_MAGIC_OFFSET + 5)
+    file.seek(0)
+
+    if head.startswith(ZIP_MAGIC):
+        return "zip"
+    if head[TAR_MAGIC_OFFSET:TAR_MAGIC_OFFSET + 5] == b"ustar":
+        return "tar"
+    if head.startswith((GZIP_MAGIC, BZIP2_MAGIC, XZ_MAGIC)):
+        return "tar"
+    return None
+
+
+def _is_ignored_member(name: str) -> bool:
+    # Directories, hidden files and resource forks added by archivers are not images
+    basename = os.path.basename(name)
+    return not basename or basename.startswith(".") or name.startswith("__MACOSX/")
+
+
+def _too_large_error(size: int) -> str:
+    return f"File is too large ({size} bytes, maximum is {settings.batch_max_file_bytes} bytes)"
+
+
+# (filename, size if known, function reading the data), members are only read when they are processed
+_Member = tuple[str, Optional[int], Callable[[], bytes]]
+
+
+def _iter_zip(file: BinaryIO) -> Iterator[_Member]:
+    with zipfile.ZipFile(file) as archive:
+        for info in archive.infolist():
+            if info.is_dir() or _is_ignored_member(info.filename):
+                continue
+            yield info.filename, info.file_size, partial(archive.read, info)
+
+
+def _iter_tar(file: BinaryIO) -> Iterator[_Member]:
+    # Stream mode reads members sequentially, without loading the member index up front.
+    # A member is read before the next one is requested, or skipped over unread
+    with tarfile.open(fileobj=file, mode="r|*") as archive:
+        for member in archive:
+            if not member.isfile() or _is_ignored_member(member.name):
+                continue
+            yield member.name, member.size, partial(_read_tar_member, archive, member)
+
+
+def _read_tar_member(archive: tarfile.TarFile, member: tarfile.TarInfo) -> bytes:
+    return archive.extractfile(member).read()
+
+
+def _validated(filename: str, image_data: bytes) -> BatchItem:
+    try:
+        return filename, validate_image(image_data), None
+    except HTTPException as http_exc:
+        return filename, None, http_exc.detail
+
+
+def iter_batch_items(files: list[UploadFile], max_files: Optional[int] = None) -> Iterator[BatchItem]:
+    """
+    Yields the images of a bulk upload one at a time, expanding zip and tar archives into their members.
+    Files past `max_files` are not read, they are reported with an error so the response accounts for every file.
+    """
+    max_files = max_files or settings.batch_max_files
+    count = 0
+    for upload in files:
+        archive_type = _archive_type(upload.file)
+        try:
+            if archive_type == "zip":
+                members = _iter_zip(upload.file)
+            elif archive_type == "tar":
+                members = _iter_tar(upload.file)
+            else:
+                members = iter([(upload.filename, upload.size, upload.file.read)])
+
+            for filename, size, read in members:
+                count += 1
+                if count > max_files:
+                    yield filename, None, f"Skipped, a bulk request holds at most {max_files} files"
+                elif size is not None and size > settings.batch_max_file_bytes:
+                    yield filename, None, _too_large_error(size)
+                else:
+                    yield _validated(filename, read())
+        except (zipfile.BadZipFile, tarfile.TarError) as e:
+            yield upload.filename, None, f"Invalid archive: {e}"
+
+
+def take(items: Iterator[BatchItem], count: int) -> list[BatchItem]:
+    return list(islice(items, count))
+
+
+def unique_filename(filename: str, taken: Container[str]) -> str:
+    # Archives and uploads can repeat a name, later ones get a numbered suffix
+    key = filename
+    suffix = 1
+    while key in taken:
+        suffix += 1
+        key = f"{filename} ({suffix})"
+    return key
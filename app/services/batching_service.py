@@ -0,0 +1,223 @@
+import asyncio
+import time
+from concurrent.futures import Executor
+from typing import Callable, Optional
+
+import numpy as np
+from numpy import ndarray
+
+from app.config import logger
+from app.services.deadline_service import RequestDeadline, deadline_exceeded
+from app.services.prometeus_metrics_service import PREDICTION_BATCH_SIZE, PREDICTION_QUEUE_WAIT, \
+    PREDICTION_STAGE_DURATION
+
+
+def batch_size_buckets(max_batch_size: int) -> list[int]:
+    # Powers of two up to the maximum batch size, which is always a bucket itself
+    buckets = []
+    size = 1
+    while size < max_batch_size:
+        buckets.append(size)
+        size *= 2
+    buckets.append(max_batch_size)
+    return buckets
+
+
+# Weight of the latest forward pass in the running estimate of the forward pass duration
+FORWARD_DURATION_SMOOTHING = 0.2
+
+
+class _BatchItem:
+    __slots__ = ("input_tensor", "future", "endpoint", "deadline", "enqueued_at", "dispatched")
+
+    def __init__(
+            self,
+            input_tensor: ndarray,
+            future: asyncio.Future,
+            endpoint: str,
+            deadline: Optional[RequestDeadline]
+    ):
+        self.input_tensor = input_tensor
+        self.future = future
+        self.endpoint = endpoint
+        self.deadline = deadline
+        self.enqueued_at = time.perf_counter()
+        self.dispatched = False
+
+
+class MicroBatcher:
+    """
+    Groups concurrent prediction requests into a single batched forward pass.
+    A batch is flushed when it reaches `max_batch_size` items or when the oldest
+    item has waited `max_wait_ms`, whichever comes first.
+    """
+
+    def __init__(
+            self,
+            name: str,
+            predict_fn: Callable[[ndarray], ndarray],
+            max_batch_size: int,
+            max_wait_ms: float,
+            executor: Optional[Executor] = None,
+            input_size: Optional[tuple[int, int]] = None
+    ):
+        self.name = name
+        self.predict_fn = predict_fn
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000
+        # Forward passes run here so they never block the event loop
+        self.executor = executor
+        # Reused for every batch of the model's input size, instead of allocating a new batch per pass
+        self._buffer: Optional[ndarray] = None
+        if input_size is not None:
+            width, height = input_size
+            self._buffer = np.empty((self.max_batch_size, height, width, 3), dtype=np.float32)
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._forward_duration = 0.0
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    @property
+    def estimated_wait(self) -> float:
+        # Every full batch queued ahead of a new input, and the input's own batch, take about one forward pass
+        return (self.queue_depth // self.max_batch_size + 1) * self._forward_duration
+
+    @property
+    def is_running(self) -> bool:
+        return self._worker is not None and not self._worker.done()
+
+    def start(self):
+        if self.is_running:
+            return
+        self._queue = asyncio.Queue()
+        self._worker = asyncio.create_task(self._run(), name=f"micro-batcher-{self.name}")
+
+    async def stop(self):
+        if self._worker is None:
+            return
+        self._worker.cancel()
+        try:
+            await self._worker
+        except asyncio.CancelledError:
+            pass
+        self._worker = None
+
+        # Fail whatever is still waiting so callers do not hang forever
+        while self._queue is not None and not self._queue.empty():
+            item = self._queue.get_nowait()
+            if not item.future.done():
+                item.future.set_exception(RuntimeError(f"Batcher {self.name} stopped"))
+
+    async def submit(
+            self,
+            input_tensor: ndarray,
+            endpoint: str = "unknown",
+            deadline: Optional[RequestDeadline] = None
+    ) -> ndarray:
+        """
+        Enqueues a batch of one and waits for its row of the batched prediction, at most until the deadline.
+        """
+        if not self.is_running:
+            self.start()
+        if deadline is not None:
+            deadline.check(self.name, "queue_wait")
+
+        future = asyncio.get_running_loop().create_future()
+        item = _BatchItem(input_tensor, future, endpoint, deadline)
+        await self._queue.put(item)
+
+        remaining = deadline.remaining() if deadline is not None else None
+        if remaining is None:
+            return await future
+        try:
+            # Cancels the future on timeout, the batcher then leaves the item out of its batch
+            return await asyncio.wait_for(future, max(remaining, 0))
+        except asyncio.TimeoutError:
+            raise deadline_exceeded(self.name, "forward" if item.dispatched else "queue_wait")
+
+    async def _collect_batch(self) -> list[_BatchItem]:
+        batch = [await self._queue.get()]
+        deadline = batch[0].enqueued_at + self.max_wait
+
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - time.perf_counter()
+            if timeout <= 0:
+                # Still take whatever is already queued, without waiting
+                if self._queue.empty():
+                    break
+                batch.append(self._queue.get_nowait())
+                continue
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+
+        return batch
+
+    async def _run(self):
+        while True:
+            batch = await self._collect_batch()
+
+            # Images of different resolutions cannot be stacked together
+            groups: dict[tuple, list[_BatchItem]] = {}
+            for item in batch:
+                # Nobody is waiting for items whose caller gave up or whose deadline passed while queued
+                if item.future.done():
+                    continue
+                if item.deadline is not None and item.deadline.expired:
+                    item.future.set_exception(deadline_exceeded(self.name, "queue_wait"))
+                    continue
+                groups.setdefault(item.input_tensor.shape[1:], []).append(item)
+
+            for items in groups.values():
+                await self._predict_group(items)
+
+    def _assemble_batch(self, items: list[_BatchItem]) -> ndarray:
+        first = items[0].input_tensor
+        if self._buffer is None or first.shape[1:] != self._buffer.shape[1:]:
+            return np.concatenate([item.input_tensor for item in items], axis=0)
+
+        # Only one batch is in flight per batcher, so the buffer is never shared between passes
+        for row, item in enumerate(items):
+            self._buffer[row] = item.input_tensor[0]
+        return self._buffer[:len(items)]
+
+    async def _predict_group(self, items: list[_BatchItem]):
+        now = time.perf_counter()
+        for item in items:
+            item.dispatched = True
+            PREDICTION_QUEUE_WAIT.labels(model=self.name).observe(now - item.enqueued_at)
+            PREDICTION_STAGE_DURATION.labels(stage="queue_wait", model=self.name, endpoint=item.endpoint).observe(
+                now - item.enqueued_at
+            )
+        PREDICTION_BATCH_SIZE.labels(model=self.name).observe(len(items))
+
+        try:
+            batch_tensor = self._assemble_batch(items)
+            predictions = await asyncio.get_running_loop().run_in_executor(
+                self.executor, self.predict_fn, batch_tensor
+            )
+            predictions = np.asarray(predictions)
+            # Every request of the batch waited for the whole forward pass
+            forward_duration = time.perf_counter() - now
+            if self._forward_duration:
+                self._forward_duration += FORWARD_DURATION_SMOOTHING * (forward_duration - self._forward_duration)
+            else:
+                self._forward_duration = forward_duration
+            for item in items:
+                PREDICTION_STAGE_DURATION.labels(stage="forward", model=self.name, endpoint=item.endpoint).observe(
+                    forward_duration
+                )
+        except Exception as e:
+            logger.error(f"Batched prediction failed for {self.name}: {e}")
+            for item in items:
+                if not item.future.done():
+                    item.future.set_exception(e)
+            return
+
+        for row, item in enumerate(items):
+            if not item.future.done():
+                item.future.set_result(predictions[row])
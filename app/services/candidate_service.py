@@ -0,0 +1,183 @@
+import asyncio
+import random
+import time
+from concurrent.futures import Executor
+from functools import partial
+from typing import Callable, Optional
+
+import numpy as np
+from numpy import ndarray
+
+from app.config import get_settings, logger
+from app.services.batching_service import MicroBatcher
+from app.services.deadline_service import RequestDeadline
+from app.services.prometeus_metrics_service import CANDIDATE_SHADOW_PREDICTIONS, CANDIDATE_SHADOW_LATENCY_DELTA, \
+    CANDIDATE_SHADOW_OUTPUT_DELTA, PREDICTION_MODEL_LATENCY
+
+settings = get_settings()
+
+
+def predictions_agree(primary: ndarray, candidate: ndarray) -> bool:
+    # Same decision: footprint or not for the binary model, same top class for the multiclass one
+    if primary.shape[-1] == 1:
+        threshold = settings.cascade_footprint_threshold
+        return bool((primary[0] >= threshold) == (candidate[0] >= threshold))
+    return int(primary.argmax()) == int(candidate.argmax())
+
+
+def is_backlogged(batcher: MicroBatcher) -> bool:
+    # A full batch is already waiting, or the next input would wait longer than shadows may delay anybody
+    return (
+        batcher.queue_depth >= batcher.max_batch_size
+        or batcher.estimated_wait * 1000 >= settings.candidate_shadow_max_wait_ms
+    )
+
+
+class CandidateModel:
+    """
+    Secondary version of a model, next to the primary one. It serves a share of the requests (canary)
+    and replays primary requests in the background to compare both versions (shadow).
+    Shadow predictions are batched on their own thread, so they never queue ahead of a canary request,
+    and are dropped rather than queued when either version falls behind.
+    """
+
+    def __init__(
+            self,
+            model_kind: str,
+            model,
+            input_size: tuple[int, int],
+            executor: Executor,
+            shadow_executor: Executor,
+            prepare_tensor: Callable[..., ndarray],
+            canary_percent: float,
+            shadow_percent: float,
+            max_pending_shadows: int
+    ):
+        self.model_kind = model_kind
+        self.model = model
+        self.version = str(getattr(model, "version", "unknown"))
+        self.input_size = input_size
+        self.executor = executor
+        self.prepare_tensor = prepare_tensor
+        self.canary_percent = canary_percent
+        self.shadow_percent = shadow_percent
+        self.max_pending_shadows = max_pending_shadows
+        self.batcher = MicroBatcher(
+            name=f"{model_kind}_candidate",
+            predict_fn=model.predict,
+            max_batch_size=settings.prediction_max_batch_size,
+            max_wait_ms=settings.prediction_max_batch_wait_ms,
+            executor=executor,
+            input_size=input_size
+        )
+        self.shadow_batcher = MicroBatcher(
+            name=f"{model_kind}_shadow",
+            predict_fn=model.predict,
+            max_batch_size=settings.prediction_max_batch_size,
+            max_wait_ms=settings.prediction_max_batch_wait_ms,
+            executor=shadow_executor,
+            input_size=input_size
+        )
+        self._shadow_tasks: set[asyncio.Task] = set()
+
+    def takes_canary(self) -> bool:
+        return self.canary_percent > 0 and random.random() * 100 < self.canary_percent
+
+    async def _input_tensor(
+            self,
+            input_tensor: ndarray,
+            image_data: bytes | memoryview,
+            decode_executor: Executor,
+            endpoint: str
+    ) -> ndarray:
+        if input_tensor.shape[1:3] == (self.input_size[1], self.input_size[0]):
+            return input_tensor
+        # The candidate expects another input size than the primary, the image is prepared again for it
+        return await asyncio.get_running_loop().run_in_executor(
+            decode_executor,
+            partial(self.prepare_tensor, image_data, self.input_size, None, self.model_kind, endpoint)
+        )
+
+    async def predict(
+            self,
+            input_tensor: ndarray,
+            image_data: bytes | memoryview,
+            decode_executor: Executor,
+            endpoint: str,
+            deadline: Optional[RequestDeadline] = None
+    ) -> ndarray:
+        input_tensor = await self._input_tensor(input_tensor, image_data, decode_executor, endpoint)
+        started = time.perf_counter()
+        prediction = await self.batcher.submit(input_tensor, endpoint, deadline)
+        PREDICTION_MODEL_LATENCY.labels(model=self.model_kind, role="canary").observe(time.perf_counter() - started)
+        return prediction
+
+    def shadow(
+            self,
+            input_tensor: ndarray,
+            image_data: bytes | memoryview,
+            decode_executor: Executor,
+            primary_prediction: ndarray,
+            primary_latency: float,
+            primary_batcher: MicroBatcher,
+            endpoint: str
+    ):
+        """
+        Schedules the comparison of a primary prediction with the candidate's, off the request path.
+        """
+        if self.shadow_percent <= 0 or random.random() * 100 >= self.shadow_percent:
+            return
+        if (
+                len(self._shadow_tasks) >= self.max_pending_shadows
+                or is_backlogged(primary_batcher)
+                or is_backlogged(self.batcher)
+        ):
+            CANDIDATE_SHADOW_PREDICTIONS.labels(model=self.model_kind, outcome="dropped").inc()
+            return
+
+        task = asyncio.create_task(self._run_shadow(
+            input_tensor, image_data, decode_executor, primary_prediction, primary_latency, endpoint
+        ))
+        self._shadow_tasks.add(task)
+        task.add_done_callback(self._shadow_tasks.discard)
+
+    async def _run_shadow(
+            self,
+            input_tensor: ndarray,
+            image_data: bytes | memoryview,
+            decode_executor: Executor,
+            primary_prediction: ndarray,
+            primary_latency: float,
+            endpoint: str
+    ):
+        try:
+            input_tensor = await self._input_tensor(input_tensor, image_data, decode_executor, f"{endpoint}_shadow")
+            started = time.perf_counter()
+            prediction = await self.shadow_batcher.submit(input_tensor, f"{endpoint}_shadow")
+            latency = time.perf_counter() - started
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"Shadow prediction of the {self.model_kind} candidate failed: {e}")
+            CANDIDATE_SHADOW_PREDICTIONS.labels(model=self.model_kind, outcome="error").inc()
+            return
+
+        PREDICTION_MODEL_LATENCY.labels(model=self.model_kind, role="shadow").observe(latency)
+        CANDIDATE_SHADOW_LATENCY_DELTA.labels(model=self.model_kind).observe(latency - primary_latency)
+        CANDIDATE_SHADOW_OUTPUT_DELTA.labels(model=self.model_kind).observe(
+            float(np.abs(np.asarray(prediction) - np.asarray(primary_prediction)).max())
+        )
+        outcome = "agree" if predictions_agree(primary_prediction, prediction) else "disagree"
+        CANDIDATE_SHADOW_PREDICTIONS.labels(model=self.model_kind, outcome=outcome).inc()
+
+    def start(self):
+        self.batcher.start()
+        self.shadow_batcher.start()
+
+    async def stop(self):
+        for task in list(self._shadow_tasks):
+            task.cancel()
+        await asyncio.gather(*self._shadow_tasks, return_exceptions=True)
+        await self.shadow_batcher.stop()
+        await self.batcher.stop()
+
@@ -0,0 +1,104 @@
+import time
+from typing import Mapping, Optional
+
+from fastapi import Header, HTTPException
+from starlette import status
+
+from app.config import get_settings
+from app.services.prometeus_metrics_service import PREDICTION_DEADLINE_EXCEEDED
+
+settings = get_settings()
+
+TIMEOUT_HEADER = "X-Request-Timeout-Ms"
+PRIORITY_HEADER = "X-Request-Priority"
+PRIORITIES = ["high", "normal", "low"]
+
+
+class RequestDeadline:
+    """
+    Time by which a prediction must be answered, and the priority of the request, carried from the route
+    through decoding, queueing and inference so work nobody is waiting for anymore is skipped.
+    """
+
+    __slots__ = ("expires_at", "priority")
+
+    def __init__(self, timeout_seconds: Optional[float] = None, priority: str = "normal"):
+        # perf_counter, like the enqueue times of the batchers
+        self.expires_at = time.perf_counter() + timeout_seconds if timeout_seconds else None
+        self.priority = priority
+
+    def remaining(self) -> Optional[float]:
+        return self.expires_at - time.perf_counter() if self.expires_at is not None else None
+
+    @property
+    def expired(self) -> bool:
+        return self.expires_at is not None and time.perf_counter() >= self.expires_at
+
+    def check(self, model: str, stage: str):
+        if self.expired:
+            raise deadline_exceeded(model, stage)
+
+
+def deadline_exceeded(model: str, stage: str) -> HTTPException:
+    PREDICTION_DEADLINE_EXCEEDED.labels(model=model, stage=stage).inc()
+    return HTTPException(
+        status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+        detail=f"Prediction deadline exceeded during {stage}"
+    )
+
+
+def parse_deadline(timeout_ms: Optional[str], priority: Optional[str], apply_default: bool = True) -> RequestDeadline:
+    if priority is None:
+        priority = "normal"
+    elif priority.lower() in PRIORITIES:
+        priority = priority.lower()
+    else:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"{PRIORITY_HEADER} must be one of: {PRIORITIES}"
+        )
+
+    if timeout_ms is None:
+        timeout = settings.prediction_default_timeout_ms if apply_default else 0
+    else:
+        try:
+            timeout = float(timeout_ms)
+        except ValueError:
+            timeout = -1
+        if not timeout > 0:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"{TIMEOUT_HEADER} must be a positive number of milliseconds"
+            )
+        timeout = min(timeout, settings.prediction_max_timeout_ms)
+
+    return RequestDeadline(timeout / 1000, priority)
+
+
+def deadline_from_headers(headers: Mapping[str, str], apply_default: bool = True) -> RequestDeadline:
+    return parse_deadline(headers.get(TIMEOUT_HEADER), headers.get(PRIORITY_HEADER), apply_default)
+
+
+class Deadline:
+    """
+    Dependency starting the deadline of a prediction request, from its headers or the configured default.
+    Declared before the upload so the time spent reading the image counts against the deadline.
+    """
+
+    def __init__(self, apply_default: bool = True):
+        self.apply_default = apply_default
+
+    def __call__(
+            self,
+            timeout_ms: Optional[str] = Header(
+                default=None,
+                alias=TIMEOUT_HEADER,
+                description="Milliseconds after which the prediction is abandoned with a 504"
+            ),
+            priority: Optional[str] = Header(
+                default=None,
+                alias=PRIORITY_HEADER,
+                description=f"One of {PRIORITIES}, lower priority requests are shed first under load"
+            )
+    ) -> RequestDeadline:
+        return parse_deadline(timeout_ms, priority, self.apply_default)
@@ -0,0 +1,81 @@
+import time
+from typing import Optional
+
+import numpy as np
+from numpy import ndarray
+
+from app.services.prometeus_metrics_service import PREDICTION_DEDUPE_LOOKUPS
+
+# ITU-R BT.601 luma weights
+GRAY_WEIGHTS = np.array([0.299, 0.587, 0.114], dtype=np.float32)
+HASH_ROWS = 8
+HASH_COLUMNS = 9
+
+
+def perceptual_hash(input_tensor: ndarray) -> int:
+    """
+    64 bits difference hash (dHash) of a (1, height, width, 3) model input: the image is reduced to 8x9 block
+    means of its luma and every bit tells whether a block is brighter than its left neighbour.
+    Near-identical frames, re-encoded or slightly shifted, differ by a few bits only.
+    """
+    gray = input_tensor[0] @ GRAY_WEIGHTS
+    height, width = gray.shape
+    row_starts = np.arange(HASH_ROWS) * height // HASH_ROWS
+    column_starts = np.arange(HASH_COLUMNS) * width // HASH_COLUMNS
+    sums = np.add.reduceat(np.add.reduceat(gray, row_starts, axis=0), column_starts, axis=1)
+    # Blocks differ by a pixel in size when the input size is not a multiple of the grid
+    row_sizes = np.diff(np.append(row_starts, height))
+    column_sizes = np.diff(np.append(column_starts, width))
+    means = sums / np.outer(row_sizes, column_sizes)
+
+    bits = means[:, 1:] > means[:, :-1]
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+class _HashRing:
+    __slots__ = ("hashes", "stored_at", "predictions", "next")
+
+    def __init__(self, max_entries: int):
+        self.hashes = np.zeros(max_entries, dtype=np.uint64)
+        # Never stored slots are older than any window
+        self.stored_at = np.full(max_entries, -np.inf)
+        self.predictions: list[Optional[ndarray]] = [None] * max_entries
+        self.next = 0
+
+
+class DedupeIndex:
+    """
+    Recent predictions of a model indexed by the perceptual hash of their input, so the near-identical frames
+    of a burst reuse the first frame's prediction. Bounded ring of `max_entries` per model, searched whole
+    with a vectorized Hamming distance.
+    """
+
+    def __init__(self, max_entries: int, max_distance: int, window_seconds: float):
+        self.max_entries = max_entries
+        self.max_distance = max_distance
+        self.window_seconds = window_seconds
+        self._rings: dict[str, _HashRing] = {}
+
+    def get(self, model: str, image_hash: int) -> Optional[ndarray]:
+        ring = self._rings.get(model)
+        if ring is not None:
+            distances = np.bitwise_count(ring.hashes ^ np.uint64(image_hash))
+            recent = ring.stored_at >= time.monotonic() - self.window_seconds
+            candidates = np.flatnonzero(recent & (distances <= self.max_distance))
+            if candidates.size:
+                closest = candidates[np.argmin(distances[candidates])]
+                PREDICTION_DEDUPE_LOOKUPS.labels(model=model, outcome="hit").inc()
+                return ring.predictions[closest]
+
+        PREDICTION_DEDUPE_LOOKUPS.labels(model=model, outcome="miss").inc()
+        return None
+
+    def put(self, model: str, image_hash: int, prediction: ndarray):
+        ring = self._rings.get(model)
+        if ring is None:
+            ring = self._rings[model] = _HashRing(self.max_entries)
+        slot = ring.next
+        ring.hashes[slot] = image_hash
+        ring.stored_at[slot] = time.monotonic()
+        ring.predictions[slot] = prediction
+        ring.next = (slot + 1) % self.max_entries
@@ -0,0 +1,194 @@
+import json
+import os
+from typing import Optional
+
+import numpy as np
+from numpy import ndarray
+
+INDEX_FILE = "index.json"
+VECTORS_FILE = "vectors.npy"
+CENTROIDS_FILE = "centroids.npy"
+LIST_OFFSETS_FILE = "list_offsets.npy"
+PQ_CODEBOOKS_FILE = "pq_codebooks.npy"
+PQ_CODES_FILE = "pq_codes.npy"
+
+# Rows converted to float32 at a time by the exact search, bounds its scratch memory
+SEARCH_CHUNK_ROWS = 65536
+PQ_CENTROIDS = 256
+
+
+def normalize(vectors: ndarray) -> ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def kmeans(vectors: ndarray, clusters: int, iterations: int = 20, seed: int = 0) -> ndarray:
+    """
+    Lloyd's k-means on the rows of `vectors`, starting from randomly picked rows. Returns the centroids.
+    """
+    rng = np.random.default_rng(seed)
+    clusters = min(clusters, len(vectors))
+    centroids = vectors[rng.choice(len(vectors), clusters, replace=False)].astype(np.float32)
+    for _ in range(iterations):
+        assignments = assign(vectors, centroids)
+        sums = np.stack([
+            np.bincount(assignments, weights=vectors[:, column], minlength=clusters)
+            for column in range(vectors.shape[1])
+        ], axis=1)
+        counts = np.bincount(assignments, minlength=clusters)
+        # Empty clusters keep their previous centroid
+        filled = counts > 0
+        centroids[filled] = sums[filled] / counts[filled, None]
+    return centroids
+
+
+def assign(vectors: ndarray, centroids: ndarray) -> ndarray:
+    # Closest centroid by euclidean distance, |c|^2 - 2 v.c is enough to compare them
+    squared_norms = (centroids ** 2).sum(axis=1)
+    return np.concatenate([
+        (squared_norms - 2 * (vectors[start:start + SEARCH_CHUNK_ROWS] @ centroids.T)).argmin(axis=1)
+        for start in range(0, len(vectors), SEARCH_CHUNK_ROWS)
+    ])
+
+
+def _top_k(scores: ndarray, k: int) -> ndarray:
+    k = min(k, scores.size)
+    if k == 0:
+        return np.empty(0, dtype=np.int64)
+    best = np.argpartition(scores, -k)[-k:]
+    return best[np.argsort(scores[best])[::-1]]
+
+
+class EmbeddingIndex:
+    """
+    Normalized embeddings of reference images, stored as a float16 matrix which is memory-mapped, so it loads
+    instantly and the page cache shares it between the worker processes. Queries are scored by cosine
+    similarity, exactly over every row or, when the index was built with inverted lists, over the rows of the
+    lists closest to the query, optionally pre-scored with product quantization codes.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        with open(os.path.join(directory, INDEX_FILE)) as index_file:
+            metadata = json.load(index_file)
+        self.model_version: str = metadata["model_version"]
+        self.references: list[dict] = metadata["references"]
+        self.vectors = np.load(os.path.join(directory, VECTORS_FILE), mmap_mode="r")
+        self.dimension = self.vectors.shape[1]
+
+        self.centroids: Optional[ndarray] = None
+        self.list_offsets: Optional[ndarray] = None
+        if metadata.get("ivf_lists"):
+            self.centroids = np.load(os.path.join(directory, CENTROIDS_FILE))
+            self.list_offsets = np.load(os.path.join(directory, LIST_OFFSETS_FILE))
+
+        self.pq_codebooks: Optional[ndarray] = None
+        self.pq_codes: Optional[ndarray] = None
+        if metadata.get("pq_subspaces"):
+            self.pq_codebooks = np.load(os.path.join(directory, PQ_CODEBOOKS_FILE))
+            self.pq_codes = np.load(os.path.join(directory, PQ_CODES_FILE), mmap_mode="r")
+
+    def __len__(self) -> int:
+        return len(self.references)
+
+    @property
+    def is_approximate(self) -> bool:
+        return self.centroids is not None
+
+    def _exact_scores(self, query: ndarray, rows: Optional[ndarray] = None) -> ndarray:
+        if rows is not None:
+            return np.asarray(self.vectors[rows], dtype=np.float32) @ query
+        return np.concatenate([
+            np.asarray(self.vectors[start:start + SEARCH_CHUNK_ROWS], dtype=np.float32) @ query
+            for start in range(0, len(self.vectors), SEARCH_CHUNK_ROWS)
+        ]) if len(self.vectors) else np.empty(0, dtype=np.float32)
+
+    def _pq_scores(self, query: ndarray, rows: ndarray) -> ndarray:
+        subspaces, _, width = self.pq_codebooks.shape
+        # Inner product of every query sub-vector with every centroid of its subspace, then one lookup per code
+        tables = np.einsum("scw,sw->sc", self.pq_codebooks, query.reshape(subspaces, width))
+        codes = np.asarray(self.pq_codes[rows])
+        return tables[np.arange(subspaces), codes].sum(axis=1)
+
+    def _candidate_rows(self, query: ndarray, probes: int, rerank: int) -> ndarray:
+        lists = _top_k(self.centroids @ query, probes)
+        rows = np.concatenate([
+            np.arange(self.list_offsets[index], self.list_offsets[index + 1]) for index in lists
+        ])
+        if self.pq_codes is not None and rows.size > rerank:
+            rows = rows[_top_k(self._pq_scores(query, rows), rerank)]
+        return np.sort(rows)
+
+    def search(self, embedding: ndarray, k: int, probes: int = 8, rerank: int = 256) -> list[dict]:
+        """
+        Returns the k references most similar to the embedding, most similar first, with their cosine similarity.
+        """
+        query = normalize(np.ravel(embedding))
+        if self.is_approximate:
+            rows = self._candidate_rows(query, probes, max(rerank, k))
+            scores = self._exact_scores(query, rows)
+            best = _top_k(scores, k)
+            rows, scores = rows[best], scores[best]
+        else:
+            scores = self._exact_scores(query)
+            rows = _top_k(scores, k)
+            scores = scores[rows]
+
+        return [
+            {**self.references[row], "score": float(score)}
+            for row, score in zip(rows.tolist(), scores.tolist())
+        ]
+
+    @staticmethod
+    def build(
+            directory: str,
+            embeddings: ndarray,
+            references: list[dict],
+            model_version: str,
+            ivf_lists: int = 0,
+            pq_subspaces: int = 0,
+            seed: int = 0
+    ):
+        """
+        Writes an index of the given embeddings. With inverted lists, rows are stored grouped by list so a list
+        is one contiguous slice of the memory-mapped matrix.
+        """
+        os.makedirs(directory, exist_ok=True)
+        vectors = normalize(embeddings)
+        references = list(references)
+
+        if ivf_lists:
+            centroids = kmeans(vectors, ivf_lists, seed=seed)
+            assignments = assign(vectors, centroids)
+            order = np.argsort(assignments, kind="stable")
+            vectors = vectors[order]
+            references = [references[index] for index in order]
+            offsets = np.concatenate([[0], np.cumsum(np.bincount(assignments, minlength=len(centroids)))])
+            np.save(os.path.join(directory, CENTROIDS_FILE), centroids)
+            np.save(os.path.join(directory, LIST_OFFSETS_FILE), offsets.astype(np.int64))
+
+        if pq_subspaces:
+            dimension = vectors.shape[1]
+            if dimension % pq_subspaces:
+                raise ValueError(f"Embedding size {dimension} is not a multiple of {pq_subspaces} subspaces")
+            sub_vectors = vectors.reshape(len(vectors), pq_subspaces, dimension // pq_subspaces)
+            codebooks = np.stack([
+                kmeans(sub_vectors[:, subspace], PQ_CENTROIDS, seed=seed) for subspace in range(pq_subspaces)
+            ])
+            codes = np.stack([
+                assign(sub_vectors[:, subspace], codebooks[subspace]) for subspace in range(pq_subspaces)
+            ], axis=1).astype(np.uint8)
+            np.save(os.path.join(directory, PQ_CODEBOOKS_FILE), codebooks)
+            np.save(os.path.join(directory, PQ_CODES_FILE), codes)
+
+        np.save(os.path.join(directory, VECTORS_FILE), vectors.astype(np.float16))
+        with open(os.path.join(directory, INDEX_FILE), "w") as index_file:
+            json.dump({
+                "model_version": model_version,
+                "dimension": int(vectors.shape[1]),
+                "count": len(references),
+                "ivf_lists": int(ivf_lists and len(centroids)),
+                "pq_subspaces": int(pq_subspaces),
+                "references": references,
+            }, index_file)
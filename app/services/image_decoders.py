@@ -0,0 +1,205 @@
+import importlib.util
+import io
+from abc import ABC, abstractmethod
+from functools import lru_cache
+
+from PIL import Image
+from numpy import ndarray
+
+from app.config import get_settings, logger
+from app.services.ingestion_service import sniff_image_format
+
+settings = get_settings()
+
+# Decoded images are either PIL images or (height, width, 3) uint8 arrays
+DecodedImage = Image.Image | ndarray
+
+JPEG_SCALE_DENOMINATORS = (8, 4, 2, 1)
+
+
+class MemoryViewReader(io.RawIOBase):
+    """
+    Seekable file object over an upload buffer, PIL reads from it without the whole image being copied.
+    """
+
+    def __init__(self, data: memoryview):
+        super().__init__()
+        self._data = memoryview(data).cast("B")
+        self._position = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._position
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_CUR:
+            offset += self._position
+        elif whence == io.SEEK_END:
+            offset += len(self._data)
+        self._position = max(offset, 0)
+        return self._position
+
+    def readinto(self, buffer) -> int:
+        chunk = self._data[self._position:self._position + len(buffer)]
+        buffer[:len(chunk)] = chunk
+        self._position += len(chunk)
+        return len(chunk)
+
+    def read(self, size: int = -1) -> bytes:
+        end = len(self._data) if size is None or size < 0 else self._position + size
+        chunk = self._data[self._position:end]
+        self._position += len(chunk)
+        return chunk.tobytes()
+
+
+def jpeg_scale_denominator(image_size: tuple[int, int], draft_size: tuple[int, int]) -> int:
+    # Largest DCT downscale that keeps the image at least as large as the requested size, like PIL's draft
+    width, height = image_size
+    for denominator in JPEG_SCALE_DENOMINATORS:
+        if width // denominator >= draft_size[0] and height // denominator >= draft_size[1]:
+            return denominator
+    return 1
+
+
+class ImageDecoder(ABC):
+    """
+    Decodes raw upload bytes into RGB pixels, downscaled as close to the requested size as the format allows.
+    """
+
+    name = "base"
+
+    @classmethod
+    def is_available(cls) -> bool:
+        return True
+
+    @abstractmethod
+    def decode(self, image_data: bytes | memoryview, draft_size: tuple[int, int]) -> DecodedImage:
+        ...
+
+
+class PillowDecoder(ImageDecoder):
+    name = "pillow"
+
+    def decode(self, image_data: bytes | memoryview, draft_size: tuple[int, int]) -> Image.Image:
+        image = Image.open(MemoryViewReader(image_data))
+
+        # JPEG images are downscaled by the decoder itself, before full resolution pixels are produced
+        image.draft("RGB", draft_size)
+        return image.convert("RGB")
+
+
+class JpegDecoder(ImageDecoder):
+    """
+    Base of the accelerated backends, which only handle JPEG and hand every other format to PIL.
+    """
+
+    def __init__(self):
+        self.fallback = PillowDecoder()
+
+    def decode(self, image_data: bytes | memoryview, draft_size: tuple[int, int]) -> DecodedImage:
+        if sniff_image_format(bytes(image_data[:3])) != "JPEG":
+            return self.fallback.decode(image_data, draft_size)
+        try:
+            return self.decode_jpeg(image_data, draft_size)
+        except Exception:
+            # CMYK and other exotic JPEGs are left to PIL, which also reports truly invalid images
+            return self.fallback.decode(image_data, draft_size)
+
+    @abstractmethod
+    def decode_jpeg(self, image_data: bytes | memoryview, draft_size: tuple[int, int]) -> ndarray:
+        ...
+
+
+class TurboJpegDecoder(JpegDecoder):
+    """
+    libjpeg-turbo through PyTurboJPEG, decoding straight to RGB at a reduced DCT scale.
+    """
+
+    name = "turbojpeg"
+
+    @classmethod
+    def is_available(cls) -> bool:
+        if importlib.util.find_spec("turbojpeg") is None:
+            return False
+        try:
+            from turbojpeg import TurboJPEG
+            TurboJPEG()
+        except Exception:
+            # The binding is installed but the shared library is not
+            return False
+        return True
+
+    def __init__(self):
+        super().__init__()
+        from turbojpeg import TurboJPEG, TJPF_RGB, TJFLAG_FASTDCT
+        self._turbo_jpeg = TurboJPEG()
+        self._pixel_format = TJPF_RGB
+        self._flags = TJFLAG_FASTDCT
+
+    def decode_jpeg(self, image_data: bytes | memoryview, draft_size: tuple[int, int]) -> ndarray:
+        width, height, _, _ = self._turbo_jpeg.decode_header(image_data)
+        denominator = jpeg_scale_denominator((width, height), draft_size)
+        return self._turbo_jpeg.decode(
+            image_data,
+            pixel_format=self._pixel_format,
+            scaling_factor=(1, denominator),
+            flags=self._flags
+        )
+
+
+class TensorFlowDecoder(JpegDecoder):
+    """
+    `tf.io.decode_jpeg` with a reduced DCT scale, for images that are already going to TensorFlow.
+    """
+
+    name = "tensorflow"
+    dct_method = "INTEGER_FAST"
+
+    @classmethod
+    def is_available(cls) -> bool:
+        return importlib.util.find_spec("tensorflow") is not None
+
+    def __init__(self):
+        super().__init__()
+        import tensorflow as tf
+        self._tf = tf
+
+    def decode_jpeg(self, image_data: bytes | memoryview, draft_size: tuple[int, int]) -> ndarray:
+        contents = self._tf.constant(bytes(image_data))
+        height, width, _ = self._tf.io.extract_jpeg_shape(contents).numpy()
+        denominator = jpeg_scale_denominator((int(width), int(height)), draft_size)
+        pixels = self._tf.io.decode_jpeg(contents, channels=3, ratio=denominator, dct_method=self.dct_method)
+        return pixels.numpy()
+
+
+IMAGE_DECODERS: dict[str, type[ImageDecoder]] = {
+    decoder.name: decoder for decoder in (PillowDecoder, TurboJpegDecoder, TensorFlowDecoder)
+}
+
+# Backends tried in order by the "auto" setting, TensorFlow is only used when asked for explicitly
+AUTO_DECODERS = (TurboJpegDecoder, PillowDecoder)
+
+
+def create_image_decoder(backend: str) -> ImageDecoder:
+    if backend == "auto":
+        decoder_class = next(decoder for decoder in AUTO_DECODERS if decoder.is_available())
+    else:
+        decoder_class = IMAGE_DECODERS.get(backend)
+        if decoder_class is None:
+            raise ValueError(f"Unknown image decoder {backend}, expected one of {['auto', *IMAGE_DECODERS]}")
+        if not decoder_class.is_available():
+            logger.warning(f"Image decoder {backend} is not installed, falling back to {PillowDecoder.name}")
+            decoder_class = PillowDecoder
+
+    logger.info(f"Image decoder: {decoder_class.name}")
+    return decoder_class()
+
+
+@lru_cache
+def get_image_decoder() -> ImageDecoder:
+    return create_image_decoder(settings.prediction_decoder_backend)
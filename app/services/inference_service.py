@@ -0,0 +1,93 @@
+import threading
+from typing import Optional
+
+import numpy as np
+import tensorflow as tf
+from numpy import ndarray
+
+from app.config import logger
+from app.services.batching_service import batch_size_buckets
+from app.services.prediction_service import model_input_size
+
+
+def embedding_model(model, layer_name: Optional[str] = None):
+    """
+    Model sharing the weights of a classifier and returning the output of its penultimate layer,
+    or of the named one, pooled to one vector per image.
+    """
+    import keras
+
+    layer = model.get_layer(layer_name) if layer_name else model.layers[-2]
+    outputs = layer.output
+    if len(outputs.shape) == 4:
+        outputs = keras.layers.GlobalAveragePooling2D()(outputs)
+    elif len(outputs.shape) > 2:
+        outputs = keras.layers.Flatten()(outputs)
+    return keras.Model(inputs=model.inputs, outputs=outputs, name=f"{model.name}_embedding")
+
+
+class CompiledClassifier:
+    """
+    Shape-stable replacement for keras `Model.predict`.
+    The forward pass is traced once per batch size bucket, and batches are padded
+    up to the nearest bucket so no call ever triggers a new trace.
+    """
+
+    def __init__(self, model, max_batch_size: int):
+        self.model = model
+        self.name = model.name
+        self.input_shape = model.input_shape
+        # Set by the loader, from the file the model was loaded from
+        self.version = "unknown"
+        self.source_path = None
+        self.batch_buckets = batch_size_buckets(max_batch_size)
+
+        width, height = model_input_size(model)
+        self._sample_shape = (height, width, 3)
+        self._forward = tf.function(self._call_model)
+        self._concrete_functions = {}
+        # Padding buffers are per thread, in case several inference threads share the model
+        self._local = threading.local()
+
+    def _call_model(self, x):
+        return self.model(x, training=False)
+
+    def _concrete_function(self, bucket: int):
+        function = self._concrete_functions.get(bucket)
+        if function is None:
+            function = self._forward.get_concrete_function(
+                tf.TensorSpec((bucket, *self._sample_shape), tf.float32)
+            )
+            self._concrete_functions[bucket] = function
+        return function
+
+    def _padding_buffer(self) -> ndarray:
+        buffer = getattr(self._local, "buffer", None)
+        if buffer is None:
+            buffer = np.zeros((self.batch_buckets[-1], *self._sample_shape), dtype=np.float32)
+            self._local.buffer = buffer
+        return buffer
+
+    def warmup(self):
+        for bucket in self.batch_buckets:
+            self._concrete_function(bucket)(tf.zeros((bucket, *self._sample_shape), tf.float32))
+        logger.info(f"Model {self.name} traced for batch sizes {self.batch_buckets}")
+
+    def predict(self, batch: ndarray) -> ndarray:
+        batch_size = batch.shape[0]
+        if batch_size > self.batch_buckets[-1]:
+            return np.concatenate([
+                self.predict(batch[start:start + self.batch_buckets[-1]])
+                for start in range(0, batch_size, self.batch_buckets[-1])
+            ])
+
+        bucket = next(size for size in self.batch_buckets if size >= batch_size)
+        if bucket == batch_size and batch.dtype == np.float32:
+            padded = batch
+        else:
+            # Rows past batch_size hold stale values, their outputs are discarded
+            padded = self._padding_buffer()[:bucket]
+            padded[:batch_size] = batch
+
+        outputs = self._concrete_function(bucket)(tf.constant(padded))
+        return outputs.numpy()[:batch_size]
@@ -0,0 +1,268 @@
+from typing import AsyncIterator, Optional
+
+from PIL import Image, ImageFile
+from fastapi import HTTPException, Request
+from starlette import status
+
+from app.config import get_settings
+from app.services.prometeus_metrics_service import observe_stage
+
+try:
+    from python_multipart.multipart import MultipartParser, parse_options_header
+except ImportError:  # python-multipart < 0.0.13
+    from multipart.multipart import MultipartParser, parse_options_header
+
+settings = get_settings()
+
+# PIL refuses to decode images above this size, keep it in line with the upload limit
+Image.MAX_IMAGE_PIXELS = settings.upload_max_pixels
+
+SIGNATURE_LENGTH = 12
+MULTIPART_OVERHEAD_BYTES = 16 * 1024
+HEADER_CHUNK_BYTES = 64 * 1024
+
+
+def sniff_image_format(head: bytes) -> Optional[str]:
+    if head.startswith(b"\xff\xd8\xff"):
+        return "JPEG"
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "PNG"
+    if head.startswith(b"RIFF") and head[8:12] == b"WEBP":
+        return "WEBP"
+    if head.startswith((b"GIF87a", b"GIF89a")):
+        return "GIF"
+    if head.startswith(b"BM"):
+        return "BMP"
+    if head.startswith((b"II*\x00", b"MM\x00*")):
+        return "TIFF"
+    return None
+
+
+class ImageUploadValidator:
+    """
+    Validates an image while it is being received: size limit on every chunk, format from the magic bytes
+    of the first chunk, and pixel limit as soon as the image header has arrived.
+    The rest of the upload is only buffered once those checks passed.
+    """
+
+    def __init__(self, max_bytes: int, max_pixels: int, allowed_formats: list[str]):
+        self.max_bytes = max_bytes
+        self.max_pixels = max_pixels
+        self.allowed_formats = allowed_formats
+        self.image_format: Optional[str] = None
+        self.image_size: Optional[tuple[int, int]] = None
+        self._buffer = bytearray()
+        self._header_parser: Optional[ImageFile.Parser] = ImageFile.Parser()
+        self._parsed_bytes = 0
+
+    def feed(self, chunk: bytes):
+        self._check_size(len(self._buffer) + len(chunk))
+        self._buffer += chunk
+        self._inspect(self._buffer)
+
+    def validate(self, image_data: bytes | memoryview) -> memoryview:
+        """
+        Applies the same checks to an image that is already in memory, without copying it.
+        """
+        image_data = memoryview(image_data).cast("B")
+        self._check_size(len(image_data))
+        # The header is parsed chunk by chunk, the rest of the image is never fed to the header parser
+        for end in range(HEADER_CHUNK_BYTES, len(image_data) + HEADER_CHUNK_BYTES, HEADER_CHUNK_BYTES):
+            self._inspect(image_data[:end])
+            if self.image_size is not None:
+                break
+        return self._result(image_data)
+
+    def _check_size(self, size: int):
+        if size > self.max_bytes:
+            raise HTTPException(
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                detail=f"Image is larger than {self.max_bytes} bytes"
+            )
+
+    def _inspect(self, data):
+        if self.image_format is None and len(data) >= SIGNATURE_LENGTH:
+            self._check_format(data)
+        if self.image_format is not None and self.image_size is None:
+            self._check_header(data)
+
+    def _check_format(self, data):
+        image_format = sniff_image_format(bytes(data[:SIGNATURE_LENGTH]))
+        if image_format is None or image_format not in self.allowed_formats:
+            raise HTTPException(
+                status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+                detail=f"Unsupported image format, expected one of {self.allowed_formats}"
+            )
+        self.image_format = image_format
+
+    def _check_header(self, data):
+        # The incremental parser knows the image size as soon as the header is complete
+        new_data = bytes(data[self._parsed_bytes:])
+        self._parsed_bytes = len(data)
+        try:
+            self._header_parser.feed(new_data)
+        except Image.DecompressionBombError:
+            self._too_many_pixels()
+        except Exception:
+            raise HTTPException(
+                status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+                detail="Invalid image header"
+            )
+        if self._header_parser.image is None:
+            return
+
+        self.image_size = self._header_parser.image.size
+        self._header_parser = None
+        width, height = self.image_size
+        if width * height > self.max_pixels:
+            self._too_many_pixels()
+
+    def _too_many_pixels(self):
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Image is larger than {self.max_pixels} pixels"
+        )
+
+    def _result(self, data) -> memoryview:
+        if self.image_format is None or self.image_size is None:
+            raise HTTPException(
+                status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+                detail="Upload is not a valid image"
+            )
+        return memoryview(data)
+
+    def result(self) -> memoryview:
+        return self._result(self._buffer)
+
+
+def create_validator() -> ImageUploadValidator:
+    return ImageUploadValidator(
+        max_bytes=settings.upload_max_bytes,
+        max_pixels=settings.upload_max_pixels,
+        allowed_formats=settings.upload_allowed_formats
+    )
+
+
+def validate_image(image_data: bytes | memoryview) -> memoryview:
+    return create_validator().validate(image_data)
+
+
+async def _feed_multipart(
+        validator: ImageUploadValidator,
+        stream: AsyncIterator[bytes],
+        content_type_options: dict,
+        field_name: str
+):
+    boundary = content_type_options.get(b"boundary")
+    if not boundary:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Missing multipart boundary"
+        )
+
+    state = {"header_field": b"", "header_value": b"", "in_field": False, "found": False}
+    errors = []
+
+    def on_part_begin():
+        state["in_field"] = False
+
+    def on_header_field(data, start, end):
+        state["header_field"] += data[start:end]
+
+    def on_header_value(data, start, end):
+        state["header_value"] += data[start:end]
+
+    def on_header_end():
+        if state["header_field"].lower() == b"content-disposition":
+            _, options = parse_options_header(state["header_value"])
+            # Only the first part of the expected field is the image, other fields are ignored
+            if options.get(b"name", b"").decode("latin-1") == field_name and not state["found"]:
+                state["in_field"] = True
+                state["found"] = True
+        state["header_field"] = b""
+        state["header_value"] = b""
+
+    def on_part_data(data, start, end):
+        if state["in_field"] and not errors:
+            try:
+                validator.feed(data[start:end])
+            except HTTPException as http_exc:
+                errors.append(http_exc)
+
+    parser = MultipartParser(boundary, {
+        "on_part_begin": on_part_begin,
+        "on_header_field": on_header_field,
+        "on_header_value": on_header_value,
+        "on_header_end": on_header_end,
+        "on_part_data": on_part_data,
+    })
+
+    async for chunk in stream:
+        parser.write(chunk)
+        # Stop reading as soon as the image is rejected
+        if errors:
+            raise errors[0]
+    parser.finalize()
+
+    if not state["found"]:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"Missing file field {field_name}"
+        )
+
+
+async def read_image_upload(request: Request, field_name: str = "image_file") -> memoryview:
+    """
+    Streams an image upload, sent either as multipart form data or as a raw image body, and validates it
+    while it is received.
+    """
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() \
+            and int(content_length) > settings.upload_max_bytes + MULTIPART_OVERHEAD_BYTES:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Image is larger than {settings.upload_max_bytes} bytes"
+        )
+
+    validator = create_validator()
+    content_type, options = parse_options_header(request.headers.get("content-type", ""))
+
+    if content_type == b"multipart/form-data":
+        await _feed_multipart(validator, request.stream(), options, field_name)
+    else:
+        async for chunk in request.stream():
+            validator.feed(chunk)
+
+    return validator.result()
+
+
+class ImageUpload:
+    """
+    Dependency reading the uploaded image of a prediction route.
+    """
+
+    def __init__(self, model: str, endpoint: str):
+        self.model = model
+        self.endpoint = endpoint
+
+    async def __call__(self, request: Request) -> memoryview:
+        with observe_stage("upload_read", self.model, self.endpoint):
+            return await read_image_upload(request)
+
+
+# Request body documentation of the routes reading their image with ImageUpload
+IMAGE_UPLOAD_OPENAPI = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "multipart/form-data": {
+                "schema": {
+                    "type": "object",
+                    "properties": {"image_file": {"type": "string", "format": "binary"}},
+                    "required": ["image_file"],
+                }
+            },
+            "image/*": {"schema": {"type": "string", "format": "binary"}},
+        },
+    }
+}
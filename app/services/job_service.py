@@ -0,0 +1,339 @@
+import asyncio
+import json
+import os
+import sqlite3
+import time
+import uuid
+from contextlib import contextmanager
+from functools import lru_cache
+from itertools import islice
+from typing import Iterator, Optional
+
+from fastapi import HTTPException, UploadFile
+
+from app.config import get_settings, logger
+from app.services.archive_service import iter_batch_items, unique_filename
+from app.services.deadline_service import RequestDeadline
+from app.services.model_registry import ModelRegistry
+from app.services.prometeus_metrics_service import PREDICTION_JOB_IMAGES
+
+settings = get_settings()
+
+# Images written per transaction while a job is uploaded, so workers can already claim the first ones
+INSERT_CHUNK_SIZE = 64
+PURGE_INTERVAL_SECONDS = 60
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    model TEXT NOT NULL,
+    status TEXT NOT NULL,
+    total INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    finished_at REAL
+);
+CREATE TABLE IF NOT EXISTS job_items (
+    id INTEGER PRIMARY KEY,
+    job_id TEXT NOT NULL REFERENCES jobs (id) ON DELETE CASCADE,
+    model TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    filename TEXT NOT NULL,
+    image BLOB,
+    status TEXT NOT NULL,
+    claimed_at REAL,
+    predictions TEXT,
+    model_version TEXT,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS job_items_queue ON job_items (status, model, id);
+CREATE INDEX IF NOT EXISTS job_items_job ON job_items (job_id, position);
+"""
+
+
+class JobStore:
+    """
+    Durable queue of prediction jobs in SQLite, shared by the worker processes of a host.
+    A job is uploading while its images are written, queued until a worker claims its first images,
+    running while images are left and done once every image has a prediction or an error.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connection() as connection:
+            # Readers polling jobs do not block the workers writing results
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.executescript(SCHEMA)
+
+    @contextmanager
+    def _connection(self) -> Iterator[sqlite3.Connection]:
+        connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        connection.execute("PRAGMA foreign_keys=ON")
+        try:
+            yield connection
+        finally:
+            connection.close()
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        with self._connection() as connection:
+            # Takes the write lock up front, two workers never claim the same images
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                yield connection
+            except BaseException:
+                connection.execute("ROLLBACK")
+                raise
+            connection.execute("COMMIT")
+
+    def create_job(self, model: str, files: list[UploadFile]) -> str:
+        job_id = uuid.uuid4().hex
+        with self._transaction() as connection:
+            connection.execute(
+                "INSERT INTO jobs (id, model, status, created_at) VALUES (?, ?, 'uploading', ?)",
+                (job_id, model, time.time())
+            )
+
+        items = enumerate(iter_batch_items(files, settings.jobs_max_files))
+        total = 0
+        try:
+            while chunk := list(islice(items, INSERT_CHUNK_SIZE)):
+                with self._transaction() as connection:
+                    connection.executemany(
+                        "INSERT INTO job_items (job_id, model, position, filename, image, status, error) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                        [
+                            (
+                                job_id, model, position, filename,
+                                bytes(image_data) if image_data is not None else None,
+                                "pending" if error is None else "failed",
+                                error
+                            )
+                            for position, (filename, image_data, error) in chunk
+                        ]
+                    )
+                total += len(chunk)
+        except BaseException:
+            # A job that was not fully uploaded would never finish
+            self.delete_job(job_id)
+            raise
+
+        with self._transaction() as connection:
+            connection.execute("UPDATE jobs SET status = 'queued', total = ? WHERE id = ?", (total, job_id))
+            self._finish_jobs(connection, [job_id])
+        return job_id
+
+    def claim(self, limit: int) -> Optional[tuple[str, list[tuple[int, bytes]]]]:
+        """
+        Marks up to `limit` of the oldest pending images of a single model as running, and returns them.
+        """
+        now = time.time()
+        with self._transaction() as connection:
+            # Images claimed by a worker that died are queued again
+            connection.execute(
+                "UPDATE job_items SET status = 'pending', claimed_at = NULL WHERE status = 'running' AND claimed_at < ?",
+                (now - settings.jobs_claim_timeout_seconds,)
+            )
+            oldest = connection.execute(
+                "SELECT model FROM job_items WHERE status = 'pending' ORDER BY id LIMIT 1"
+            ).fetchone()
+            if oldest is None:
+                return None
+
+            model = oldest[0]
+            rows = connection.execute(
+                "SELECT id, job_id, image FROM job_items WHERE status = 'pending' AND model = ? ORDER BY id LIMIT ?",
+                (model, limit)
+            ).fetchall()
+            connection.executemany(
+                "UPDATE job_items SET status = 'running', claimed_at = ? WHERE id = ?",
+                [(now, item_id) for item_id, _, _ in rows]
+            )
+            connection.executemany(
+                "UPDATE jobs SET status = 'running' WHERE id = ? AND status = 'queued'",
+                [(job_id,) for job_id in {job_id for _, job_id, _ in rows}]
+            )
+        return model, [(item_id, image) for item_id, _, image in rows]
+
+    def complete(self, results: list[tuple[int, Optional[list[float]], Optional[str], Optional[str]]]):
+        """
+        Stores the (image id, predictions, model version, error) of claimed images and finishes their jobs.
+        """
+        with self._transaction() as connection:
+            connection.executemany(
+                "UPDATE job_items SET status = ?, image = NULL, predictions = ?, model_version = ?, error = ? "
+                "WHERE id = ? AND status = 'running'",
+                [
+                    (
+                        "done" if error is None else "failed",
+                        json.dumps(predictions) if predictions is not None else None,
+                        model_version,
+                        error,
+                        item_id
+                    )
+                    for item_id, predictions, model_version, error in results
+                ]
+            )
+            job_ids = connection.execute(
+                f"SELECT DISTINCT job_id FROM job_items WHERE id IN ({','.join('?' * len(results))})",
+                [item_id for item_id, _, _, _ in results]
+            ).fetchall()
+            self._finish_jobs(connection, [job_id for (job_id,) in job_ids])
+
+    def release(self, item_ids: list[int]):
+        with self._transaction() as connection:
+            connection.executemany(
+                "UPDATE job_items SET status = 'pending', claimed_at = NULL WHERE id = ? AND status = 'running'",
+                [(item_id,) for item_id in item_ids]
+            )
+
+    def _finish_jobs(self, connection: sqlite3.Connection, job_ids: list[str]):
+        for job_id in job_ids:
+            connection.execute(
+                "UPDATE jobs SET status = 'done', finished_at = ? "
+                "WHERE id = ? AND status IN ('queued', 'running') AND NOT EXISTS ("
+                "SELECT 1 FROM job_items WHERE job_id = ? AND status IN ('pending', 'running'))",
+                (time.time(), job_id, job_id)
+            )
+
+    def get_job(self, job_id: str, include_results: bool = True) -> Optional[dict]:
+        with self._connection() as connection:
+            row = connection.execute(
+                "SELECT model, status, total, created_at, finished_at FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            counts = dict(connection.execute(
+                "SELECT status, COUNT(*) FROM job_items WHERE job_id = ? GROUP BY status", (job_id,)
+            ).fetchall())
+
+            job = {
+                "job_id": job_id,
+                "model": row[0],
+                "status": row[1],
+                "total": row[2],
+                "completed": counts.get("done", 0),
+                "failed": counts.get("failed", 0),
+                "created_at": row[3],
+                "finished_at": row[4],
+            }
+            if include_results:
+                results = {}
+                for filename, predictions, model_version, error in connection.execute(
+                        "SELECT filename, predictions, model_version, error FROM job_items "
+                        "WHERE job_id = ? AND status IN ('done', 'failed') ORDER BY position",
+                        (job_id,)
+                ):
+                    key = unique_filename(filename, results)
+                    if error is not None:
+                        results[key] = {"error": error}
+                    else:
+                        results[key] = {"predictions": json.loads(predictions), "model_version": model_version}
+                job["results"] = results
+        return job
+
+    def delete_job(self, job_id: str) -> bool:
+        with self._transaction() as connection:
+            return connection.execute("DELETE FROM jobs WHERE id = ?", (job_id,)).rowcount > 0
+
+    def purge(self, finished_before: float) -> int:
+        with self._transaction() as connection:
+            return connection.execute(
+                "DELETE FROM jobs WHERE finished_at < ?", (finished_before,)
+            ).rowcount
+
+
+class JobWorker:
+    """
+    Drains the job queue through the served prediction service, one model-sized batch of images at a time.
+    Jobs run at low priority: when interactive requests fill the models, their images are shed and queued again.
+    """
+
+    def __init__(self, store: JobStore, registry: ModelRegistry):
+        self.store = store
+        self.registry = registry
+        self._tasks: list[asyncio.Task] = []
+        self._last_purge = 0.0
+
+    def start(self):
+        self._tasks = [
+            asyncio.create_task(self._run(), name=f"prediction-job-worker-{index}")
+            for index in range(settings.jobs_concurrency)
+        ]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _run(self):
+        while True:
+            try:
+                if not self.registry.is_ready:
+                    await asyncio.sleep(settings.jobs_poll_interval_seconds)
+                    continue
+                await self._purge()
+                claimed = await asyncio.to_thread(self.store.claim, settings.prediction_max_batch_size)
+                if claimed is None:
+                    await asyncio.sleep(settings.jobs_poll_interval_seconds)
+                    continue
+                await self._predict(*claimed)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Prediction job worker failed: {e}")
+                await asyncio.sleep(settings.jobs_poll_interval_seconds)
+
+    async def _purge(self):
+        if time.monotonic() - self._last_purge < PURGE_INTERVAL_SECONDS:
+            return
+        self._last_purge = time.monotonic()
+        purged = await asyncio.to_thread(self.store.purge, time.time() - settings.jobs_retention_seconds)
+        if purged:
+            logger.info(f"Purged {purged} finished prediction jobs")
+
+    async def _predict(self, model: str, items: list[tuple[int, bytes]]):
+        item_ids = [item_id for item_id, _ in items]
+        try:
+            with self.registry.lease() as prediction_service:
+                results = await prediction_service.predict_images(
+                    model,
+                    [image for _, image in items],
+                    endpoint=f"{model}_job",
+                    deadline=RequestDeadline(None, "low")
+                )
+        except HTTPException as http_exc:
+            # Shed or models not served: the images wait in the queue for capacity
+            await asyncio.to_thread(self.store.release, item_ids)
+            PREDICTION_JOB_IMAGES.labels(model=model, outcome="requeued").inc(len(item_ids))
+            logger.info(f"Requeued {len(item_ids)} job images: {http_exc.detail}")
+            await asyncio.sleep(settings.prediction_retry_after_seconds)
+            return
+        except BaseException:
+            # Off the event loop like every store call, and shielded so a second cancellation cannot interrupt it
+            await asyncio.shield(asyncio.to_thread(self.store.release, item_ids))
+            raise
+
+        completed = []
+        for item_id, result in zip(item_ids, results):
+            if isinstance(result, Exception):
+                completed.append((item_id, None, None, f"Error when predicting with {model} classifier {str(result)}"))
+            else:
+                prediction, version = result
+                completed.append((item_id, prediction.tolist(), version, None))
+        await asyncio.to_thread(self.store.complete, completed)
+
+        failed = sum(error is not None for _, _, _, error in completed)
+        PREDICTION_JOB_IMAGES.labels(model=model, outcome="done").inc(len(completed) - failed)
+        PREDICTION_JOB_IMAGES.labels(model=model, outcome="failed").inc(failed)
+
+
+@lru_cache()
+def get_job_store() -> JobStore:
+    path = settings.jobs_database_path
+    if not os.path.isabs(path):
+        path = os.path.join(settings.project_root, path)
+    return JobStore(path)
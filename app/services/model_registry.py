@@ -0,0 +1,306 @@
+import asyncio
+import gc
+import os
+import time
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import Any, Callable, Iterator, Optional
+
+from fastapi import HTTPException
+from starlette import status
+
+from app.classifier_models import configure_devices, load_binary_classifier, load_embedder, \
+    load_multiclass_classifier
+from app.config import get_settings, logger
+from app.services.embedding_index import EmbeddingIndex
+from app.services.prediction_service import PredictionService
+
+settings = get_settings()
+
+MODELS = ("binary", "multiclass")
+DRAIN_POLL_SECONDS = 0.05
+
+
+def _file_signature(path: Any) -> Optional[tuple[int, int]]:
+    if not isinstance(path, str):
+        return None
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+class _ServedVersion:
+    """
+    One set of loaded models, with the number of requests currently using it.
+    """
+
+    __slots__ = ("prediction_service", "leases")
+
+    def __init__(self, prediction_service: PredictionService):
+        self.prediction_service = prediction_service
+        self.leases = 0
+
+
+class ModelRegistry:
+    """
+    Loads the classifiers concurrently, warms them up and tracks whether the service can take traffic.
+    Reloads load and warm up the new models next to the served ones, swap them in, and stop the previous
+    version once the requests that started on it are finished.
+    """
+
+    def __init__(
+            self,
+            binary_loader: Callable[[Optional[str]], Any],
+            multiclass_loader: Callable[[Optional[str]], Any],
+            configure: Optional[Callable[[], None]] = None,
+            embedder_factory: Optional[Callable[[Any], Any]] = None
+    ):
+        self.loaders = {"binary": binary_loader, "multiclass": multiclass_loader}
+        self.configure = configure
+        self.embedder_factory = embedder_factory
+        # Memory-mapped, loaded once and shared by every model version
+        self.embedding_index: Optional[EmbeddingIndex] = None
+        self.state = "starting"
+        # None means the path configured in the settings
+        self.model_paths: dict[str, Optional[str]] = {model: None for model in MODELS}
+        self._served: Optional[_ServedVersion] = None
+        self._retiring: set[asyncio.Task] = set()
+        self._reload_lock = asyncio.Lock()
+        self._file_signatures: dict[str, Optional[tuple[int, int]]] = {}
+        self._watch_task: Optional[asyncio.Task] = None
+
+    @property
+    def is_ready(self) -> bool:
+        return self.state == "ready"
+
+    @property
+    def prediction_service(self) -> Optional[PredictionService]:
+        return self._served.prediction_service if self._served is not None else None
+
+    @contextmanager
+    def lease(self) -> Iterator[PredictionService]:
+        """
+        Hands out the served prediction service, which is not stopped by a reload until every lease is released.
+        """
+        served = self._served
+        if served is None:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Models are not loaded yet",
+                headers={"Retry-After": str(settings.prediction_retry_after_seconds)}
+            )
+        served.leases += 1
+        try:
+            yield served.prediction_service
+        finally:
+            served.leases -= 1
+
+    async def _load_models(self, model_paths: dict[str, Optional[str]]) -> dict[str, Any]:
+        models = await asyncio.gather(
+            *(asyncio.to_thread(self.loaders[model], path) for model, path in model_paths.items())
+        )
+        return dict(zip(model_paths, models))
+
+    def _record_model_files(self, models: dict[str, Any]):
+        for model, loaded_model in models.items():
+            self._file_signatures[model] = _file_signature(getattr(loaded_model, "source_path", None))
+
+    async def _load_embedding_index(self):
+        if not settings.embedding_index_path:
+            return
+        path = os.path.join(settings.project_root, settings.embedding_index_path)
+        try:
+            self.embedding_index = await asyncio.to_thread(EmbeddingIndex, path)
+        except Exception as e:
+            # Similar image search is optional, predictions are served without it
+            logger.error(f"Failed to load the embedding index {path}, similar image search is disabled: {e}")
+            return
+        logger.info(
+            f"Loaded embedding index of {len(self.embedding_index)} images from {path}, "
+            f"built with multiclass model version {self.embedding_index.model_version}"
+        )
+
+    async def _load_embedder(self, multiclass_model) -> Any:
+        if self.embedding_index is None or self.embedder_factory is None:
+            return None
+        try:
+            return await asyncio.to_thread(self.embedder_factory, multiclass_model)
+        except Exception as e:
+            logger.error(f"Failed to build the image embedder, similar image search is disabled: {e}")
+            return None
+
+    async def load(self):
+        self.state = "loading"
+        try:
+            if self.configure is not None:
+                await asyncio.to_thread(self.configure)
+
+            candidate_paths = {
+                model: path
+                for model, path in (
+                    ("binary", settings.candidate_binary_model_path),
+                    ("multiclass", settings.candidate_multiclass_model_path)
+                )
+                if path
+            }
+            models, candidate_models, _ = await asyncio.gather(
+                self._load_models(self.model_paths),
+                self._load_models(candidate_paths),
+                self._load_embedding_index()
+            )
+
+            prediction_service = PredictionService(
+                binary_model=models["binary"],
+                multiclass_model=models["multiclass"],
+                binary_candidate_model=candidate_models.get("binary"),
+                multiclass_candidate_model=candidate_models.get("multiclass"),
+                embedder=await self._load_embedder(models["multiclass"]),
+                embedding_index=self.embedding_index
+            )
+            await prediction_service.warmup()
+            prediction_service.start()
+        except Exception as e:
+            self.state = "failed"
+            logger.error(f"Failed to load models: {e}")
+            raise
+
+        self._served = _ServedVersion(prediction_service)
+        self._record_model_files(models)
+        self.state = "ready"
+        logger.info(
+            f"Models loaded and warmed up, ready to serve predictions {prediction_service.model_versions}, "
+            f"candidates {prediction_service.candidate_versions}"
+        )
+
+        if settings.model_watch_interval_seconds > 0:
+            self._watch_task = asyncio.create_task(self._watch_model_files(settings.model_watch_interval_seconds))
+
+    async def reload(
+            self,
+            models: Optional[list[str]] = None,
+            model_paths: Optional[dict[str, str]] = None
+    ) -> dict[str, str]:
+        """
+        Loads new versions of the given models, from new paths if given, and swaps them in.
+        Returns the versions now being served.
+        """
+        if self._served is None:
+            raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Models are not loaded yet")
+        if self._reload_lock.locked():
+            raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="A model reload is already running")
+
+        model_paths = model_paths or {}
+        models = list(models or model_paths or MODELS)
+
+        async with self._reload_lock:
+            previous = self._served
+            started_at = time.perf_counter()
+
+            paths = {model: model_paths.get(model) or self.model_paths[model] for model in models}
+            loaded = {
+                "binary": previous.prediction_service.binary_model,
+                "multiclass": previous.prediction_service.multiclass_model,
+                **await self._load_models(paths),
+            }
+
+            # Models that were not reloaded are shared with the previous version, and so are the candidates and the cache,
+            # whose keys include the model versions
+            candidates = previous.prediction_service.candidates
+            embedder = previous.prediction_service.embedder
+            if "multiclass" in models:
+                embedder = await self._load_embedder(loaded["multiclass"])
+            prediction_service = PredictionService(
+                binary_model=loaded["binary"],
+                multiclass_model=loaded["multiclass"],
+                cache=previous.prediction_service.cache,
+                binary_candidate_model=candidates["binary"].model if "binary" in candidates else None,
+                multiclass_candidate_model=candidates["multiclass"].model if "multiclass" in candidates else None,
+                embedder=embedder,
+                embedding_index=self.embedding_index
+            )
+            await prediction_service.warmup()
+            prediction_service.start()
+
+            self._served = _ServedVersion(prediction_service)
+            self.model_paths.update(paths)
+            self._record_model_files({model: loaded[model] for model in models})
+
+            task = asyncio.create_task(self._retire(previous))
+            self._retiring.add(task)
+            task.add_done_callback(self._retiring.discard)
+
+        logger.info(
+            f"Reloaded {models} in {time.perf_counter() - started_at:.1f}s, "
+            f"serving {prediction_service.model_versions}"
+        )
+        return prediction_service.model_versions
+
+    async def _retire(self, served: _ServedVersion):
+        try:
+            deadline = time.monotonic() + settings.model_reload_drain_seconds
+            while served.leases and time.monotonic() < deadline:
+                await asyncio.sleep(DRAIN_POLL_SECONDS)
+            if served.leases:
+                logger.warning(f"Stopping previous model version with {served.leases} requests still running")
+        finally:
+            await served.prediction_service.stop()
+            served.prediction_service = None
+            # Release the previous models' memory now rather than at some later collection
+            gc.collect()
+
+    async def _watch_model_files(self, interval: float):
+        # A file seen changing is only reloaded once it stayed the same for a whole interval,
+        # so models are not loaded while they are still being copied
+        pending: dict[str, tuple[int, int]] = {}
+        while True:
+            await asyncio.sleep(interval)
+            served = self.prediction_service
+            if served is None:
+                continue
+            changed = []
+            for model in MODELS:
+                source_path = getattr(getattr(served, f"{model}_model"), "source_path", None)
+                signature = _file_signature(source_path)
+                if signature is None or signature == self._file_signatures.get(model):
+                    pending.pop(model, None)
+                elif pending.get(model) != signature:
+                    pending[model] = signature
+                else:
+                    changed.append(model)
+
+            if changed and not self._reload_lock.locked():
+                logger.info(f"Model files of {changed} changed, reloading")
+                try:
+                    await self.reload(changed)
+                except Exception as e:
+                    logger.error(f"Failed to reload models {changed}: {e}")
+                    # Do not retry the same broken file on every check
+                    for model in changed:
+                        self._file_signatures[model] = pending[model]
+                for model in changed:
+                    pending.pop(model, None)
+
+    async def close(self):
+        self.state = "stopped"
+        if self._watch_task is not None:
+            self._watch_task.cancel()
+            await asyncio.gather(self._watch_task, return_exceptions=True)
+            self._watch_task = None
+        for task in list(self._retiring):
+            task.cancel()
+        await asyncio.gather(*self._retiring, return_exceptions=True)
+        if self._served is not None:
+            await self._served.prediction_service.stop()
+            self._served = None
+
+
+@lru_cache()
+def get_model_registry() -> ModelRegistry:
+    return ModelRegistry(
+        binary_loader=load_binary_classifier,
+        multiclass_loader=load_multiclass_classifier,
+        configure=configure_devices,
+        embedder_factory=load_embedder
+    )
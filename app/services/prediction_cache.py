@@ -0,0 +1,135 @@
+import hashlib
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Optional
+
+import numpy as np
+from numpy import ndarray
+
+from app.config import logger
+from app.services.prometeus_metrics_service import PREDICTION_CACHE_HITS, PREDICTION_CACHE_MISSES
+
+
+class SharedCacheBackend(ABC):
+    """
+    Cache shared between processes or hosts (Redis, memcached...), consulted after the in-process LRU.
+    Its methods are awaited on the event loop, implementations use an asyncio client and never block.
+    """
+
+    @abstractmethod
+    async def get(self, key: str) -> Optional[bytes]:
+        ...
+
+    @abstractmethod
+    async def set(self, key: str, value: bytes, ttl_seconds: float):
+        ...
+
+
+class InMemorySharedCacheBackend(SharedCacheBackend):
+    # Local stand-in for a shared backend, used in tests and single process deployments
+
+    def __init__(self):
+        self._entries: dict[str, tuple[bytes, float]] = {}
+
+    async def get(self, key: str) -> Optional[bytes]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            return None
+        return value
+
+    async def set(self, key: str, value: bytes, ttl_seconds: float):
+        self._entries[key] = (value, time.monotonic() + ttl_seconds)
+
+
+class PredictionCache:
+    """
+    Content-addressed cache of predictions, keyed by a hash of the raw upload bytes and the model identity.
+    Entries are evicted in least recently used order once either the entry or the byte limit is reached.
+    """
+
+    def __init__(
+            self,
+            max_entries: int,
+            max_bytes: int,
+            ttl_seconds: float,
+            shared_backend: Optional[SharedCacheBackend] = None
+    ):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.shared_backend = shared_backend
+        self._entries: OrderedDict[str, tuple[ndarray, float]] = OrderedDict()
+        self._size_bytes = 0
+
+    @staticmethod
+    def key(image_data: bytes, model_id: str) -> str:
+        digest = hashlib.blake2b(image_data, digest_size=16).hexdigest()
+        return f"{model_id}:{digest}"
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def size_bytes(self) -> int:
+        return self._size_bytes
+
+    async def get(self, key: str, model: str) -> Optional[ndarray]:
+        entry = self._entries.get(key)
+        if entry is not None:
+            prediction, expires_at = entry
+            if expires_at >= time.monotonic():
+                self._entries.move_to_end(key)
+                PREDICTION_CACHE_HITS.labels(model=model, tier="local").inc()
+                return prediction
+            self._remove(key)
+
+        if self.shared_backend is not None:
+            try:
+                value = await self.shared_backend.get(key)
+            except Exception as e:
+                # An unavailable shared cache is a miss, the prediction is still served
+                logger.warning(f"Shared prediction cache lookup failed: {e}")
+                value = None
+            if value is not None:
+                prediction = np.frombuffer(value, dtype=np.float32)
+                self._store(key, prediction)
+                PREDICTION_CACHE_HITS.labels(model=model, tier="shared").inc()
+                return prediction
+
+        PREDICTION_CACHE_MISSES.labels(model=model).inc()
+        return None
+
+    async def put(self, key: str, prediction: ndarray):
+        prediction = np.array(prediction, dtype=np.float32)
+        self._store(key, prediction)
+        if self.shared_backend is not None:
+            try:
+                await self.shared_backend.set(key, prediction.tobytes(), self.ttl_seconds)
+            except Exception as e:
+                logger.warning(f"Shared prediction cache update failed: {e}")
+
+    def _store(self, key: str, prediction: ndarray):
+        # Cached arrays are handed to several callers, none of them may modify it
+        prediction.setflags(write=False)
+        if key in self._entries:
+            self._remove(key)
+
+        entry_bytes = prediction.nbytes + len(key)
+        if entry_bytes > self.max_bytes:
+            return
+
+        self._entries[key] = (prediction, time.monotonic() + self.ttl_seconds)
+        self._size_bytes += entry_bytes
+
+        while len(self._entries) > self.max_entries or self._size_bytes > self.max_bytes:
+            oldest_key = next(iter(self._entries))
+            self._remove(oldest_key)
+
+    def _remove(self, key: str):
+        prediction, _ = self._entries.pop(key)
+        self._size_bytes -= prediction.nbytes + len(key)
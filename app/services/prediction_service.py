@@ -1,45 +1,600 @@
-from typing import Any
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager, nullcontext
+from functools import partial
+from typing import Optional
 
 import numpy as np
 from PIL import Image
-from fastapi import UploadFile
-from numpy import ndarray, dtype, generic
+from fastapi import UploadFile, HTTPException
+from starlette import status
+from numpy import ndarray
 
+from app.config import get_settings
+from app.services.archive_service import iter_batch_items, take, unique_filename
+from app.services.batching_service import MicroBatcher
+from app.services.candidate_service import CandidateModel
+from app.services.deadline_service import RequestDeadline
+from app.services.dedupe_service import DedupeIndex, perceptual_hash
+from app.services.embedding_index import EmbeddingIndex
+from app.services.image_decoders import DecodedImage, get_image_decoder
+from app.services.prediction_cache import PredictionCache
+from app.services.prometeus_metrics_service import PREDICTION_MODEL_LATENCY, PREDICTION_SHED, observe_stage
 
-def prepare_input_tensor(image_file: UploadFile) -> ndarray[Any, dtype[generic | Any]]:
-    # If image is bytes convert to PIL image
+settings = get_settings()
 
-    image = Image.open(image_file.file).convert("RGB")
 
-    image_array = np.array(image)
+def model_input_size(model) -> tuple[int, int]:
+    # Keras models declare their input as (batch, height, width, channels)
+    _, height, width, _ = model.input_shape
+    default_size = settings.prediction_default_input_size
+    return width or default_size, height or default_size
 
-    return np.expand_dims(image_array, axis=0)
+
+def decode_image(
+        image_data: bytes | memoryview,
+        draft_size: tuple[int, int],
+        model: str = "unknown",
+        endpoint: str = "unknown"
+) -> DecodedImage:
+    with observe_stage("decode", model, endpoint):
+        return get_image_decoder().decode(image_data, draft_size)
+
+
+def image_to_tensor(
+        image: DecodedImage,
+        target_size: tuple[int, int],
+        out: Optional[ndarray] = None,
+        model: str = "unknown",
+        endpoint: str = "unknown"
+) -> ndarray:
+    if isinstance(image, ndarray):
+        if image.shape[1::-1] == target_size:
+            pixels = image
+        else:
+            with observe_stage("resize", model, endpoint):
+                pixels = Image.fromarray(image).resize(target_size, Image.Resampling.BILINEAR)
+    elif image.size != target_size:
+        with observe_stage("resize", model, endpoint):
+            pixels = image.resize(target_size, Image.Resampling.BILINEAR)
+    else:
+        pixels = image
+
+    if out is None:
+        out = np.empty((1, target_size[1], target_size[0], 3), dtype=np.float32)
+
+    # uint8 to float32 conversion and copy into the buffer in a single pass
+    out[0] = np.asarray(pixels)
+    if settings.prediction_input_scale != 1.0:
+        out *= settings.prediction_input_scale
+
+    return out
+
+
+def prepare_input_tensor(
+        image_data: bytes | memoryview,
+        target_size: tuple[int, int],
+        out: Optional[ndarray] = None,
+        model: str = "unknown",
+        endpoint: str = "unknown"
+) -> ndarray:
+    """
+    Decodes an uploaded image into a (1, height, width, 3) float32 tensor of the model's input size.
+    """
+    image = decode_image(image_data, target_size, model, endpoint)
+    return image_to_tensor(image, target_size, out, model, endpoint)
+
+
+def prepare_cascade_tensors(
+        image_data: bytes | memoryview,
+        binary_size: tuple[int, int],
+        multiclass_size: tuple[int, int],
+        endpoint: str = "unknown"
+) -> tuple[ndarray, DecodedImage]:
+    # Decode once, large enough for both models, and keep the image for the multiclass stage
+    draft_size = (max(binary_size[0], multiclass_size[0]), max(binary_size[1], multiclass_size[1]))
+    image = decode_image(image_data, draft_size, "binary", endpoint)
+    return image_to_tensor(image, binary_size, model="binary", endpoint=endpoint), image
 
 class PredictionService:
-    def __init__(self, binary_model, multiclass_model):
+    def __init__(
+            self,
+            binary_model,
+            multiclass_model,
+            cache: Optional[PredictionCache] = None,
+            binary_candidate_model=None,
+            multiclass_candidate_model=None,
+            embedder=None,
+            embedding_index: Optional[EmbeddingIndex] = None
+    ):
         self.binary_model = binary_model
         self.multiclass_model = multiclass_model
+        self.binary_model_version = str(getattr(binary_model, "version", "unknown"))
+        self.multiclass_model_version = str(getattr(multiclass_model, "version", "unknown"))
+        # The version is part of the cache key, a reloaded model never serves its predecessor's predictions
+        self.binary_model_id = f"binary:{binary_model.name}:{self.binary_model_version}"
+        self.multiclass_model_id = f"multiclass:{multiclass_model.name}:{self.multiclass_model_version}"
+        self.binary_input_size = model_input_size(binary_model)
+        self.multiclass_input_size = model_input_size(multiclass_model)
+
+        # PIL decoding and model forward passes are blocking, keep them off the event loop
+        self.decode_executor = ThreadPoolExecutor(
+            max_workers=settings.prediction_decode_workers,
+            thread_name_prefix="prediction-decode"
+        )
+        self.inference_executor = ThreadPoolExecutor(
+            max_workers=settings.prediction_inference_workers,
+            thread_name_prefix="prediction-inference"
+        )
+        self._in_flight = 0
+
+        if cache is None and settings.prediction_cache_enabled:
+            cache = PredictionCache(
+                max_entries=settings.prediction_cache_max_entries,
+                max_bytes=settings.prediction_cache_max_bytes,
+                ttl_seconds=settings.prediction_cache_ttl_seconds
+            )
+        self.cache = cache
+        # Not shared across reloads, near-duplicates only reuse predictions of the same model versions
+        self.dedupe = DedupeIndex(
+            max_entries=settings.prediction_dedupe_max_entries,
+            max_distance=settings.prediction_dedupe_max_distance,
+            window_seconds=settings.prediction_dedupe_window_seconds
+        ) if settings.prediction_dedupe_enabled else None
+
+        self.binary_batcher = MicroBatcher(
+            name="binary",
+            predict_fn=self.binary_model.predict,
+            max_batch_size=settings.prediction_max_batch_size,
+            max_wait_ms=settings.prediction_max_batch_wait_ms,
+            executor=self.inference_executor,
+            input_size=self.binary_input_size
+        )
+        self.multiclass_batcher = MicroBatcher(
+            name="multiclass",
+            predict_fn=self.multiclass_model.predict,
+            max_batch_size=settings.prediction_max_batch_size,
+            max_wait_ms=settings.prediction_max_batch_wait_ms,
+            executor=self.inference_executor,
+            input_size=self.multiclass_input_size
+        )
+        # Penultimate layer of the multiclass classifier, for similar image search
+        self.embedder = embedder
+        self.embedding_index = embedding_index
+        self.embedding_batcher = MicroBatcher(
+            name="embedding",
+            predict_fn=self.embedder.predict,
+            max_batch_size=settings.prediction_max_batch_size,
+            max_wait_ms=settings.prediction_max_batch_wait_ms,
+            executor=self.inference_executor,
+            input_size=self.multiclass_input_size
+        ) if embedder is not None else None
+        self._primary_models = {
+            "binary": (self.binary_batcher, self.binary_model_version),
+            "multiclass": (self.multiclass_batcher, self.multiclass_model_version),
+        }
+
+        candidate_models = {
+            model: candidate_model
+            for model, candidate_model in (
+                ("binary", binary_candidate_model),
+                ("multiclass", multiclass_candidate_model)
+            )
+            if candidate_model is not None
+        }
+        # Candidates run on their own threads, their forward passes never hold up the primary models,
+        # and the shadow ones never hold up the canary requests
+        self.candidate_executor = ThreadPoolExecutor(
+            max_workers=1,
+            thread_name_prefix="prediction-candidate"
+        ) if candidate_models else None
+        self.shadow_executor = ThreadPoolExecutor(
+            max_workers=1,
+            thread_name_prefix="prediction-shadow"
+        ) if candidate_models else None
+        self.candidates: dict[str, CandidateModel] = {
+            model: CandidateModel(
+                model_kind=model,
+                model=candidate_model,
+                input_size=model_input_size(candidate_model),
+                executor=self.candidate_executor,
+                shadow_executor=self.shadow_executor,
+                prepare_tensor=prepare_input_tensor,
+                canary_percent=settings.candidate_canary_percent,
+                shadow_percent=settings.candidate_shadow_percent,
+                max_pending_shadows=settings.candidate_shadow_max_pending
+            )
+            for model, candidate_model in candidate_models.items()
+        }
 
-    async def predict_binary(self, image_file: UploadFile) -> list[float]:
+    @property
+    def model_versions(self) -> dict[str, str]:
+        return {"binary": self.binary_model_version, "multiclass": self.multiclass_model_version}
 
+    @property
+    def candidate_versions(self) -> dict[str, str]:
+        return {model: candidate.version for model, candidate in self.candidates.items()}
+
+    @property
+    def executors(self) -> list[tuple[ThreadPoolExecutor, int]]:
+        executors = [
+            (self.decode_executor, settings.prediction_decode_workers),
+            (self.inference_executor, settings.prediction_inference_workers)
+        ]
+        if self.candidate_executor is not None:
+            executors.append((self.candidate_executor, 1))
+            executors.append((self.shadow_executor, 1))
+        return executors
+
+    async def warmup(self):
+        # Trace the inference functions before the first real request pays for it
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self.inference_executor, self.binary_model.warmup)
+        await loop.run_in_executor(self.inference_executor, self.multiclass_model.warmup)
+        if self.embedder is not None:
+            await loop.run_in_executor(self.inference_executor, self.embedder.warmup)
+        for candidate in self.candidates.values():
+            await loop.run_in_executor(self.candidate_executor, candidate.model.warmup)
+
+    def start(self):
+        self.binary_batcher.start()
+        self.multiclass_batcher.start()
+        if self.embedding_batcher is not None:
+            self.embedding_batcher.start()
+        for candidate in self.candidates.values():
+            candidate.start()
+
+    async def stop(self):
+        for candidate in self.candidates.values():
+            await candidate.stop()
+        await self.binary_batcher.stop()
+        await self.multiclass_batcher.stop()
+        if self.embedding_batcher is not None:
+            await self.embedding_batcher.stop()
+        self.decode_executor.shutdown(wait=False, cancel_futures=True)
+        self.inference_executor.shutdown(wait=False, cancel_futures=True)
+        if self.candidate_executor is not None:
+            self.candidate_executor.shutdown(wait=False, cancel_futures=True)
+            self.shadow_executor.shutdown(wait=False, cancel_futures=True)
+
+    def _shed(self, model: str, priority: str, reason: str) -> HTTPException:
+        PREDICTION_SHED.labels(model=model, priority=priority, reason=reason).inc()
+        return HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Prediction service is overloaded, retry later",
+            headers={"Retry-After": str(settings.prediction_retry_after_seconds)}
+        )
+
+    def _admit(self, model: str, deadline: Optional[RequestDeadline]):
+        if deadline is not None:
+            deadline.check(model, "admission")
+        priority = deadline.priority if deadline is not None else "normal"
+        if self._in_flight >= settings.prediction_max_in_flight:
+            raise self._shed(model, priority, "in_flight")
+
+        batcher = self._primary_models[model][0]
+        estimated_wait = batcher.estimated_wait
+        # Low priority requests are shed first, high priority ones only when they would miss their deadline anyway
+        if priority != "high":
+            scale = settings.prediction_shed_low_priority_fraction if priority == "low" else 1.0
+            if batcher.queue_depth >= settings.prediction_shed_queue_depth * scale:
+                raise self._shed(model, priority, "queue_depth")
+            if estimated_wait * 1000 >= settings.prediction_shed_max_wait_ms * scale:
+                raise self._shed(model, priority, "estimated_wait")
+
+        remaining = deadline.remaining() if deadline is not None else None
+        if remaining is not None and estimated_wait > remaining:
+            raise self._shed(model, priority, "deadline")
+
+    @contextmanager
+    def _in_flight_slot(self, model: str, deadline: Optional[RequestDeadline] = None):
+        # Reject instead of queueing without bound when the models fall behind
+        self._admit(model, deadline)
+        self._in_flight += 1
         try:
-            input_tensor = prepare_input_tensor(image_file)
+            yield
+        finally:
+            self._in_flight -= 1
+
+    async def _run_decode(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.decode_executor, partial(fn, *args))
+
+    def _cache_key(self, image_data: bytes, model_id: str) -> Optional[str]:
+        return PredictionCache.key(image_data, model_id) if self.cache is not None else None
+
+    async def _cache_get(self, cache_key: Optional[str], model: str) -> Optional[ndarray]:
+        return await self.cache.get(cache_key, model) if cache_key is not None else None
+
+    async def _cache_put(self, cache_key: Optional[str], prediction: ndarray):
+        if cache_key is not None:
+            await self.cache.put(cache_key, prediction)
+
+    async def _forward(
+            self,
+            model: str,
+            input_tensor: ndarray,
+            image_data: bytes | memoryview,
+            endpoint: str,
+            deadline: Optional[RequestDeadline] = None
+    ) -> tuple[ndarray, str]:
+        batcher, version = self._primary_models[model]
 
-            prediction = self.binary_model.predict(input_tensor)
+        image_hash = None
+        if self.dedupe is not None:
+            image_hash = await self._run_decode(perceptual_hash, input_tensor)
+            prediction = self.dedupe.get(model, image_hash)
+            if prediction is not None:
+                return prediction, version
 
-            return prediction
+        candidate = self.candidates.get(model)
+        if candidate is not None and candidate.takes_canary():
+            prediction = await candidate.predict(input_tensor, image_data, self.decode_executor, endpoint, deadline)
+            return prediction, candidate.version
 
+        started = time.perf_counter()
+        prediction = await batcher.submit(input_tensor, endpoint, deadline)
+        latency = time.perf_counter() - started
+        PREDICTION_MODEL_LATENCY.labels(model=model, role="primary").observe(latency)
+        if image_hash is not None:
+            self.dedupe.put(model, image_hash, prediction)
+
+        if candidate is not None:
+            candidate.shadow(
+                input_tensor, image_data, self.decode_executor, prediction, latency, batcher, endpoint
+            )
+        return prediction, version
+
+    async def _predict(
+            self,
+            model: str,
+            model_id: str,
+            input_size: tuple[int, int],
+            image_data: bytes | memoryview,
+            endpoint: str,
+            deadline: Optional[RequestDeadline] = None,
+            admit: bool = False
+    ) -> tuple[ndarray, str]:
+        cache_key = self._cache_key(image_data, model_id)
+        prediction = await self._cache_get(cache_key, model)
+        if prediction is not None:
+            return prediction, self._primary_models[model][1]
+
+        # Cached predictions are served even when the models are overloaded, only model work is admitted
+        with self._in_flight_slot(model, deadline) if admit else nullcontext():
+            if deadline is not None:
+                deadline.check(model, "decode")
+            input_tensor = await self._run_decode(
+                prepare_input_tensor, image_data, input_size, None, model, endpoint
+            )
+            prediction, version = await self._forward(model, input_tensor, image_data, endpoint, deadline)
+
+        # Only the primary models' predictions are cached, canary ones are served once
+        if version == self._primary_models[model][1]:
+            await self._cache_put(cache_key, prediction)
+        return prediction, version
+
+    async def predict_binary(
+            self,
+            image_data: bytes | memoryview,
+            endpoint: str = "binary",
+            deadline: Optional[RequestDeadline] = None
+    ) -> tuple[ndarray, str]:
+        """
+        Returns the predictions and the version of the model which made them.
+        """
+        try:
+            return await self._predict(
+                "binary", self.binary_model_id, self.binary_input_size, image_data, endpoint, deadline, admit=True
+            )
+
+        except HTTPException:
+            raise
         except Exception as e:
             raise Exception(f"Error when predicting with binary classifier {str(e)}")
 
 
-    async def predict_multiclass(self, image: UploadFile) -> list[float]:
+    async def predict_multiclass(
+            self,
+            image_data: bytes | memoryview,
+            endpoint: str = "multiclass",
+            deadline: Optional[RequestDeadline] = None
+    ) -> tuple[ndarray, str]:
+        """
+        Returns the predictions and the version of the model which made them.
+        """
         try:
-            input_tensor = prepare_input_tensor(image)
+            return await self._predict(
+                "multiclass", self.multiclass_model_id, self.multiclass_input_size, image_data, endpoint, deadline,
+                admit=True
+            )
 
-            prediction = self.multiclass_model.predict(input_tensor)
+        except HTTPException:
+            raise
+        except Exception as e:
+            raise Exception(f"Error when predicting with multiclass classifier {str(e)}")
 
-            return prediction
+    async def predict_cascade(
+            self,
+            image_data: bytes | memoryview,
+            endpoint: str = "cascade",
+            deadline: Optional[RequestDeadline] = None
+    ) -> tuple[float, Optional[ndarray], dict[str, str]]:
+        """
+        Runs the binary footprint check, then the multiclass classifier only when a footprint is detected.
+        Returns the footprint probability, the multiclass predictions, if any, and the versions of the models which ran.
+        """
+        versions = {"binary": self.binary_model_version}
+        binary_key = self._cache_key(image_data, self.binary_model_id)
+        binary_prediction = await self._cache_get(binary_key, "binary")
+        multiclass_key = self._cache_key(image_data, self.multiclass_model_id)
+        multiclass_prediction = None
+        # Answered from the cache without being admitted, when every prediction it needs is cached
+        if binary_prediction is not None:
+            footprint_probability = float(binary_prediction[0])
+            if footprint_probability < settings.cascade_footprint_threshold:
+                return footprint_probability, None, versions
+            multiclass_prediction = await self._cache_get(multiclass_key, "multiclass")
+            if multiclass_prediction is not None:
+                return footprint_probability, multiclass_prediction, {
+                    **versions, "multiclass": self.multiclass_model_version
+                }
 
-        except Exception as e:
-            raise Exception(f"Error when predicting with multiclass classifier {str(e)}")
\ No newline at end of file
+        with self._in_flight_slot("binary", deadline):
+            try:
+                image = None
+
+                if binary_prediction is None:
+                    if deadline is not None:
+                        deadline.check("binary", "decode")
+                    binary_tensor, image = await self._run_decode(
+                        prepare_cascade_tensors, image_data, self.binary_input_size, self.multiclass_input_size,
+                        endpoint
+                    )
+                    binary_prediction, versions["binary"] = await self._forward(
+                        "binary", binary_tensor, image_data, endpoint, deadline
+                    )
+                    if versions["binary"] == self.binary_model_version:
+                        await self._cache_put(binary_key, binary_prediction)
+
+                    footprint_probability = float(binary_prediction[0])
+                    if footprint_probability < settings.cascade_footprint_threshold:
+                        return footprint_probability, None, versions
+
+                    multiclass_prediction = await self._cache_get(multiclass_key, "multiclass")
+
+                versions["multiclass"] = self.multiclass_model_version
+                if multiclass_prediction is None:
+                    if deadline is not None:
+                        deadline.check("multiclass", "decode")
+                    if image is None:
+                        image = await self._run_decode(
+                            decode_image, image_data, self.multiclass_input_size, "multiclass", endpoint
+                        )
+                    multiclass_tensor = await self._run_decode(
+                        image_to_tensor, image, self.multiclass_input_size, None, "multiclass", endpoint
+                    )
+                    multiclass_prediction, versions["multiclass"] = await self._forward(
+                        "multiclass", multiclass_tensor, image_data, endpoint, deadline
+                    )
+                    if versions["multiclass"] == self.multiclass_model_version:
+                        await self._cache_put(multiclass_key, multiclass_prediction)
+
+                return footprint_probability, multiclass_prediction, versions
+
+            except HTTPException:
+                raise
+            except Exception as e:
+                raise Exception(f"Error when predicting with cascaded classifiers {str(e)}")
+
+    async def find_similar(
+            self,
+            image_data: bytes | memoryview,
+            k: int,
+            endpoint: str = "similar",
+            deadline: Optional[RequestDeadline] = None
+    ) -> tuple[list[dict], str]:
+        """
+        Returns the k reference images whose embeddings are the most similar to the image's, most similar first,
+        and the version of the multiclass model which embedded them.
+        """
+        index = self.embedding_index
+        if self.embedding_batcher is None or index is None:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Similar image search is not configured"
+            )
+        # Embeddings of different model versions are not comparable
+        if index.model_version != self.multiclass_model_version:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail=f"Embedding index was built with multiclass model version {index.model_version}, "
+                       f"rebuild it for version {self.multiclass_model_version}"
+            )
+
+        with self._in_flight_slot("multiclass", deadline):
+            try:
+                if deadline is not None:
+                    deadline.check("multiclass", "decode")
+                input_tensor = await self._run_decode(
+                    prepare_input_tensor, image_data, self.multiclass_input_size, None, "multiclass", endpoint
+                )
+                embedding = await self.embedding_batcher.submit(input_tensor, endpoint, deadline)
+                with observe_stage("search", "multiclass", endpoint):
+                    matches = await self._run_decode(
+                        index.search, embedding, k, settings.embedding_ivf_probes, settings.embedding_rerank_candidates
+                    )
+                return matches, self.multiclass_model_version
+
+            except HTTPException:
+                raise
+            except Exception as e:
+                raise Exception(f"Error when searching similar images {str(e)}")
+
+    async def _predict_chunk(
+            self,
+            model: str,
+            images: list[bytes | memoryview],
+            endpoint: str,
+            deadline: Optional[RequestDeadline]
+    ) -> list[tuple[ndarray, str] | Exception]:
+        if model == "binary":
+            model_id, input_size = self.binary_model_id, self.binary_input_size
+        else:
+            model_id, input_size = self.multiclass_model_id, self.multiclass_input_size
+
+        return await asyncio.gather(
+            *(self._predict(model, model_id, input_size, image_data, endpoint, deadline) for image_data in images),
+            return_exceptions=True
+        )
+
+    async def predict_images(
+            self,
+            model: str,
+            images: list[bytes | memoryview],
+            endpoint: Optional[str] = None,
+            deadline: Optional[RequestDeadline] = None
+    ) -> list[tuple[ndarray, str] | Exception]:
+        """
+        Predicts already validated images together, so they fill the model's batches.
+        Returns the prediction and model version, or the error, of every image in order.
+        """
+        with self._in_flight_slot(model, deadline):
+            return await self._predict_chunk(model, images, endpoint or f"{model}_images", deadline)
+
+    async def predict_batch(
+            self,
+            model: str,
+            files: list[UploadFile],
+            endpoint: Optional[str] = None,
+            deadline: Optional[RequestDeadline] = None
+    ) -> dict[str, dict]:
+        """
+        Predicts every image of a bulk upload, model-sized batches at a time so memory stays bounded.
+        Returns a prediction and the version of the model which made it, or an error, per filename.
+        """
+        endpoint = endpoint or f"{model}_batch"
+
+        with self._in_flight_slot(model, deadline):
+            results = {}
+            items = iter_batch_items(files)
+
+            while chunk := await self._run_decode(take, items, settings.prediction_max_batch_size):
+                predictions = iter(await self._predict_chunk(
+                    model, [image_data for _, image_data, error in chunk if error is None], endpoint, deadline
+                ))
+
+                for filename, _, error in chunk:
+                    if error is None:
+                        result = next(predictions)
+                        if isinstance(result, Exception):
+                            error = f"Error when predicting with {model} classifier {str(result)}"
+
+                    key = unique_filename(filename, results)
+                    if error is not None:
+                        results[key] = {"error": error}
+                    else:
+                        prediction, version = result
+                        results[key] = {"predictions": prediction, "model_version": version}
+
+            return results
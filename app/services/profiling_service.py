@@ -0,0 +1,156 @@
+import asyncio
+import cProfile
+import io
+import os
+import pstats
+import shutil
+import sys
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+from fastapi import HTTPException
+from starlette import status
+
+from app.config import logger
+
+# Only one capture at a time, profilers are process wide
+_capture_lock = asyncio.Lock()
+# From Python 3.12 a single cProfile profiler covers every thread, earlier ones are enabled on each thread
+PER_THREAD_PROFILERS = sys.version_info < (3, 12)
+
+
+def _run_on_every_thread(executor: ThreadPoolExecutor, workers: int, fn) -> list:
+    # A barrier keeps each task on its own thread until all of them ran, so every worker thread runs fn once
+    barrier = threading.Barrier(workers)
+
+    def task():
+        result = fn()
+        barrier.wait(timeout=10)
+        return result
+
+    futures = [executor.submit(task) for _ in range(workers)]
+    return [future.result() for future in futures]
+
+
+def _thread_profiler_start(local: threading.local):
+    local.profiler = cProfile.Profile()
+    local.profiler.enable()
+
+
+def _thread_profiler_stop(local: threading.local) -> Optional[cProfile.Profile]:
+    profiler = getattr(local, "profiler", None)
+    if profiler is not None:
+        profiler.disable()
+        local.profiler = None
+    return profiler
+
+
+def _already_profiling(e: ValueError) -> HTTPException:
+    return HTTPException(status_code=status.HTTP_409_CONFLICT, detail=f"Another profiler is already active: {e}")
+
+
+async def _profile_every_thread(seconds: float) -> pstats.Stats:
+    # cProfile is built on sys.monitoring, which allows one profiler per interpreter and sees every thread
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError as e:
+        raise _already_profiling(e)
+    try:
+        await asyncio.sleep(seconds)
+    finally:
+        profiler.disable()
+    return pstats.Stats(profiler, stream=io.StringIO())
+
+
+async def _profile_each_thread(seconds: float, executors: list[tuple[ThreadPoolExecutor, int]]) -> pstats.Stats:
+    # Before Python 3.12, a profiler only sees the thread that enabled it
+    local = threading.local()
+    loop_profiler = cProfile.Profile()
+    thread_profilers = []
+
+    try:
+        for executor, workers in executors:
+            await asyncio.to_thread(_run_on_every_thread, executor, workers, lambda: _thread_profiler_start(local))
+        loop_profiler.enable()
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            loop_profiler.disable()
+    finally:
+        # Also stops the profilers that started when starting the others failed
+        for executor, workers in executors:
+            thread_profilers += await asyncio.to_thread(
+                _run_on_every_thread, executor, workers, lambda: _thread_profiler_stop(local)
+            )
+
+    stats = pstats.Stats(loop_profiler, stream=io.StringIO())
+    for profiler in thread_profilers:
+        if profiler is not None:
+            stats.add(profiler)
+    return stats
+
+
+async def capture_cprofile(seconds: float, executors: list[tuple[ThreadPoolExecutor, int]]) -> bytes:
+    """
+    Profiles the event loop thread and every thread of the given (executor, worker count) pairs during `seconds`,
+    and returns the merged statistics in the pstats binary format.
+    """
+    if PER_THREAD_PROFILERS:
+        stats = await _profile_each_thread(seconds, executors)
+    else:
+        stats = await _profile_every_thread(seconds)
+
+    with tempfile.NamedTemporaryFile(suffix=".prof", delete=False) as file:
+        path = file.name
+    try:
+        stats.dump_stats(path)
+        with open(path, "rb") as file:
+            return file.read()
+    finally:
+        os.remove(path)
+
+
+async def capture_tensorflow_trace(seconds: float) -> bytes:
+    """
+    Records a TensorFlow profiler trace during `seconds` and returns the log directory as a zip archive,
+    to be opened with TensorBoard.
+    """
+    import tensorflow as tf
+
+    log_dir = tempfile.mkdtemp(prefix="wildlens-tf-profile-")
+    try:
+        tf.profiler.experimental.start(log_dir)
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            tf.profiler.experimental.stop()
+
+        archive_path = await asyncio.to_thread(shutil.make_archive, log_dir, "zip", log_dir)
+        try:
+            with open(archive_path, "rb") as file:
+                return file.read()
+        finally:
+            os.remove(archive_path)
+    finally:
+        shutil.rmtree(log_dir, ignore_errors=True)
+
+
+async def capture_profile(
+        mode: str,
+        seconds: float,
+        executors: list[tuple[ThreadPoolExecutor, int]]
+) -> bytes:
+    if _capture_lock.locked():
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="A profile is already being captured"
+        )
+
+    async with _capture_lock:
+        logger.info(f"Capturing a {mode} profile for {seconds} seconds")
+        if mode == "tensorflow":
+            return await capture_tensorflow_trace(seconds)
+        return await capture_cprofile(seconds, executors)
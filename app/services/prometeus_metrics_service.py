@@ -1,27 +1,130 @@
-import psutil
-from prometheus_client import Gauge
+import os
+import shutil
+import time
+from contextlib import contextmanager
+
+from prometheus_client import Counter, Gauge, Histogram, multiprocess
 
 from prometheus_fastapi_instrumentator import Instrumentator
-from prometheus_fastapi_instrumentator.metrics import Info
-from pynvml import nvmlDeviceGetCount, nvmlDeviceGetHandleByIndex, nvmlDeviceGetUtilizationRates, \
-    nvmlDeviceGetMemoryInfo, nvmlInit, nvmlSystemGetDriverVersion, nvmlShutdown
+from pynvml import nvmlInit, nvmlSystemGetDriverVersion, nvmlShutdown
 
 from app.config import logger
 
-CPU_USAGE = Gauge('process_cpu_usage', 'Current CPU usage in percent')
-GPU_USAGE = Gauge('process_gpu_usage', 'Current GPU usage in percent')
-MEMORY_USAGE = Gauge('process_memory_usage_bytes', 'Current memory usage in bytes')
-MEMORY_USAGE_PERCENT = Gauge('process_memory_usage_percent', 'Current memory usage in percent')
+# Host wide values, the same in every worker process, so only the highest live value is kept in multiprocess mode
+CPU_USAGE = Gauge('process_cpu_usage', 'Current host CPU usage in percent', multiprocess_mode='livemax')
+GPU_USAGE = Gauge('process_gpu_usage', 'Current GPU usage in percent', ['gpu'], multiprocess_mode='livemax')
+GPU_MEMORY_USAGE = Gauge('gpu_memory_usage_bytes', 'Current GPU memory usage in bytes', ['gpu'], multiprocess_mode='livemax')
+GPU_MEMORY_USAGE_PERCENT = Gauge(
+    'gpu_memory_usage_percent',
+    'Current GPU memory usage in percent',
+    ['gpu'],
+    multiprocess_mode='livemax'
+)
+
+# Per process values, summed over the live worker processes in multiprocess mode
+MEMORY_USAGE = Gauge('process_memory_usage_bytes', 'Current resident memory in bytes', multiprocess_mode='livesum')
+MEMORY_USAGE_PERCENT = Gauge(
+    'process_memory_usage_percent',
+    'Current resident memory in percent of the host memory',
+    multiprocess_mode='livesum'
+)
+
+PREDICTION_BATCH_SIZE = Histogram(
+    'prediction_batch_size',
+    'Number of requests grouped into a single forward pass',
+    ['model'],
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128)
+)
+PREDICTION_QUEUE_WAIT = Histogram(
+    'prediction_queue_wait_seconds',
+    'Time a request waited in the batching queue before its forward pass',
+    ['model'],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+)
+
+PREDICTION_STAGE_DURATION = Histogram(
+    'prediction_stage_duration_seconds',
+    'Time spent in each stage of the prediction path',
+    ['stage', 'model', 'endpoint'],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+)
+
+PREDICTION_CACHE_HITS = Counter(
+    'prediction_cache_hits_total',
+    'Predictions served from the prediction cache',
+    ['model', 'tier']
+)
+PREDICTION_CACHE_MISSES = Counter(
+    'prediction_cache_misses_total',
+    'Predictions not found in the prediction cache',
+    ['model']
+)
+
+PREDICTION_MODEL_LATENCY = Histogram(
+    'prediction_model_latency_seconds',
+    'Time from submitting an input to a model until its prediction, batching wait included',
+    ['model', 'role'],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+)
+CANDIDATE_SHADOW_PREDICTIONS = Counter(
+    'candidate_shadow_predictions_total',
+    'Shadow predictions of the candidate models, by agreement with the primary model, error or dropped',
+    ['model', 'outcome']
+)
+CANDIDATE_SHADOW_LATENCY_DELTA = Histogram(
+    'candidate_shadow_latency_delta_seconds',
+    'Candidate minus primary model latency for the same input',
+    ['model'],
+    buckets=(-0.25, -0.1, -0.05, -0.025, -0.01, -0.005, -0.001, 0, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25)
+)
+CANDIDATE_SHADOW_OUTPUT_DELTA = Histogram(
+    'candidate_shadow_output_delta',
+    'Largest absolute difference between the candidate and primary probabilities for the same input',
+    ['model'],
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+)
+PREDICTION_SHED = Counter(
+    'prediction_shed_total',
+    'Prediction requests rejected before any work because the models fell behind, by priority and reason',
+    ['model', 'priority', 'reason']
+)
+PREDICTION_DEADLINE_EXCEEDED = Counter(
+    'prediction_deadline_exceeded_total',
+    'Prediction requests abandoned once their deadline passed, by the stage they had reached',
+    ['model', 'stage']
+)
+PREDICTION_JOB_IMAGES = Counter(
+    'prediction_job_images_total',
+    'Images of prediction jobs processed by the job workers, by outcome',
+    ['model', 'outcome']
+)
+PREDICTION_DEDUPE_LOOKUPS = Counter(
+    'prediction_dedupe_lookups_total',
+    'Lookups of near-identical recent images by perceptual hash, a hit reuses the earlier prediction',
+    ['model', 'outcome']
+)
 
-def init_nvml():
+@contextmanager
+def observe_stage(stage: str, model: str, endpoint: str):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        PREDICTION_STAGE_DURATION.labels(stage=stage, model=model, endpoint=endpoint).observe(
+            time.perf_counter() - started
+        )
+
+def init_nvml() -> bool:
+    # CPU-only nodes have no NVML library or driver, GPU metrics are then simply not reported
     try:
         nvmlInit()
         driver_version = nvmlSystemGetDriverVersion()
 
         logger.info(f"NVML Driver Version: {driver_version}")
+        return True
     except Exception as e:
-        logger.error(f"Failed to initialize NVML: {e}")
-        raise RuntimeError("NVML initialization failed") from e
+        logger.warning(f"NVML is not available, GPU metrics are disabled: {e}")
+        return False
 
 def shutdown_nvml():
     try:
@@ -29,28 +132,23 @@ def shutdown_nvml():
         logger.info("NVML shutdown successfully.")
     except Exception as e:
         logger.error(f"Failed to shutdown NVML: {e}")
-        raise RuntimeError("NVML shutdown failed") from e
-
-
-def update_system_metrics(info: Info):
-
-    devices = nvmlDeviceGetCount()
 
-    for i in range(devices):
-        handle = nvmlDeviceGetHandleByIndex(i)
-        utilization = nvmlDeviceGetUtilizationRates(handle)
-        memory_info = nvmlDeviceGetMemoryInfo(handle)
-        memory_usage_percent = (memory_info.used / memory_info.total) * 100
+def prepare_multiprocess_directory(default_directory: str = "/tmp/wildlens_prometheus") -> str:
+    # Worker processes write their metrics to a shared directory, aggregated when /metrics is scraped. It has to be
+    # set before the workers start, they pick the multiprocess mode when they import prometheus_client
+    directory = os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", default_directory)
+    # Metrics of a previous run would be aggregated with the new workers'
+    shutil.rmtree(directory, ignore_errors=True)
+    os.makedirs(directory, exist_ok=True)
+    return directory
 
-        GPU_USAGE.set(utilization.gpu)
-        CPU_USAGE.set(psutil.cpu_percent())
-        MEMORY_USAGE.set(memory_info.used)
-        MEMORY_USAGE_PERCENT.set(memory_usage_percent)
+def mark_worker_process_dead():
+    # Drops the live gauges of this worker from the aggregated metrics when running several workers
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        multiprocess.mark_process_dead(os.getpid())
 
 def create_instrumentator() -> Instrumentator:
-    instrumentator = Instrumentator()
-    instrumentator.add(update_system_metrics)
-    return instrumentator
+    return Instrumentator()
 
 
 
@@ -0,0 +1,41 @@
+import json
+from typing import Any
+
+import numpy as np
+from starlette.responses import JSONResponse
+
+from app.config import logger
+
+try:
+    import orjson
+except ImportError:  # Plain json still works, NumPy values are converted to lists first
+    orjson = None
+    logger.info("orjson is not installed, responses are serialized with the json module")
+
+
+def _default(value: Any) -> Any:
+    # Arrays orjson does not serialize natively (not C-contiguous, other dtypes) and NumPy scalars
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+
+def dumps_json(content: Any) -> bytes:
+    """
+    Serializes a response body, NumPy arrays included, without converting every float to a Python object first.
+    """
+    if orjson is not None:
+        return orjson.dumps(content, default=_default, option=orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(content, default=_default, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+class NumpyJSONResponse(JSONResponse):
+    """
+    JSON response whose content can hold NumPy arrays. Routes return it directly, which skips FastAPI's
+    response model validation and generic encoder, the response model only documents the body.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return dumps_json(content)
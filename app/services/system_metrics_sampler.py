@@ -0,0 +1,66 @@
+import asyncio
+from typing import Optional
+
+import psutil
+from pynvml import nvmlDeviceGetCount, nvmlDeviceGetHandleByIndex, nvmlDeviceGetUtilizationRates, \
+    nvmlDeviceGetMemoryInfo
+
+from app.config import logger
+from app.services.prometeus_metrics_service import CPU_USAGE, GPU_USAGE, GPU_MEMORY_USAGE, \
+    GPU_MEMORY_USAGE_PERCENT, MEMORY_USAGE, MEMORY_USAGE_PERCENT, init_nvml, shutdown_nvml
+
+
+class SystemMetricsSampler:
+    """
+    Polls CPU, process memory and GPU usage at a fixed interval in the background,
+    so scrapes and instrumented requests never pay for it.
+    """
+
+    def __init__(self, interval_seconds: float):
+        self.interval_seconds = interval_seconds
+        self.nvml_available = False
+        self._process = psutil.Process()
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        self.nvml_available = init_nvml()
+        # The first call only sets the reference point of the following measurements
+        psutil.cpu_percent(interval=None)
+        self._task = asyncio.create_task(self._run(), name="system-metrics-sampler")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self.nvml_available:
+            shutdown_nvml()
+            self.nvml_available = False
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.to_thread(self.sample)
+            except Exception as e:
+                logger.error(f"Failed to sample system metrics: {e}")
+            await asyncio.sleep(self.interval_seconds)
+
+    def sample(self):
+        CPU_USAGE.set(psutil.cpu_percent(interval=None))
+
+        MEMORY_USAGE.set(self._process.memory_info().rss)
+        MEMORY_USAGE_PERCENT.set(self._process.memory_percent())
+
+        if self.nvml_available:
+            self._sample_gpus()
+
+    def _sample_gpus(self):
+        for i in range(nvmlDeviceGetCount()):
+            handle = nvmlDeviceGetHandleByIndex(i)
+            utilization = nvmlDeviceGetUtilizationRates(handle)
+            memory_info = nvmlDeviceGetMemoryInfo(handle)
+
+            gpu = str(i)
+            GPU_USAGE.labels(gpu=gpu).set(utilization.gpu)
+            GPU_MEMORY_USAGE.labels(gpu=gpu).set(memory_info.used)
+            GPU_MEMORY_USAGE_PERCENT.labels(gpu=gpu).set((memory_info.used / memory_info.total) * 100)
@@ -0,0 +1,137 @@
+import importlib
+import os
+import pathlib
+import threading
+
+import numpy as np
+from numpy import ndarray
+
+from app.config import get_settings, logger
+from app.services.batching_service import batch_size_buckets
+
+settings = get_settings()
+
+
+def tflite_model_path(model_path: str) -> str:
+    # Exported models sit next to the Keras model they were converted from
+    return str(pathlib.Path(model_path).with_suffix(".tflite"))
+
+
+def load_interpreter_class():
+    # The standalone runtimes avoid importing the whole of TensorFlow, which is only the last resort
+    try:
+        from ai_edge_litert.interpreter import Interpreter
+    except ImportError:
+        try:
+            from tflite_runtime.interpreter import Interpreter
+        except ImportError:
+            import tensorflow as tf
+            Interpreter = tf.lite.Interpreter
+    return Interpreter
+
+
+def interpreter_options(interpreter_class) -> dict:
+    if not settings.prediction_tflite_shared_weights:
+        return {}
+    # Every runtime defines OpResolverType next to its Interpreter
+    op_resolver_type = importlib.import_module(interpreter_class.__module__).OpResolverType
+    return {"experimental_op_resolver_type": op_resolver_type.BUILTIN_WITHOUT_DEFAULT_DELEGATES}
+
+
+def interpreter_threads() -> int:
+    if settings.prediction_tflite_threads:
+        return settings.prediction_tflite_threads
+    # Share the worker's cores between the inference threads
+    workers = settings.app_workers * settings.prediction_inference_workers
+    return max(1, (os.cpu_count() or 1) // workers)
+
+
+class TFLiteClassifier:
+    """
+    Runs an exported TFLite model with the same interface as `CompiledClassifier`.
+    Interpreters are not thread safe, so every inference thread keeps one interpreter, resized only when the
+    batch size bucket changes. With the XNNPACK delegate each interpreter packs its own copy of the weights,
+    one copy per model and inference thread. The interpreters load the model from its path, which TFLite maps
+    read-only instead of copying it into the process.
+    """
+
+    def __init__(self, model_path: str, max_batch_size: int):
+        self.model_path = model_path
+        self.name = pathlib.Path(model_path).stem
+        # Set by the loader, from the file the model was loaded from
+        self.version = "unknown"
+        self.source_path = None
+        self.batch_buckets = batch_size_buckets(max_batch_size)
+        self._interpreter_class = load_interpreter_class()
+        self._threads = interpreter_threads()
+        self._options = interpreter_options(self._interpreter_class)
+        self._local = threading.local()
+
+        interpreter = self._create_interpreter(1)
+        input_details = interpreter.get_input_details()[0]
+        output_details = interpreter.get_output_details()[0]
+        self.input_shape = (None, *(int(dim) for dim in input_details["shape"][1:]))
+        self._input_index = input_details["index"]
+        self._input_dtype = input_details["dtype"]
+        self._input_quantization = input_details["quantization"]
+        self._output_index = output_details["index"]
+        self._output_quantization = output_details["quantization"]
+
+    def _create_interpreter(self, batch_size: int):
+        interpreter = self._interpreter_class(model_path=self.model_path, num_threads=self._threads, **self._options)
+        input_details = interpreter.get_input_details()[0]
+        if input_details["shape"][0] != batch_size:
+            interpreter.resize_tensor_input(input_details["index"], [batch_size, *input_details["shape"][1:]])
+        interpreter.allocate_tensors()
+        return interpreter
+
+    def _interpreter(self, bucket: int):
+        interpreter = getattr(self._local, "interpreter", None)
+        if interpreter is None:
+            interpreter = self._local.interpreter = self._create_interpreter(bucket)
+        elif self._local.bucket != bucket:
+            # Only the activation tensors are reallocated, the weights stay packed
+            interpreter.resize_tensor_input(self._input_index, [bucket, *self.input_shape[1:]])
+            interpreter.allocate_tensors()
+        self._local.bucket = bucket
+        return interpreter
+
+    def _quantize_input(self, batch: ndarray) -> ndarray:
+        if self._input_dtype == np.float32:
+            return batch
+        scale, zero_point = self._input_quantization
+        info = np.iinfo(self._input_dtype)
+        return np.clip(np.round(batch / scale + zero_point), info.min, info.max).astype(self._input_dtype)
+
+    def _dequantize_output(self, outputs: ndarray) -> ndarray:
+        if outputs.dtype == np.float32:
+            return outputs
+        scale, zero_point = self._output_quantization
+        return (outputs.astype(np.float32) - zero_point) * scale
+
+    def warmup(self):
+        sample_shape = self.input_shape[1:]
+        for bucket in self.batch_buckets:
+            self.predict(np.zeros((bucket, *sample_shape), dtype=np.float32))
+        logger.info(f"TFLite model {self.name} allocated for batch sizes {self.batch_buckets}")
+
+    def predict(self, batch: ndarray) -> ndarray:
+        batch_size = batch.shape[0]
+        max_bucket = self.batch_buckets[-1]
+        if batch_size > max_bucket:
+            return np.concatenate([
+                self.predict(batch[start:start + max_bucket]) for start in range(0, batch_size, max_bucket)
+            ])
+
+        bucket = next(size for size in self.batch_buckets if size >= batch_size)
+        interpreter = self._interpreter(bucket)
+
+        inputs = self._quantize_input(batch)
+        if bucket != batch_size:
+            padded = np.zeros((bucket, *inputs.shape[1:]), dtype=inputs.dtype)
+            padded[:batch_size] = inputs
+            inputs = padded
+
+        interpreter.set_tensor(self._input_index, inputs)
+        interpreter.invoke()
+        return self._dequantize_output(interpreter.get_tensor(self._output_index)[:batch_size])
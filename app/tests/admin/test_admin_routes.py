@@ -0,0 +1,80 @@
+import pstats
+from unittest.mock import AsyncMock, Mock
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.routes import admin_routes
+from app.routes.prediction_routes import get_prediction_service
+from app.services.prediction_service import PredictionService
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(admin_routes.settings, "wildlens_prediction_admin_api_key", "admin-key")
+    prediction_service = PredictionService(
+        binary_model=Mock(input_shape=(None, 32, 32, 3), version="b1"),
+        multiclass_model=Mock(input_shape=(None, 32, 32, 3), version="m1")
+    )
+
+    app = FastAPI()
+    app.include_router(admin_routes.router)
+    app.dependency_overrides[get_prediction_service] = lambda: prediction_service
+    return TestClient(app)
+
+
+def test_admin_endpoints_do_not_exist_without_an_admin_key(client, monkeypatch):
+    monkeypatch.setattr(admin_routes.settings, "wildlens_prediction_admin_api_key", None)
+
+    response = client.post("/admin/profile", params={"seconds": 0.1})
+
+    assert response.status_code == 404
+
+
+def test_admin_endpoints_reject_a_wrong_admin_key(client):
+    response = client.post("/admin/profile", params={"seconds": 0.1}, headers={"X-Admin-Key": "wrong"})
+
+    assert response.status_code == 403
+
+
+def test_cprofile_capture_is_returned_as_a_pstats_file(client, tmp_path):
+    response = client.post("/admin/profile", params={"seconds": 0.1}, headers={"X-Admin-Key": "admin-key"})
+
+    assert response.status_code == 200
+    assert response.headers["Content-Disposition"].startswith("attachment;")
+    profile_path = tmp_path / "capture.prof"
+    profile_path.write_bytes(response.content)
+    assert pstats.Stats(str(profile_path)).total_calls > 0
+
+
+def test_model_versions_are_listed(client):
+    response = client.get("/admin/models", headers={"X-Admin-Key": "admin-key"})
+
+    assert response.status_code == 200
+    assert response.json() == {"binary": "b1", "multiclass": "m1", "candidates": {}}
+
+
+def test_model_reload_loads_the_given_paths(client, monkeypatch):
+    registry = Mock(reload=AsyncMock(return_value={"binary": "b2", "multiclass": "m1"}))
+    monkeypatch.setattr(admin_routes, "get_model_registry", lambda: registry)
+
+    response = client.post(
+        "/admin/models/reload",
+        json={"binary_model_path": "models/binary_v2.keras"},
+        headers={"X-Admin-Key": "admin-key"}
+    )
+
+    assert response.status_code == 200
+    assert response.json() == {"binary": "b2", "multiclass": "m1", "candidates": {}}
+    registry.reload.assert_awaited_once_with(model_paths={"binary": "models/binary_v2.keras"})
+
+
+def test_failed_model_reload_returns_500(client, monkeypatch):
+    registry = Mock(reload=AsyncMock(side_effect=OSError("model file not found")))
+    monkeypatch.setattr(admin_routes, "get_model_registry", lambda: registry)
+
+    response = client.post("/admin/models/reload", headers={"X-Admin-Key": "admin-key"})
+
+    assert response.status_code == 500
+    assert "previous versions are still served" in response.json()["detail"]
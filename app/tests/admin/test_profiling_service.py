@@ -0,0 +1,52 @@
+import asyncio
+import cProfile
+import pstats
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from fastapi import HTTPException
+
+from app.services.profiling_service import capture_cprofile
+
+
+def profiled_work():
+    return sum(range(10000))
+
+
+async def capture_while_working(executor: ThreadPoolExecutor, workers: int) -> bytes:
+    loop = asyncio.get_running_loop()
+
+    async def work():
+        await asyncio.sleep(0.05)
+        await asyncio.gather(*(loop.run_in_executor(executor, profiled_work) for _ in range(workers)))
+
+    capture, _ = await asyncio.gather(capture_cprofile(0.3, [(executor, workers)]), work())
+    return capture
+
+
+@pytest.mark.parametrize("workers", [1, 4])
+def test_capture_records_the_executor_threads_and_leaves_no_profiler_enabled(workers, tmp_path):
+    executor = ThreadPoolExecutor(max_workers=workers)
+    profile_path = tmp_path / "capture.prof"
+    try:
+        for _ in range(2):
+            profile_path.write_bytes(asyncio.run(capture_while_working(executor, workers)))
+            stats = pstats.Stats(str(profile_path))
+            calls = [value[1] for key, value in stats.stats.items() if key[2] == "profiled_work"]
+            assert sum(calls) == workers
+    finally:
+        executor.shutdown()
+
+
+@pytest.mark.skipif(sys.version_info < (3, 12), reason="profilers are per thread before Python 3.12")
+def test_capture_is_refused_while_another_profiler_is_active():
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        with pytest.raises(HTTPException) as exc_info:
+            asyncio.run(capture_cprofile(0.01, []))
+    finally:
+        profiler.disable()
+
+    assert exc_info.value.status_code == 409
@@ -0,0 +1,127 @@
+import asyncio
+import time
+
+import numpy as np
+from fastapi import HTTPException
+
+from app.services.batching_service import MicroBatcher
+from app.services.deadline_service import RequestDeadline
+
+
+class RecordingModel:
+    def __init__(self):
+        self.batch_sizes = []
+
+    def predict(self, batch):
+        self.batch_sizes.append(batch.shape[0])
+        # One output row per input, identifying the input it was computed from
+        return batch.reshape(batch.shape[0], -1)[:, :1].astype(np.float32)
+
+
+def run_concurrently(batcher, inputs):
+    async def scenario():
+        results = await asyncio.gather(*(batcher.submit(x) for x in inputs))
+        await batcher.stop()
+        return results
+
+    return asyncio.run(scenario())
+
+
+def test_concurrent_requests_are_grouped_into_one_forward_pass():
+    model = RecordingModel()
+    batcher = MicroBatcher("test", model.predict, max_batch_size=8, max_wait_ms=50)
+    inputs = [np.full((1, 2, 2, 3), i, dtype=np.float32) for i in range(5)]
+
+    results = run_concurrently(batcher, inputs)
+
+    assert model.batch_sizes == [5]
+    assert [float(r[0]) for r in results] == [0, 1, 2, 3, 4]
+
+
+def test_batches_never_exceed_max_batch_size():
+    model = RecordingModel()
+    batcher = MicroBatcher("test", model.predict, max_batch_size=3, max_wait_ms=50)
+    inputs = [np.full((1, 2, 2, 3), i, dtype=np.float32) for i in range(7)]
+
+    results = run_concurrently(batcher, inputs)
+
+    assert max(model.batch_sizes) <= 3
+    assert sum(model.batch_sizes) == 7
+    assert [float(r[0]) for r in results] == list(range(7))
+
+
+def test_inputs_of_different_shapes_are_predicted_separately():
+    model = RecordingModel()
+    batcher = MicroBatcher("test", model.predict, max_batch_size=8, max_wait_ms=50)
+    inputs = [
+        np.zeros((1, 2, 2, 3), dtype=np.float32),
+        np.ones((1, 4, 4, 3), dtype=np.float32),
+    ]
+
+    results = run_concurrently(batcher, inputs)
+
+    assert sorted(model.batch_sizes) == [1, 1]
+    assert [float(r[0]) for r in results] == [0, 1]
+
+
+def test_prediction_errors_are_propagated_to_every_caller():
+    def failing_predict(batch):
+        raise ValueError("model failure")
+
+    batcher = MicroBatcher("test", failing_predict, max_batch_size=4, max_wait_ms=10)
+
+    async def scenario():
+        results = await asyncio.gather(
+            batcher.submit(np.zeros((1, 2, 2, 3))),
+            batcher.submit(np.zeros((1, 2, 2, 3))),
+            return_exceptions=True
+        )
+        await batcher.stop()
+        return results
+
+    results = asyncio.run(scenario())
+
+    assert all(isinstance(r, ValueError) for r in results)
+
+
+def test_batches_of_the_model_input_size_reuse_the_preallocated_buffer():
+    received = []
+
+    def predict(batch):
+        received.append(batch)
+        return batch.reshape(batch.shape[0], -1)[:, :1]
+
+    batcher = MicroBatcher("test", predict, max_batch_size=4, max_wait_ms=50, input_size=(2, 2))
+    inputs = [np.full((1, 2, 2, 3), i, dtype=np.float32) for i in range(3)]
+
+    results = run_concurrently(batcher, inputs)
+
+    assert received[0].base is batcher._buffer
+    assert [float(r[0]) for r in results] == [0, 1, 2]
+
+
+def test_inputs_whose_deadline_passed_while_queued_are_left_out_of_the_batch():
+    model = RecordingModel()
+
+    def slow_predict(batch):
+        time.sleep(0.1)
+        return model.predict(batch)
+
+    batcher = MicroBatcher("test", slow_predict, max_batch_size=1, max_wait_ms=0)
+
+    async def scenario():
+        results = await asyncio.gather(
+            batcher.submit(np.zeros((1, 2, 2, 3), dtype=np.float32)),
+            batcher.submit(np.ones((1, 2, 2, 3), dtype=np.float32), deadline=RequestDeadline(0.05)),
+            return_exceptions=True
+        )
+        await asyncio.sleep(0.15)
+        await batcher.stop()
+        return results
+
+    results = asyncio.run(scenario())
+
+    assert float(results[0][0]) == 0
+    assert isinstance(results[1], HTTPException) and results[1].status_code == 504
+    # The second input was never predicted
+    assert model.batch_sizes == [1]
@@ -0,0 +1,4 @@
+import os
+
+# Use the testing settings profile, which does not require API keys or model files
+os.environ.setdefault("ENVIRONMENT", "testing")
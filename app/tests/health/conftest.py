@@ -0,0 +1,28 @@
+from unittest.mock import Mock
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.routes import health_routes
+from app.services.model_registry import ModelRegistry
+
+
+def fake_loader(model_path=None):
+    model = Mock(input_shape=(None, 32, 32, 3))
+    model.warmup = Mock()
+    return model
+
+
+@pytest.fixture
+def model_registry(monkeypatch):
+    registry = ModelRegistry(binary_loader=fake_loader, multiclass_loader=fake_loader)
+    monkeypatch.setattr(health_routes, "get_model_registry", lambda: registry)
+    return registry
+
+
+@pytest.fixture
+def client():
+    app = FastAPI()
+    app.include_router(health_routes.router)
+    return TestClient(app)
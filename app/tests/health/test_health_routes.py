@@ -0,0 +1,48 @@
+import asyncio
+
+
+def test_live_returns_200_while_models_are_loading(client, model_registry):
+    response = client.get("/health/live")
+
+    assert response.status_code == 200
+    assert response.json() == {"status": "alive"}
+
+
+def test_ready_returns_503_until_models_are_loaded(client, model_registry):
+    response = client.get("/health/ready")
+
+    assert response.status_code == 503
+    assert response.json() == {"status": "starting"}
+
+
+def test_ready_returns_200_once_models_are_loaded_and_warmed_up(client, model_registry):
+    async def load_and_probe():
+        await model_registry.load()
+        service = model_registry.prediction_service
+        response = await asyncio.to_thread(client.get, "/health/ready")
+        await model_registry.close()
+        return service, response
+
+    service, response = asyncio.run(load_and_probe())
+
+    assert response.status_code == 200
+    assert response.json() == {"status": "ready"}
+    service.binary_model.warmup.assert_called_once()
+    service.multiclass_model.warmup.assert_called_once()
+
+
+def test_ready_reports_failed_when_a_model_cannot_be_loaded(client, model_registry):
+    def failing_loader(model_path=None):
+        raise OSError("model file not found")
+
+    model_registry.loaders["multiclass"] = failing_loader
+
+    try:
+        asyncio.run(model_registry.load())
+    except OSError:
+        pass
+
+    response = client.get("/health/ready")
+
+    assert response.status_code == 503
+    assert response.json() == {"status": "failed"}
@@ -0,0 +1,111 @@
+import json
+from unittest.mock import Mock
+
+import numpy as np
+import pytest
+
+from app import config
+from app.autotune import default_thread_counts, measure_forward, select_profile
+from app.config import Settings, runtime_hardware
+
+
+def batches(**results) -> dict:
+    return {
+        "version": "v1",
+        "batches": {
+            batch_size.removeprefix("batch_"): {"throughput": throughput, "p50_ms": p95_ms / 2, "p95_ms": p95_ms}
+            for batch_size, (throughput, p95_ms) in results.items()
+        },
+    }
+
+
+@pytest.fixture
+def measurements():
+    return {
+        1: {
+            "binary": batches(batch_1=(100, 10), batch_8=(300, 30), batch_32=(320, 110)),
+            "multiclass": batches(batch_1=(50, 20), batch_8=(150, 60), batch_32=(160, 220)),
+        },
+        4: {
+            "binary": batches(batch_1=(200, 5), batch_8=(780, 10), batch_32=(800, 40)),
+            "multiclass": batches(batch_1=(60, 15), batch_8=(390, 25), batch_32=(400, 90)),
+        },
+    }
+
+
+def test_profile_prefers_the_smallest_batch_close_to_the_best_throughput(measurements):
+    assert select_profile(measurements, max_latency_ms=None) == (4, 8)
+
+
+def test_profile_respects_the_latency_budget(measurements):
+    assert select_profile(measurements, max_latency_ms=20) == (4, 1)
+
+    with pytest.raises(ValueError):
+        select_profile(measurements, max_latency_ms=1)
+
+
+def test_default_thread_counts_end_with_the_worker_share_of_the_cores(monkeypatch):
+    monkeypatch.setattr("os.cpu_count", lambda: 12)
+
+    assert default_thread_counts(1) == [1, 2, 4, 8, 12]
+    assert default_thread_counts(4) == [1, 2, 3]
+
+
+def test_forward_passes_are_measured_on_inputs_of_the_model_shape():
+    classifier = Mock(input_shape=(None, 16, 24, 3))
+    classifier.predict.side_effect = lambda batch: np.zeros((len(batch), 1))
+
+    result = measure_forward(classifier, batch_size=4, iterations=3)
+
+    assert classifier.predict.call_count == 4
+    assert classifier.predict.call_args[0][0].shape == (4, 16, 24, 3)
+    assert result["throughput"] > 0
+    assert result["p95_ms"] >= result["p50_ms"]
+
+
+def write_profile(path, hardware=None, **tuned):
+    path.write_text(json.dumps({
+        "hardware": hardware or runtime_hardware(1, "keras"),
+        "settings": {"tf_intra_op_threads": 4, "prediction_max_batch_size": 8, "app_port": 1, **tuned},
+    }))
+    return str(path)
+
+
+def test_settings_apply_the_tuned_profile(tmp_path):
+    settings = Settings(autotune_profile_path=write_profile(tmp_path / "profile.json"))
+
+    assert settings.tf_intra_op_threads == 4
+    assert settings.prediction_max_batch_size == 8
+    # Only tunable settings are read from the profile
+    assert settings.app_port == 5002
+
+
+def test_settings_given_explicitly_win_over_the_profile(tmp_path, monkeypatch):
+    monkeypatch.setenv("TF_INTRA_OP_THREADS", "2")
+
+    settings = Settings(
+        autotune_profile_path=write_profile(tmp_path / "profile.json"),
+        prediction_max_batch_size=32
+    )
+
+    assert settings.tf_intra_op_threads == 2
+    assert settings.prediction_max_batch_size == 32
+
+
+def test_profile_tuned_for_other_hardware_is_ignored(tmp_path):
+    hardware = {**runtime_hardware(1, "keras"), "cpu_count": 1024}
+
+    settings = Settings(autotune_profile_path=write_profile(tmp_path / "profile.json", hardware))
+
+    assert settings.tf_intra_op_threads is None
+    assert settings.prediction_max_batch_size == 16
+
+
+def test_profile_tuned_without_a_gpu_is_not_applied_on_a_gpu_node(tmp_path, monkeypatch):
+    profile_path = write_profile(tmp_path / "profile.json")
+    monkeypatch.setattr(config, "gpu_names", lambda: ["NVIDIA L4"])
+
+    settings = Settings(autotune_profile_path=profile_path)
+
+    assert runtime_hardware(1, "keras")["gpus"] == ["NVIDIA L4"]
+    assert settings.tf_intra_op_threads is None
@@ -0,0 +1,78 @@
+import sys
+from types import SimpleNamespace
+
+import pytest
+
+from app import classifier_models
+
+
+class FakeTensorFlow:
+    # Raises like TensorFlow when devices or thread pools are configured after the runtime started
+    def __init__(self, gpus):
+        self.initialized = False
+        self.calls = []
+        self.config = SimpleNamespace(
+            list_physical_devices=lambda kind: gpus,
+            list_logical_devices=self._initialize,
+            set_visible_devices=lambda *args: self._configure("set_visible_devices", *args),
+            experimental=SimpleNamespace(set_memory_growth=lambda *args: self._configure("set_memory_growth", *args)),
+            threading=SimpleNamespace(
+                set_intra_op_parallelism_threads=lambda threads: self._configure("intra_op", threads),
+                set_inter_op_parallelism_threads=lambda threads: self._configure("inter_op", threads),
+            ),
+        )
+
+    def _initialize(self, kind):
+        self.initialized = True
+        return []
+
+    def _configure(self, name, *args):
+        if self.initialized:
+            raise RuntimeError(f"{name} cannot be modified after initialization")
+        self.calls.append((name, *args))
+
+
+@pytest.fixture
+def fake_tensorflow(monkeypatch):
+    tensorflow = FakeTensorFlow(gpus=["GPU:0"])
+    monkeypatch.setitem(sys.modules, "tensorflow", tensorflow)
+    monkeypatch.setattr(classifier_models.settings, "prediction_model_backend", "keras")
+    monkeypatch.setattr(classifier_models.settings, "tf_intra_op_threads", None)
+    monkeypatch.setattr(classifier_models.settings, "tf_inter_op_threads", None)
+    monkeypatch.setattr(classifier_models.settings, "omp_num_threads", None)
+    return tensorflow
+
+
+def test_worker_thread_pools_are_sized_before_the_gpu_is_configured(monkeypatch, fake_tensorflow):
+    monkeypatch.setattr(classifier_models.settings, "app_workers", 4)
+    monkeypatch.setattr("os.cpu_count", lambda: 16)
+
+    classifier_models.configure_devices()
+
+    assert fake_tensorflow.calls == [
+        ("intra_op", 4),
+        ("inter_op", 2),
+        ("set_visible_devices", "GPU:0", "GPU"),
+        ("set_memory_growth", "GPU:0", True),
+    ]
+
+
+def test_tuned_thread_pools_of_a_single_worker_are_sized_before_the_gpu_is_configured(monkeypatch, fake_tensorflow):
+    monkeypatch.setattr(classifier_models.settings, "app_workers", 1)
+    monkeypatch.setattr(classifier_models.settings, "tf_intra_op_threads", 6)
+    monkeypatch.setattr(classifier_models.settings, "tf_inter_op_threads", 1)
+
+    classifier_models.configure_devices()
+
+    assert fake_tensorflow.calls[:2] == [("intra_op", 6), ("inter_op", 1)]
+    assert ("set_memory_growth", "GPU:0", True) in fake_tensorflow.calls
+
+
+def test_thread_pools_of_an_initialized_runtime_are_left_as_they_are(monkeypatch, fake_tensorflow):
+    monkeypatch.setattr(classifier_models.settings, "app_workers", 1)
+    monkeypatch.setattr(classifier_models.settings, "tf_intra_op_threads", 6)
+    fake_tensorflow.initialized = True
+
+    classifier_models.configure_devices()
+
+    assert fake_tensorflow.calls == []
@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+
+tf = pytest.importorskip("tensorflow")
+keras = pytest.importorskip("keras")
+
+from app.services.inference_service import CompiledClassifier, batch_size_buckets, embedding_model  # noqa: E402
+
+
+@pytest.fixture
+def tiny_model():
+    return keras.Sequential([
+        keras.Input(shape=(8, 8, 3)),
+        keras.layers.GlobalAveragePooling2D(),
+        keras.layers.Dense(3, activation="softmax"),
+    ])
+
+
+def test_batch_size_buckets_are_powers_of_two_capped_by_max_batch_size():
+    assert batch_size_buckets(1) == [1]
+    assert batch_size_buckets(8) == [1, 2, 4, 8]
+    assert batch_size_buckets(12) == [1, 2, 4, 8, 12]
+
+
+def test_compiled_classifier_matches_keras_predict(tiny_model):
+    classifier = CompiledClassifier(tiny_model, max_batch_size=8)
+    classifier.warmup()
+    batch = np.random.random((3, 8, 8, 3)).astype(np.float32)
+
+    predictions = classifier.predict(batch)
+
+    assert predictions.shape == (3, 3)
+    np.testing.assert_allclose(predictions, tiny_model.predict(batch, verbose=0), rtol=1e-5)
+
+
+def test_compiled_classifier_does_not_retrace_after_warmup(tiny_model):
+    classifier = CompiledClassifier(tiny_model, max_batch_size=4)
+    classifier.warmup()
+    traced = classifier._forward.experimental_get_tracing_count()
+
+    for batch_size in (1, 2, 3, 4, 6):
+        classifier.predict(np.zeros((batch_size, 8, 8, 3), dtype=np.float32))
+
+    assert classifier._forward.experimental_get_tracing_count() == traced
+
+
+def test_embedding_model_returns_pooled_penultimate_layer_outputs():
+    model = keras.Sequential([
+        keras.Input(shape=(8, 8, 3)),
+        keras.layers.Conv2D(4, 3, padding="same"),
+        keras.layers.Conv2D(5, 3, padding="same"),
+        keras.layers.Flatten(),
+        keras.layers.Dense(3, activation="softmax"),
+    ])
+
+    embedder = embedding_model(model)
+    named = embedding_model(model, model.layers[0].name)
+
+    assert embedder.output_shape == (None, 8 * 8 * 5)
+    assert named.output_shape == (None, 4)
@@ -0,0 +1,146 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from app.export_models import accuracy_delta, convert_to_tflite
+from app.services import tflite_inference_service
+from app.services.tflite_inference_service import TFLiteClassifier, tflite_model_path
+
+
+# Looked up next to the interpreter class, like the op resolver types of the TFLite runtimes
+OpResolverType = SimpleNamespace(BUILTIN_WITHOUT_DEFAULT_DELEGATES="builtin_without_default_delegates")
+
+
+class FakeInterpreter:
+    # Mean of the pixels as the single output, with the TFLite interpreter's calling conventions
+    created = []
+
+    def __init__(self, model_path, num_threads, **options):
+        self.options = options
+        self.shape = np.array([1, 8, 8, 3])
+        self.tensors = {}
+        self.resizes = []
+        FakeInterpreter.created.append(self)
+
+    def get_input_details(self):
+        return [{"index": 0, "shape": self.shape, "dtype": np.float32, "quantization": (0.0, 0)}]
+
+    def get_output_details(self):
+        return [{"index": 1, "shape": np.array([self.shape[0], 1]), "dtype": np.float32, "quantization": (0.0, 0)}]
+
+    def resize_tensor_input(self, index, shape):
+        self.shape = np.array(shape)
+        self.resizes.append(shape[0])
+
+    def allocate_tensors(self):
+        pass
+
+    def set_tensor(self, index, value):
+        assert value.shape == tuple(self.shape)
+        self.tensors[index] = value
+
+    def invoke(self):
+        self.tensors[1] = self.tensors[0].mean(axis=(1, 2, 3))[:, None]
+
+    def get_tensor(self, index):
+        return self.tensors[index].copy()
+
+
+def test_accuracy_delta_compares_binary_decisions_at_the_threshold():
+    reference = np.array([[0.1], [0.7], [0.55]], dtype=np.float32)
+    exported = np.array([[0.12], [0.68], [0.45]], dtype=np.float32)
+
+    report = accuracy_delta(reference, exported)
+
+    assert report["images"] == 3
+    assert report["max_abs_diff"] == pytest.approx(0.1)
+    assert report["top1_agreement"] == pytest.approx(2 / 3)
+
+
+def test_accuracy_delta_compares_multiclass_top1():
+    reference = np.array([[0.7, 0.2, 0.1], [0.1, 0.3, 0.6]], dtype=np.float32)
+    exported = np.array([[0.6, 0.3, 0.1], [0.1, 0.3, 0.6]], dtype=np.float32)
+
+    report = accuracy_delta(reference, exported)
+
+    assert report["top1_agreement"] == 1.0
+    assert report["mean_abs_diff"] == pytest.approx(0.2 / 6)
+
+
+def test_tflite_models_are_exported_next_to_the_keras_model():
+    assert tflite_model_path("models/binary_classifier.keras") == "models/binary_classifier.tflite"
+
+
+def test_tflite_classifier_pads_batches_and_resizes_one_interpreter_per_thread(monkeypatch):
+    monkeypatch.setattr(tflite_inference_service, "load_interpreter_class", lambda: FakeInterpreter)
+    FakeInterpreter.created.clear()
+    classifier = TFLiteClassifier("model.tflite", max_batch_size=4)
+    batch = np.arange(6, dtype=np.float32)[:, None, None, None] * np.ones((6, 8, 8, 3), dtype=np.float32)
+
+    predictions = classifier.predict(batch)
+    classifier.predict(batch[:3])
+
+    np.testing.assert_allclose(predictions[:, 0], np.arange(6))
+    # The probe interpreter, then a single one sized to the buckets 4 and 2 of the split batch, then 4 for 3 items
+    assert len(FakeInterpreter.created) == 2
+    assert [int(size) for size in FakeInterpreter.created[1].resizes] == [4, 2, 4]
+
+
+def test_tflite_classifier_keeps_an_interpreter_per_inference_thread(monkeypatch):
+    monkeypatch.setattr(tflite_inference_service, "load_interpreter_class", lambda: FakeInterpreter)
+    FakeInterpreter.created.clear()
+    classifier = TFLiteClassifier("model.tflite", max_batch_size=4)
+    batch = np.ones((2, 8, 8, 3), dtype=np.float32)
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        barrier = threading.Barrier(2)
+
+        def predict():
+            barrier.wait(5)
+            return classifier.predict(batch)
+
+        list(executor.map(lambda _: predict(), range(2)))
+        list(executor.map(lambda _: classifier.predict(batch), range(4)))
+
+    # The probe interpreter, then one per thread whatever the number of batches
+    assert len(FakeInterpreter.created) == 3
+
+
+def test_tflite_interpreters_read_shared_weights_without_the_xnnpack_delegate(monkeypatch):
+    monkeypatch.setattr(tflite_inference_service, "load_interpreter_class", lambda: FakeInterpreter)
+    monkeypatch.setattr(tflite_inference_service.settings, "prediction_tflite_shared_weights", True)
+    FakeInterpreter.created.clear()
+
+    TFLiteClassifier("model.tflite", max_batch_size=4)
+
+    assert FakeInterpreter.created[0].options == {
+        "experimental_op_resolver_type": OpResolverType.BUILTIN_WITHOUT_DEFAULT_DELEGATES
+    }
+
+
+@pytest.mark.parametrize("quantization", ["none", "float16", "int8"])
+def test_exported_tflite_classifier_matches_keras(tmp_path, quantization):
+    keras = pytest.importorskip("keras")
+    pytest.importorskip("tensorflow")
+
+    model = keras.Sequential([
+        keras.Input(shape=(8, 8, 3)),
+        keras.layers.GlobalAveragePooling2D(),
+        keras.layers.Dense(3, activation="softmax"),
+    ])
+    calibration = [np.random.random((1, 8, 8, 3)).astype(np.float32) for _ in range(16)]
+    path = tmp_path / "model.tflite"
+    path.write_bytes(convert_to_tflite(model, quantization, calibration))
+
+    classifier = TFLiteClassifier(str(path), max_batch_size=4)
+    classifier.warmup()
+    batch = np.random.random((6, 8, 8, 3)).astype(np.float32)
+
+    report = accuracy_delta(model.predict(batch, verbose=0), classifier.predict(batch))
+
+    assert classifier.input_shape == (None, 8, 8, 3)
+    assert report["images"] == 6
+    assert report["max_abs_diff"] < (0.05 if quantization == "int8" else 1e-2)
@@ -0,0 +1,182 @@
+import asyncio
+import io
+import threading
+import time
+from contextlib import nullcontext
+from types import SimpleNamespace
+from unittest.mock import Mock
+
+import numpy as np
+import pytest
+from PIL import Image
+from fastapi import FastAPI, HTTPException, UploadFile
+from fastapi.testclient import TestClient
+from starlette import status
+
+from app.routes import job_routes
+from app.services import job_service
+from app.services.job_service import JobStore, JobWorker
+from app.services.prediction_service import PredictionService
+
+
+def jpeg_upload(filename, color="white"):
+    content = io.BytesIO()
+    Image.new("RGB", (40, 30), color=color).save(content, format="JPEG")
+    content.seek(0)
+    return UploadFile(filename=filename, file=content)
+
+
+@pytest.fixture
+def store(tmp_path):
+    return JobStore(str(tmp_path / "jobs.sqlite3"))
+
+
+@pytest.fixture
+def prediction_service():
+    binary_model = Mock(input_shape=(None, 32, 32, 3), version="binary-v1")
+    binary_model.predict.side_effect = lambda batch: np.full((len(batch), 1), 0.7)
+    return PredictionService(
+        binary_model=binary_model,
+        multiclass_model=Mock(input_shape=(None, 32, 32, 3), version="multiclass-v1")
+    )
+
+
+def registry_serving(service):
+    return SimpleNamespace(is_ready=True, lease=lambda: nullcontext(service))
+
+
+def test_jobs_are_claimed_oldest_first_one_model_at_a_time(store):
+    first = store.create_job("binary", [jpeg_upload("a.jpg"), jpeg_upload("b.jpg")])
+    store.create_job("multiclass", [jpeg_upload("c.jpg")])
+    third = store.create_job("binary", [jpeg_upload("d.jpg")])
+
+    model, items = store.claim(limit=8)
+
+    assert model == "binary"
+    assert len(items) == 3
+    assert store.get_job(first, include_results=False)["status"] == "running"
+    assert store.get_job(third, include_results=False)["status"] == "running"
+    assert store.claim(limit=8)[0] == "multiclass"
+    assert store.claim(limit=8) is None
+
+
+def test_completed_jobs_keep_the_result_or_error_of_every_image(store):
+    job_id = store.create_job("binary", [
+        jpeg_upload("a.jpg"),
+        UploadFile(filename="broken.jpg", file=io.BytesIO(b"not an image")),
+        jpeg_upload("a.jpg", "black"),
+    ])
+    _, items = store.claim(limit=8)
+
+    store.complete([(item_id, [0.25], "binary-v1", None) for item_id, _ in items])
+    job = store.get_job(job_id)
+
+    assert job["status"] == "done"
+    assert (job["total"], job["completed"], job["failed"]) == (3, 2, 1)
+    assert list(job["results"]) == ["a.jpg", "broken.jpg", "a.jpg (2)"]
+    assert job["results"]["a.jpg"] == {"predictions": [0.25], "model_version": "binary-v1"}
+    assert "error" in job["results"]["broken.jpg"]
+
+
+def test_images_of_a_worker_that_died_are_claimed_again(store, monkeypatch):
+    monkeypatch.setattr(job_service.settings, "jobs_claim_timeout_seconds", 0.01)
+    store.create_job("binary", [jpeg_upload("a.jpg")])
+    _, items = store.claim(limit=8)
+
+    time.sleep(0.02)
+
+    assert [item_id for item_id, _ in store.claim(limit=8)[1]] == [item_id for item_id, _ in items]
+
+
+def test_worker_predicts_queued_images_through_the_prediction_service(store, prediction_service, monkeypatch):
+    monkeypatch.setattr(job_service.settings, "jobs_poll_interval_seconds", 0.01)
+    job_id = store.create_job("binary", [jpeg_upload(f"{index}.jpg") for index in range(5)])
+    # Long enough for the five images to be decoded into one batch on a busy machine
+    prediction_service.binary_batcher.max_wait = 0.5
+    worker = JobWorker(store, registry_serving(prediction_service))
+
+    async def scenario():
+        worker.start()
+        for _ in range(200):
+            await asyncio.sleep(0.01)
+            if store.get_job(job_id, include_results=False)["status"] == "done":
+                break
+        await worker.stop()
+        await prediction_service.stop()
+
+    asyncio.run(scenario())
+    job = store.get_job(job_id)
+
+    assert job["completed"] == 5
+    assert job["results"]["0.jpg"] == {"predictions": [pytest.approx(0.7)], "model_version": "binary-v1"}
+    # The whole job fit in one model batch
+    assert prediction_service.binary_model.predict.call_count == 1
+
+
+def test_shed_images_are_queued_again(store, monkeypatch):
+    monkeypatch.setattr(job_service.settings, "prediction_retry_after_seconds", 0)
+    job_id = store.create_job("binary", [jpeg_upload("a.jpg")])
+    overloaded = Mock()
+    overloaded.predict_images.side_effect = HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE)
+    worker = JobWorker(store, registry_serving(overloaded))
+
+    asyncio.run(worker._predict(*store.claim(limit=8)))
+
+    assert overloaded.predict_images.call_args.kwargs["deadline"].priority == "low"
+    assert store.get_job(job_id, include_results=False)["status"] == "running"
+    assert len(store.claim(limit=8)[1]) == 1
+
+
+def test_images_of_a_cancelled_worker_are_released_off_the_event_loop(store, monkeypatch):
+    job_id = store.create_job("binary", [jpeg_upload("a.jpg")])
+    stalled = Mock()
+    stalled.predict_images.side_effect = lambda *args, **kwargs: asyncio.Event().wait()
+    worker = JobWorker(store, registry_serving(stalled))
+    release = store.release
+    release_threads = []
+
+    def recorded_release(item_ids):
+        release_threads.append(threading.current_thread())
+        release(item_ids)
+
+    monkeypatch.setattr(store, "release", recorded_release)
+
+    async def scenario():
+        task = asyncio.create_task(worker._predict(*store.claim(limit=8)))
+        await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(scenario())
+
+    assert release_threads and release_threads[0] is not threading.main_thread()
+    assert store.get_job(job_id, include_results=False)["status"] == "running"
+    assert len(store.claim(limit=8)[1]) == 1
+
+
+def test_job_routes_submit_long_poll_and_delete(store, monkeypatch):
+    monkeypatch.setattr(job_routes, "get_job_store", lambda: store)
+    monkeypatch.setattr(job_routes.settings, "jobs_poll_interval_seconds", 0.01)
+    app = FastAPI()
+    app.include_router(job_routes.router)
+    client = TestClient(app)
+
+    submitted = client.post(
+        "/predictions/jobs/binary",
+        files=[("files", ("a.jpg", jpeg_upload("a.jpg").file, "image/jpeg"))]
+    )
+    job_id = submitted.json()["job_id"]
+    polled = client.get(f"/predictions/jobs/{job_id}", params={"wait": 0.05})
+    _, items = store.claim(limit=8)
+    store.complete([(item_id, [0.9], "binary-v1", None) for item_id, _ in items])
+    finished = client.get(f"/predictions/jobs/{job_id}", params={"wait": 5})
+    deleted = client.delete(f"/predictions/jobs/{job_id}")
+
+    assert submitted.status_code == 202
+    assert submitted.json()["status"] == "queued"
+    assert polled.json()["status"] == "queued"
+    assert finished.json()["status"] == "done"
+    assert finished.json()["results"]["a.jpg"]["predictions"] == [0.9]
+    assert deleted.status_code == 204
+    assert client.get(f"/predictions/jobs/{job_id}").status_code == 404
@@ -0,0 +1,43 @@
+import asyncio
+from types import SimpleNamespace
+
+from prometheus_client import REGISTRY
+
+from app.services import system_metrics_sampler
+from app.services.system_metrics_sampler import SystemMetricsSampler
+
+
+def test_sampler_reports_cpu_and_process_memory_without_nvml(mocker):
+    mocker.patch.object(system_metrics_sampler, "init_nvml", return_value=False)
+    sampler = SystemMetricsSampler(interval_seconds=60)
+
+    async def sample_once():
+        sampler.start()
+        await asyncio.sleep(0.05)
+        await sampler.stop()
+
+    asyncio.run(sample_once())
+
+    assert not sampler.nvml_available
+    assert REGISTRY.get_sample_value("process_memory_usage_bytes") > 0
+
+
+def test_sampler_reports_every_gpu_under_its_own_label(mocker):
+    mocker.patch.object(system_metrics_sampler, "nvmlDeviceGetCount", return_value=2)
+    mocker.patch.object(system_metrics_sampler, "nvmlDeviceGetHandleByIndex", side_effect=lambda i: i)
+    mocker.patch.object(
+        system_metrics_sampler, "nvmlDeviceGetUtilizationRates",
+        side_effect=lambda handle: SimpleNamespace(gpu=10 + handle)
+    )
+    mocker.patch.object(
+        system_metrics_sampler, "nvmlDeviceGetMemoryInfo",
+        side_effect=lambda handle: SimpleNamespace(used=256 * (handle + 1), total=1024)
+    )
+    sampler = SystemMetricsSampler(interval_seconds=60)
+    sampler.nvml_available = True
+
+    sampler.sample()
+
+    assert REGISTRY.get_sample_value("process_gpu_usage", {"gpu": "0"}) == 10
+    assert REGISTRY.get_sample_value("process_gpu_usage", {"gpu": "1"}) == 11
+    assert REGISTRY.get_sample_value("gpu_memory_usage_percent", {"gpu": "1"}) == 50
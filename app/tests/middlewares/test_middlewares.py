@@ -0,0 +1,73 @@
+import pytest
+from fastapi import FastAPI, HTTPException
+from fastapi.testclient import TestClient
+
+from app.middlewares import auth_middleware
+from app.middlewares.auth_middleware import AuthMiddleware
+from app.middlewares.exception_logging_middleware import ExceptionLoggingMiddleware
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(auth_middleware.settings, "wildlens_prediction_api_key", "test-key")
+
+    app = FastAPI()
+
+    @app.get("/predictions/ok")
+    async def ok():
+        return {"status": "ok"}
+
+    @app.get("/predictions/overloaded")
+    async def overloaded():
+        raise HTTPException(status_code=503, detail="Overloaded", headers={"Retry-After": "1"})
+
+    @app.get("/predictions/broken")
+    async def broken():
+        raise RuntimeError("boom")
+
+    @app.get("/health/live")
+    async def live():
+        return {"status": "alive"}
+
+    app.add_middleware(AuthMiddleware)
+    app.add_middleware(ExceptionLoggingMiddleware)
+    return TestClient(app, raise_server_exceptions=False)
+
+
+def test_requests_without_api_key_are_rejected(client):
+    response = client.get("/predictions/ok")
+
+    assert response.status_code == 401
+    assert response.json() == {"detail": "API Key is required"}
+
+
+def test_requests_with_a_wrong_api_key_are_rejected(client):
+    response = client.get("/predictions/ok", headers={"Authorization": "Key wrong-key"})
+
+    assert response.status_code == 401
+    assert response.json() == {"detail": "Invalid API Key"}
+
+
+def test_requests_with_the_api_key_are_served(client):
+    response = client.get("/predictions/ok", headers={"Authorization": "Key test-key"})
+
+    assert response.status_code == 200
+    assert response.json() == {"status": "ok"}
+
+
+def test_excluded_paths_do_not_require_an_api_key(client):
+    assert client.get("/health/live").status_code == 200
+
+
+def test_http_exceptions_keep_their_status_and_headers(client):
+    response = client.get("/predictions/overloaded", headers={"Authorization": "Key test-key"})
+
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
+
+
+def test_unhandled_exceptions_become_500_responses(client):
+    response = client.get("/predictions/broken", headers={"Authorization": "Key test-key"})
+
+    assert response.status_code == 500
+    assert response.json() == {"detail": "An unexpected error occurred."}
@@ -11,8 +11,8 @@ from app.services.prediction_service import PredictionService
 @pytest.fixture
 def prediction_service():
     yield PredictionService(
-        binary_model=Mock(),
-        multiclass_model=Mock()
+        binary_model=Mock(input_shape=(None, 224, 224, 3), version="binary-v1"),
+        multiclass_model=Mock(input_shape=(None, 224, 224, 3), version="multiclass-v1")
     )
 
 @pytest.fixture
@@ -25,6 +25,15 @@ def valid_image_file():
 
     return UploadFile(filename="valid_image.jpg", file=file_content)
 
+@pytest.fixture
+def large_jpeg_image_file():
+    img = Image.new("RGB", (2000, 1500), color="white")
+    file_content = io.BytesIO()
+    img.save(file_content, format="JPEG")
+    file_content.seek(0)
+
+    return UploadFile(filename="large_image.jpg", file=file_content)
+
 @pytest.fixture
 def invalid_image_file():
     return UploadFile(filename="invalid_image.jpg", file=io.BytesIO("invalid_image".encode()))
@@ -0,0 +1,91 @@
+import asyncio
+import io
+import tarfile
+import zipfile
+
+import numpy as np
+from PIL import Image
+from fastapi import UploadFile
+
+from app.services.archive_service import iter_batch_items
+
+
+def jpeg_bytes(color="white"):
+    content = io.BytesIO()
+    Image.new("RGB", (40, 30), color=color).save(content, format="JPEG")
+    return content.getvalue()
+
+
+def zip_upload(members: dict[str, bytes]):
+    content = io.BytesIO()
+    with zipfile.ZipFile(content, "w") as archive:
+        for name, data in members.items():
+            archive.writestr(name, data)
+    content.seek(0)
+    return UploadFile(filename="images.zip", file=content)
+
+
+def tar_upload(members: dict[str, bytes]):
+    content = io.BytesIO()
+    with tarfile.open(fileobj=content, mode="w:gz") as archive:
+        for name, data in members.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            archive.addfile(info, io.BytesIO(data))
+    content.seek(0)
+    return UploadFile(filename="images.tar.gz", file=content)
+
+
+def test_iter_batch_items_expands_zip_archives_and_skips_hidden_members():
+    upload = zip_upload({
+        "card/a.jpg": jpeg_bytes(),
+        "card/b.jpg": jpeg_bytes("black"),
+        "__MACOSX/card/._a.jpg": b"resource fork",
+    })
+
+    names = [name for name, _, _ in iter_batch_items([upload])]
+
+    assert names == ["card/a.jpg", "card/b.jpg"]
+
+
+def test_iter_batch_items_expands_compressed_tar_archives():
+    upload = tar_upload({"a.jpg": jpeg_bytes(), "b.jpg": jpeg_bytes()})
+
+    items = list(iter_batch_items([upload]))
+
+    assert [name for name, _, _ in items] == ["a.jpg", "b.jpg"]
+    assert all(data is not None and error is None for _, data, error in items)
+
+
+def test_iter_batch_items_passes_plain_images_through():
+    uploads = [UploadFile(filename=f"{i}.jpg", file=io.BytesIO(jpeg_bytes())) for i in range(3)]
+
+    items = list(iter_batch_items(uploads))
+
+    assert [name for name, _, _ in items] == ["0.jpg", "1.jpg", "2.jpg"]
+
+
+def test_iter_batch_items_reports_the_files_over_the_limit():
+    upload = zip_upload({f"{i}.jpg": jpeg_bytes() for i in range(4)})
+
+    items = list(iter_batch_items([upload], max_files=2))
+
+    assert [name for name, _, _ in items] == ["0.jpg", "1.jpg", "2.jpg", "3.jpg"]
+    assert all(error is None for _, _, error in items[:2])
+    assert all(data is None and "at most 2 files" in error for _, data, error in items[2:])
+
+
+def test_predict_batch_reports_errors_per_file(prediction_service):
+    prediction_service.binary_model.predict.side_effect = lambda batch: np.full((len(batch), 1), 0.8)
+    upload = zip_upload({
+        "a.jpg": jpeg_bytes(),
+        "broken.jpg": b"not an image",
+        "c.jpg": jpeg_bytes("black"),
+    })
+
+    results = asyncio.run(prediction_service.predict_batch("binary", [upload]))
+
+    assert set(results) == {"a.jpg", "broken.jpg", "c.jpg"}
+    np.testing.assert_allclose(results["a.jpg"]["predictions"], [0.8])
+    np.testing.assert_allclose(results["c.jpg"]["predictions"], [0.8])
+    assert "error" in results["broken.jpg"]
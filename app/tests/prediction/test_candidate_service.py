@@ -0,0 +1,130 @@
+import asyncio
+import threading
+from unittest.mock import Mock
+
+import numpy as np
+import pytest
+from prometheus_client import REGISTRY
+
+from app.services import prediction_service as prediction_service_module
+from app.services.prediction_service import PredictionService
+
+
+def shadow_count(model, outcome):
+    return REGISTRY.get_sample_value(
+        "candidate_shadow_predictions_total", {"model": model, "outcome": outcome}
+    ) or 0.0
+
+
+def make_service(binary_output, candidate_output):
+    binary_model = Mock(input_shape=(None, 224, 224, 3), version="binary-v1")
+    binary_model.predict.side_effect = lambda batch: np.full((len(batch), 1), binary_output)
+    candidate_model = Mock(input_shape=(None, 224, 224, 3), version="binary-v2")
+    candidate_model.predict.side_effect = lambda batch: np.full((len(batch), 1), candidate_output)
+    return PredictionService(
+        binary_model=binary_model,
+        multiclass_model=Mock(input_shape=(None, 224, 224, 3), version="multiclass-v1"),
+        binary_candidate_model=candidate_model
+    )
+
+
+async def predict_and_drain(service, image_data):
+    result = await service.predict_binary(image_data)
+    await asyncio.gather(*service.candidates["binary"]._shadow_tasks)
+    return result
+
+
+def test_canary_share_is_served_by_the_candidate(monkeypatch, valid_image_file):
+    monkeypatch.setattr(prediction_service_module.settings, "candidate_canary_percent", 100)
+    service = make_service(0.2, 0.8)
+
+    prediction, version = asyncio.run(service.predict_binary(valid_image_file.file.read()))
+
+    assert version == "binary-v2"
+    assert prediction[0] == pytest.approx(0.8)
+    service.binary_model.predict.assert_not_called()
+    assert service.candidate_versions == {"binary": "binary-v2"}
+
+
+@pytest.mark.parametrize("candidate_output, outcome", [(0.7, "agree"), (0.1, "disagree")])
+def test_shadow_predictions_are_compared_without_changing_the_response(
+        monkeypatch,
+        valid_image_file,
+        candidate_output,
+        outcome
+):
+    monkeypatch.setattr(prediction_service_module.settings, "candidate_canary_percent", 0)
+    monkeypatch.setattr(prediction_service_module.settings, "candidate_shadow_percent", 100)
+    service = make_service(0.9, candidate_output)
+    before = shadow_count("binary", outcome)
+
+    prediction, version = asyncio.run(predict_and_drain(service, valid_image_file.file.read()))
+
+    assert version == "binary-v1"
+    assert prediction[0] == pytest.approx(0.9)
+    service.candidates["binary"].model.predict.assert_called_once()
+    assert shadow_count("binary", outcome) == before + 1
+
+
+def test_shadow_predictions_are_dropped_once_too_many_are_pending(monkeypatch, valid_image_file):
+    monkeypatch.setattr(prediction_service_module.settings, "candidate_canary_percent", 0)
+    monkeypatch.setattr(prediction_service_module.settings, "candidate_shadow_percent", 100)
+    monkeypatch.setattr(prediction_service_module.settings, "candidate_shadow_max_pending", 0)
+    service = make_service(0.9, 0.9)
+    before = shadow_count("binary", "dropped")
+
+    asyncio.run(predict_and_drain(service, valid_image_file.file.read()))
+
+    service.candidates["binary"].model.predict.assert_not_called()
+    assert shadow_count("binary", "dropped") == before + 1
+
+
+def test_shadow_predictions_are_dropped_while_the_canary_falls_behind(monkeypatch, valid_image_file):
+    monkeypatch.setattr(prediction_service_module.settings, "candidate_canary_percent", 0)
+    monkeypatch.setattr(prediction_service_module.settings, "candidate_shadow_percent", 100)
+    service = make_service(0.9, 0.9)
+    # A forward pass of the canary takes longer than shadows may delay it
+    service.candidates["binary"].batcher._forward_duration = 10
+    before = shadow_count("binary", "dropped")
+
+    asyncio.run(predict_and_drain(service, valid_image_file.file.read()))
+
+    service.candidates["binary"].model.predict.assert_not_called()
+    assert shadow_count("binary", "dropped") == before + 1
+
+
+def test_saturated_shadow_queue_does_not_delay_canary_predictions(monkeypatch, valid_image_file):
+    monkeypatch.setattr(prediction_service_module.settings, "candidate_canary_percent", 0)
+    monkeypatch.setattr(prediction_service_module.settings, "candidate_shadow_percent", 100)
+    # Every upload is predicted and shadowed, not served from the cache
+    monkeypatch.setattr(prediction_service_module.settings, "prediction_cache_enabled", False)
+    service = make_service(0.2, 0.8)
+    candidate = service.candidates["binary"]
+    shadow_released = threading.Event()
+
+    def candidate_predict(batch):
+        # Shadow forward passes hang until the canary prediction is done
+        if threading.current_thread().name.startswith("prediction-shadow"):
+            shadow_released.wait(5)
+        return np.full((len(batch), 1), 0.8)
+
+    candidate.model.predict.side_effect = candidate_predict
+    image_data = valid_image_file.file.read()
+
+    async def scenario():
+        for _ in range(candidate.max_pending_shadows):
+            await service.predict_binary(image_data)
+        assert len(candidate._shadow_tasks) == candidate.max_pending_shadows
+
+        input_tensor = np.zeros((1, 224, 224, 3), dtype=np.float32)
+        try:
+            return await asyncio.wait_for(
+                candidate.predict(input_tensor, image_data, service.decode_executor, "binary"), 2
+            )
+        finally:
+            shadow_released.set()
+            await service.stop()
+
+    prediction = asyncio.run(scenario())
+
+    assert prediction[0] == pytest.approx(0.8)
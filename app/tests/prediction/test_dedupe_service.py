@@ -0,0 +1,78 @@
+import asyncio
+import io
+import time
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from app.services import prediction_service as prediction_service_module
+from app.services.dedupe_service import DedupeIndex, perceptual_hash
+from app.services.prediction_service import PredictionService, prepare_input_tensor
+
+
+def scene_jpeg(seed: int, quality: int = 90) -> bytes:
+    # Smooth random scene, like a camera trap frame, so JPEG re-encoding keeps its structure
+    rng = np.random.default_rng(seed)
+    coarse = rng.integers(0, 256, size=(6, 8, 3), dtype=np.uint8)
+    image = Image.fromarray(coarse).resize((160, 120), Image.Resampling.BICUBIC)
+    content = io.BytesIO()
+    image.save(content, format="JPEG", quality=quality)
+    return content.getvalue()
+
+
+def hash_distance(first: int, second: int) -> int:
+    return bin(first ^ second).count("1")
+
+
+def test_re_encoded_frames_have_close_hashes_and_other_scenes_do_not():
+    frame = perceptual_hash(prepare_input_tensor(scene_jpeg(1, quality=90), (64, 64)))
+    re_encoded = perceptual_hash(prepare_input_tensor(scene_jpeg(1, quality=60), (64, 64)))
+    other_scene = perceptual_hash(prepare_input_tensor(scene_jpeg(2), (64, 64)))
+
+    assert hash_distance(frame, re_encoded) <= 4
+    assert hash_distance(frame, other_scene) > 10
+
+
+def test_index_reuses_the_closest_recent_prediction_within_the_distance():
+    index = DedupeIndex(max_entries=4, max_distance=2, window_seconds=60)
+    index.put("binary", 0b1111, np.array([0.1]))
+    index.put("binary", 0b0111, np.array([0.2]))
+
+    assert index.get("binary", 0b0110)[0] == 0.2
+    assert index.get("binary", 0b1111_0000_0000) is None
+    assert index.get("multiclass", 0b1111) is None
+
+
+def test_index_forgets_predictions_past_the_window_and_the_oldest_entries():
+    index = DedupeIndex(max_entries=2, max_distance=0, window_seconds=0.01)
+    index.put("binary", 1, np.array([0.1]))
+    time.sleep(0.02)
+
+    assert index.get("binary", 1) is None
+
+    index.window_seconds = 60
+    for image_hash in (1, 2, 3):
+        index.put("binary", image_hash, np.array([float(image_hash)]))
+
+    assert index.get("binary", 1) is None
+    assert index.get("binary", 3)[0] == 3.0
+
+
+def test_near_identical_uploads_are_predicted_once(monkeypatch, prediction_service):
+    monkeypatch.setattr(prediction_service_module.settings, "prediction_dedupe_enabled", True)
+    service = PredictionService(
+        binary_model=prediction_service.binary_model,
+        multiclass_model=prediction_service.multiclass_model
+    )
+    service.binary_model.predict.side_effect = lambda batch: np.full((len(batch), 1), 0.8)
+
+    async def predict_burst():
+        results = [await service.predict_binary(scene_jpeg(3, quality)) for quality in (90, 85, 80)]
+        await service.stop()
+        return results
+
+    results = asyncio.run(predict_burst())
+
+    assert service.binary_model.predict.call_count == 1
+    assert [float(prediction[0]) for prediction, _ in results] == pytest.approx([0.8] * 3)
@@ -0,0 +1,85 @@
+import io
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from app.services.image_decoders import PillowDecoder, TurboJpegDecoder, TensorFlowDecoder, JpegDecoder, \
+    create_image_decoder, jpeg_scale_denominator
+from app.services.prediction_service import image_to_tensor
+
+# Mean and 99th percentile absolute difference allowed between a backend and PIL, on a 0-255 scale
+PARITY_MEAN_TOLERANCE = 3.0
+PARITY_P99_TOLERANCE = 16.0
+
+
+def photo_like_jpeg(size=(1200, 900)) -> bytes:
+    # Gradients with some texture, closer to a photo than a flat color
+    x = np.linspace(0, 1, size[0], dtype=np.float32)
+    y = np.linspace(0, 1, size[1], dtype=np.float32)[:, None]
+    pixels = np.stack([
+        255 * x * np.ones_like(y),
+        255 * y * np.ones_like(x),
+        127.5 + 127.5 * np.sin(40 * x) * np.cos(30 * y),
+    ], axis=-1).astype(np.uint8)
+    content = io.BytesIO()
+    Image.fromarray(pixels).save(content, format="JPEG", quality=90)
+    return content.getvalue()
+
+
+@pytest.mark.parametrize("decoder_class", [TurboJpegDecoder, TensorFlowDecoder], ids=lambda d: d.name)
+def test_accelerated_decoders_match_pillow_within_tolerance(decoder_class):
+    if not decoder_class.is_available():
+        pytest.skip(f"{decoder_class.name} is not installed")
+    image_data = photo_like_jpeg()
+
+    expected = image_to_tensor(PillowDecoder().decode(image_data, (224, 224)), (224, 224))
+    actual = image_to_tensor(decoder_class().decode(memoryview(image_data), (224, 224)), (224, 224))
+
+    difference = np.abs(actual - expected)
+    assert difference.mean() <= PARITY_MEAN_TOLERANCE
+    assert np.percentile(difference, 99) <= PARITY_P99_TOLERANCE
+
+
+def test_jpeg_decoders_without_a_jpeg_backend_cannot_be_created():
+    class IncompleteJpegDecoder(JpegDecoder):
+        name = "incomplete"
+
+    with pytest.raises(TypeError):
+        IncompleteJpegDecoder()
+
+
+def test_jpeg_decoders_hand_other_formats_to_pillow():
+    class FailingJpegDecoder(JpegDecoder):
+        def decode_jpeg(self, image_data, draft_size):
+            raise AssertionError("only JPEG images reach the accelerated backend")
+
+    content = io.BytesIO()
+    Image.new("RGB", (50, 40), color="red").save(content, format="PNG")
+
+    image = FailingJpegDecoder().decode(content.getvalue(), (32, 32))
+
+    assert image.size == (50, 40)
+
+
+def test_image_to_tensor_copies_decoded_arrays_of_the_target_size_into_the_buffer():
+    pixels = np.full((64, 32, 3), 200, dtype=np.uint8)
+    buffer = np.zeros((1, 64, 32, 3), dtype=np.float32)
+
+    input_tensor = image_to_tensor(pixels, (32, 64), out=buffer)
+
+    assert input_tensor is buffer
+    assert np.all(buffer == 200)
+
+
+def test_jpeg_scale_denominator_keeps_the_image_at_least_as_large_as_requested():
+    assert jpeg_scale_denominator((4000, 3000), (224, 224)) == 8
+    assert jpeg_scale_denominator((1200, 900), (224, 224)) == 4
+    assert jpeg_scale_denominator((300, 300), (224, 224)) == 1
+
+
+def test_missing_backends_fall_back_to_pillow(monkeypatch):
+    monkeypatch.setattr(TurboJpegDecoder, "is_available", classmethod(lambda cls: False))
+
+    assert isinstance(create_image_decoder("turbojpeg"), PillowDecoder)
+    assert isinstance(create_image_decoder("auto"), PillowDecoder)
@@ -0,0 +1,118 @@
+import io
+import struct
+import zlib
+from contextlib import nullcontext
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+from PIL import Image
+from fastapi import FastAPI, HTTPException
+from fastapi.testclient import TestClient
+from prometheus_client import REGISTRY
+
+from app.routes import prediction_routes
+from app.services.ingestion_service import ImageUploadValidator, validate_image
+
+
+def png_chunk(chunk_type: bytes, data: bytes) -> bytes:
+    return struct.pack(">I", len(data)) + chunk_type + data + struct.pack(">I", zlib.crc32(chunk_type + data))
+
+
+def png_header(width: int, height: int) -> bytes:
+    # Signature, IHDR and an empty IDAT, enough for the header parser to know the image size
+    ihdr = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+    return b"\x89PNG\r\n\x1a\n" + png_chunk(b"IHDR", ihdr) + png_chunk(b"IDAT", b"")
+
+
+@pytest.fixture
+def client(monkeypatch, prediction_service):
+    prediction_service.binary_model.predict.side_effect = lambda batch: np.full((len(batch), 1), 0.7)
+    registry = SimpleNamespace(is_ready=True, lease=lambda: nullcontext(prediction_service))
+    monkeypatch.setattr(prediction_routes, "get_model_registry", lambda: registry)
+
+    app = FastAPI()
+    app.include_router(prediction_routes.router)
+    return TestClient(app)
+
+
+def test_validator_rejects_oversized_uploads_on_the_first_chunk_past_the_limit():
+    validator = ImageUploadValidator(max_bytes=100, max_pixels=10_000, allowed_formats=["PNG"])
+    validator.feed(png_header(10, 10))
+
+    with pytest.raises(HTTPException) as exc_info:
+        validator.feed(b"\x00" * 100)
+
+    assert exc_info.value.status_code == 413
+
+
+def test_validator_rejects_non_images_from_their_magic_bytes():
+    validator = ImageUploadValidator(max_bytes=1000, max_pixels=10_000, allowed_formats=["JPEG", "PNG"])
+
+    with pytest.raises(HTTPException) as exc_info:
+        validator.feed(b"%PDF-1.7 not an image")
+
+    assert exc_info.value.status_code == 415
+
+
+def test_validator_rejects_too_many_pixels_as_soon_as_the_header_arrived():
+    validator = ImageUploadValidator(max_bytes=10**9, max_pixels=10_000, allowed_formats=["PNG"])
+
+    with pytest.raises(HTTPException) as exc_info:
+        validator.feed(png_header(50_000, 50_000))
+
+    assert exc_info.value.status_code == 413
+
+
+def test_validate_image_returns_a_view_of_the_given_buffer(valid_image_file):
+    image_data = valid_image_file.file.read()
+
+    view = validate_image(image_data)
+
+    assert view.obj is image_data
+
+
+def test_prediction_route_accepts_multipart_uploads(client, valid_image_file):
+    response = client.post(
+        "/predictions/binary",
+        files={"image_file": ("image.jpg", valid_image_file.file.read(), "image/jpeg")}
+    )
+
+    assert response.status_code == 200
+    assert response.json()["predictions"] == pytest.approx([0.7])
+    assert REGISTRY.get_sample_value(
+        "prediction_stage_duration_seconds_count", {"stage": "upload_read", "model": "binary", "endpoint": "binary"}
+    ) >= 1
+
+
+def test_prediction_route_accepts_raw_image_bodies(client, valid_image_file):
+    response = client.post(
+        "/predictions/binary",
+        content=valid_image_file.file.read(),
+        headers={"Content-Type": "image/jpeg"}
+    )
+
+    assert response.status_code == 200
+
+
+def test_prediction_route_rejects_non_images_with_415(client):
+    response = client.post(
+        "/predictions/binary",
+        files={"image_file": ("image.jpg", b"definitely not an image", "image/jpeg")}
+    )
+
+    assert response.status_code == 415
+
+
+def test_prediction_route_rejects_oversized_uploads_from_content_length(client, monkeypatch):
+    monkeypatch.setattr(prediction_routes.settings, "upload_max_bytes", 1024)
+    content = io.BytesIO()
+    Image.effect_noise((200, 200), 64).convert("RGB").save(content, format="PNG")
+
+    response = client.post(
+        "/predictions/binary",
+        content=content.getvalue() * 10,
+        headers={"Content-Type": "image/png"}
+    )
+
+    assert response.status_code == 413
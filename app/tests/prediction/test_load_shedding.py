@@ -0,0 +1,90 @@
+import asyncio
+import time
+
+import numpy as np
+import pytest
+from fastapi import HTTPException
+from prometheus_client import REGISTRY
+
+from app.services import deadline_service
+from app.services import prediction_service as prediction_service_module
+from app.services.deadline_service import RequestDeadline, parse_deadline
+
+
+def shed_count(priority, reason):
+    return REGISTRY.get_sample_value(
+        "prediction_shed_total", {"model": "binary", "priority": priority, "reason": reason}
+    ) or 0.0
+
+
+def test_client_deadlines_are_capped_and_default_to_the_configured_timeout(monkeypatch):
+    monkeypatch.setattr(deadline_service.settings, "prediction_default_timeout_ms", 500)
+    monkeypatch.setattr(deadline_service.settings, "prediction_max_timeout_ms", 1000)
+
+    assert parse_deadline(None, None).remaining() == pytest.approx(0.5, abs=0.05)
+    assert parse_deadline("5000", "LOW").remaining() == pytest.approx(1.0, abs=0.05)
+    assert parse_deadline("5000", "LOW").priority == "low"
+    assert parse_deadline(None, None, apply_default=False).remaining() is None
+
+
+@pytest.mark.parametrize("timeout_ms, priority", [("-1", None), ("soon", None), ("100", "urgent")])
+def test_invalid_deadline_headers_are_rejected(timeout_ms, priority):
+    with pytest.raises(HTTPException) as exc_info:
+        parse_deadline(timeout_ms, priority)
+
+    assert exc_info.value.status_code == 400
+
+
+def test_low_priority_requests_are_shed_first(monkeypatch, prediction_service, valid_image_file):
+    monkeypatch.setattr(prediction_service_module.settings, "prediction_shed_queue_depth", 4)
+    monkeypatch.setattr(prediction_service_module.settings, "prediction_shed_low_priority_fraction", 0.5)
+    prediction_service.binary_model.predict.side_effect = lambda batch: np.full((len(batch), 1), 0.5)
+    image_data = valid_image_file.file.read()
+    before = shed_count("low", "queue_depth")
+
+    async def scenario():
+        batcher = prediction_service.binary_batcher
+        batcher.start()
+        # Three inputs waiting for the model, under the normal limit but over the low priority one
+        for _ in range(3):
+            batcher._queue.put_nowait(object())
+        try:
+            with pytest.raises(HTTPException) as exc_info:
+                await prediction_service.predict_binary(image_data, deadline=RequestDeadline(None, "low"))
+            assert prediction_service._admit("binary", RequestDeadline(None, "normal")) is None
+            return exc_info.value
+        finally:
+            while not batcher._queue.empty():
+                batcher._queue.get_nowait()
+            await batcher.stop()
+
+    error = asyncio.run(scenario())
+
+    assert error.status_code == 503
+    assert shed_count("low", "queue_depth") == before + 1
+    prediction_service.binary_model.predict.assert_not_called()
+
+
+def test_requests_that_would_miss_their_deadline_are_shed_whatever_their_priority(prediction_service):
+    prediction_service.binary_batcher._forward_duration = 0.5
+    before = shed_count("high", "deadline")
+
+    with pytest.raises(HTTPException) as exc_info:
+        prediction_service._admit("binary", RequestDeadline(0.1, "high"))
+
+    assert exc_info.value.status_code == 503
+    assert shed_count("high", "deadline") == before + 1
+
+
+def test_expired_deadlines_skip_decoding_and_inference(prediction_service, valid_image_file):
+    deadline = RequestDeadline(0.001)
+    time.sleep(0.01)
+
+    with pytest.raises(HTTPException) as exc_info:
+        asyncio.run(prediction_service.predict_binary(valid_image_file.file.read(), deadline=deadline))
+
+    assert exc_info.value.status_code == 504
+    assert REGISTRY.get_sample_value(
+        "prediction_deadline_exceeded_total", {"model": "binary", "stage": "admission"}
+    ) >= 1
+    prediction_service.binary_model.predict.assert_not_called()
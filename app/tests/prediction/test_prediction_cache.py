@@ -0,0 +1,120 @@
+import asyncio
+import time
+
+import numpy as np
+import pytest
+from fastapi import HTTPException
+
+from app.services import prediction_service as prediction_service_module
+from app.services.prediction_cache import PredictionCache, InMemorySharedCacheBackend, SharedCacheBackend
+
+
+def make_cache(**overrides):
+    options = dict(max_entries=100, max_bytes=1024 * 1024, ttl_seconds=60)
+    options.update(overrides)
+    return PredictionCache(**options)
+
+
+def test_same_bytes_and_model_give_the_same_key_and_different_models_do_not():
+    assert PredictionCache.key(b"image", "binary:a") == PredictionCache.key(b"image", "binary:a")
+    assert PredictionCache.key(b"image", "binary:a") != PredictionCache.key(b"image", "multiclass:a")
+    assert PredictionCache.key(b"image", "binary:a") != PredictionCache.key(b"other", "binary:a")
+
+
+def test_least_recently_used_entry_is_evicted_when_entry_limit_is_reached():
+    cache = make_cache(max_entries=2)
+    asyncio.run(cache.put("a", np.array([0.1])))
+    asyncio.run(cache.put("b", np.array([0.2])))
+    asyncio.run(cache.get("a", "binary"))
+
+    asyncio.run(cache.put("c", np.array([0.3])))
+
+    assert asyncio.run(cache.get("a", "binary")) is not None
+    assert asyncio.run(cache.get("b", "binary")) is None
+    assert asyncio.run(cache.get("c", "binary")) is not None
+
+
+def test_entries_are_evicted_when_byte_limit_is_reached():
+    cache = make_cache(max_bytes=2 * (13 * 4 + 1))
+    for key in ("a", "b", "c"):
+        asyncio.run(cache.put(key, np.zeros(13)))
+
+    assert len(cache) == 2
+    assert cache.size_bytes <= cache.max_bytes
+
+
+def test_expired_entries_are_not_returned():
+    cache = make_cache(ttl_seconds=0.01)
+    asyncio.run(cache.put("a", np.array([0.1])))
+
+    time.sleep(0.02)
+
+    assert asyncio.run(cache.get("a", "binary")) is None
+    assert len(cache) == 0
+
+
+def test_shared_backend_is_consulted_after_a_local_miss():
+    shared_backend = InMemorySharedCacheBackend()
+    asyncio.run(make_cache(shared_backend=shared_backend).put("a", np.array([0.25, 0.75])))
+    other_process_cache = make_cache(shared_backend=shared_backend)
+
+    prediction = asyncio.run(other_process_cache.get("a", "binary"))
+
+    np.testing.assert_allclose(prediction, [0.25, 0.75])
+    assert len(other_process_cache) == 1
+
+
+def test_shared_backends_without_a_setter_cannot_be_created():
+    class ReadOnlyBackend(SharedCacheBackend):
+        async def get(self, key):
+            return None
+
+    with pytest.raises(TypeError):
+        ReadOnlyBackend()
+
+
+def test_unavailable_shared_backend_is_a_miss():
+    class UnavailableBackend(SharedCacheBackend):
+        async def get(self, key):
+            raise ConnectionError("backend is down")
+
+        async def set(self, key, value, ttl_seconds):
+            raise ConnectionError("backend is down")
+
+    cache = make_cache(shared_backend=UnavailableBackend())
+    asyncio.run(cache.put("a", np.array([0.5])))
+    cache._entries.clear()
+
+    assert asyncio.run(cache.get("a", "binary")) is None
+
+
+def test_cached_predictions_are_served_when_the_service_is_overloaded(
+        monkeypatch, prediction_service, valid_image_file
+):
+    image_data = valid_image_file.file.read()
+    prediction_service.binary_model.predict.side_effect = lambda batch: np.full((len(batch), 1), 0.7)
+    asyncio.run(prediction_service.predict_binary(image_data))
+    monkeypatch.setattr(prediction_service_module.settings, "prediction_max_in_flight", 0)
+
+    prediction, _ = asyncio.run(prediction_service.predict_binary(image_data))
+
+    assert float(prediction[0]) == pytest.approx(0.7)
+    with pytest.raises(HTTPException) as exc_info:
+        asyncio.run(prediction_service.predict_binary(image_data + b"\0"))
+    assert exc_info.value.status_code == 503
+
+
+def test_identical_uploads_are_predicted_once(prediction_service, valid_image_file):
+    image_data = valid_image_file.file.read()
+    prediction_service.binary_model.predict.side_effect = lambda batch: np.full((len(batch), 1), 0.7)
+
+    async def predict_twice():
+        first = await prediction_service.predict_binary(image_data)
+        second = await prediction_service.predict_binary(image_data)
+        return first, second
+
+    first, second = asyncio.run(predict_twice())
+
+    assert prediction_service.binary_model.predict.call_count == 1
+    np.testing.assert_allclose(first[0], second[0])
+    assert first[1] == second[1] == "binary-v1"
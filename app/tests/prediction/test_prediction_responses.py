@@ -0,0 +1,74 @@
+import json
+from contextlib import nullcontext
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.mappers import prediction_mapper
+from app.mappers.prediction_mapper import top_k_scores
+from app.routes import prediction_routes
+from app.services.serialization_service import dumps_json
+
+
+@pytest.fixture
+def client(monkeypatch, prediction_service):
+    scores = np.array([0.05, 0.6, 0.1, 0.25], dtype=np.float32)
+    prediction_service.multiclass_model.predict.side_effect = lambda batch: np.tile(scores, (len(batch), 1))
+    registry = SimpleNamespace(is_ready=True, lease=lambda: nullcontext(prediction_service))
+    monkeypatch.setattr(prediction_routes, "get_model_registry", lambda: registry)
+
+    app = FastAPI()
+    app.include_router(prediction_routes.router)
+    return TestClient(app)
+
+
+def test_numpy_arrays_and_scalars_are_serialized_natively():
+    predictions = np.array([[0.25, 0.5], [0.75, 1.0]], dtype=np.float32)
+
+    content = json.loads(dumps_json({
+        "row": predictions[0],
+        "column": predictions[:, 1],
+        "score": np.float32(0.5),
+        "count": np.int64(3),
+    }))
+
+    assert content == {"row": [0.25, 0.5], "column": [0.5, 1.0], "score": 0.5, "count": 3}
+
+
+def test_top_k_scores_are_sorted_and_labelled(monkeypatch):
+    monkeypatch.setattr(prediction_mapper.settings, "multiclass_class_labels", ["badger", "fox", "boar"])
+    predictions = np.array([0.05, 0.6, 0.1, 0.25], dtype=np.float32)
+
+    top_k = top_k_scores(predictions, 3)
+
+    assert [item["label"] for item in top_k] == ["fox", "3", "boar"]
+    assert [item["score"] for item in top_k] == pytest.approx([0.6, 0.25, 0.1])
+    assert len(top_k_scores(predictions, 10)) == 4
+
+
+def test_multiclass_route_returns_every_probability_by_default(client, valid_image_file):
+    response = client.post(
+        "/predictions/multiclass",
+        files={"image_file": ("image.jpg", valid_image_file.file.read(), "image/jpeg")}
+    )
+
+    assert response.status_code == 200
+    assert response.json() == {
+        "predictions": pytest.approx([0.05, 0.6, 0.1, 0.25]),
+        "model_version": "multiclass-v1",
+    }
+
+
+def test_multiclass_route_returns_only_the_top_k_classes_when_asked(client, valid_image_file):
+    response = client.post(
+        "/predictions/multiclass",
+        params={"top_k": 2},
+        files={"image_file": ("image.jpg", valid_image_file.file.read(), "image/jpeg")}
+    )
+
+    assert response.status_code == 200
+    assert "predictions" not in response.json()
+    assert [item["label"] for item in response.json()["top_k"]] == ["1", "3"]
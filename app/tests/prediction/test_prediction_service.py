@@ -1,7 +1,12 @@
+import asyncio
+
 import numpy
 import pytest
+from PIL import Image
+from fastapi import HTTPException
+from prometheus_client import REGISTRY
 
-from app.services.prediction_service import prepare_input_tensor
+from app.services.prediction_service import prepare_input_tensor, settings
 
 
 def test_check_image_for_footprint_throws_exception_when_image_is_invalid(
@@ -19,19 +24,91 @@ def test_classify_image_throws_exception_when_image_is_invalid(
         prediction_service.classify_image(invalid_image_file)
 
 def test_prepare_input_tensor_transforms_valid_image_to_a_vector_of_expected_shape(
+        valid_image_file
+):
+    expected_shape = (1, 224, 224, 3)
+
+    input_tensor = prepare_input_tensor(valid_image_file.file.read(), (224, 224))
+
+    assert input_tensor.shape == expected_shape
+    assert input_tensor.dtype == numpy.float32
+
+
+def test_prepare_input_tensor_downscales_jpeg_while_decoding(
         mocker,
+        large_jpeg_image_file
+):
+    spy_resize = mocker.spy(Image.Image, "resize")
+
+    input_tensor = prepare_input_tensor(large_jpeg_image_file.file.read(), (224, 224))
+
+    assert input_tensor.shape == (1, 224, 224, 3)
+    # The decoder already reduced the image, only the final resize works on a downscaled image
+    resized_from = spy_resize.call_args.args[0].size
+    assert resized_from[0] < 2000 and resized_from[1] < 1500
+
+
+def test_prepare_input_tensor_writes_into_the_given_buffer(valid_image_file):
+    buffer = numpy.zeros((1, 64, 32, 3), dtype=numpy.float32)
+
+    input_tensor = prepare_input_tensor(valid_image_file.file.read(), (32, 64), out=buffer)
+
+    assert input_tensor is buffer
+    assert numpy.all(buffer == 255)
+
+
+def test_predict_binary_rejects_with_503_when_in_flight_limit_is_reached(
+        prediction_service,
+        valid_image_file
+):
+    prediction_service._in_flight = settings.prediction_max_in_flight
+
+    with pytest.raises(HTTPException) as exc_info:
+        asyncio.run(prediction_service.predict_binary(valid_image_file.file.read()))
+
+    assert exc_info.value.status_code == 503
+    assert exc_info.value.headers["Retry-After"] == str(settings.prediction_retry_after_seconds)
+    prediction_service.binary_model.predict.assert_not_called()
+
+
+def test_predict_cascade_skips_multiclass_classifier_for_non_footprint_images(
+        prediction_service,
+        valid_image_file
+):
+    prediction_service.binary_model.predict.side_effect = lambda batch: numpy.full((len(batch), 1), 0.1)
+
+    footprint_probability, predictions, model_versions = asyncio.run(prediction_service.predict_cascade(valid_image_file.file.read()))
+
+    assert footprint_probability == pytest.approx(0.1)
+    assert predictions is None
+    assert model_versions == {"binary": "binary-v1"}
+    prediction_service.multiclass_model.predict.assert_not_called()
+
+
+def test_predict_cascade_classifies_footprint_images(
+        prediction_service,
         valid_image_file
 ):
+    prediction_service.binary_model.predict.side_effect = lambda batch: numpy.full((len(batch), 1), 0.9)
+    prediction_service.multiclass_model.predict.side_effect = lambda batch: numpy.full((len(batch), 13), 1 / 13)
+
+    footprint_probability, predictions, model_versions = asyncio.run(prediction_service.predict_cascade(valid_image_file.file.read()))
 
-    expected_shape_before_expansion = (100, 100, 3)
-    expected_shape_after_expansion = (1, 100, 100, 3)
+    assert footprint_probability == pytest.approx(0.9)
+    assert predictions.shape == (13,)
+    assert model_versions == {"binary": "binary-v1", "multiclass": "multiclass-v1"}
 
-    spy_numpy_conversion = mocker.spy(numpy, "array")
-    spy_numpy_expansion = mocker.spy(numpy, "expand_dims")
 
-    prepare_input_tensor(valid_image_file)
+def test_prediction_stages_are_timed_per_model_and_endpoint(
+        prediction_service,
+        valid_image_file
+):
+    prediction_service.binary_model.predict.side_effect = lambda batch: numpy.full((len(batch), 1), 0.5)
+    labels = {"model": "binary", "endpoint": "stage_test"}
+
+    asyncio.run(prediction_service.predict_binary(valid_image_file.file.read(), endpoint="stage_test"))
 
-    assert spy_numpy_conversion.spy_return.shape == expected_shape_before_expansion
-    assert spy_numpy_conversion.call_count == 1
-    assert spy_numpy_expansion.spy_return.shape == expected_shape_after_expansion
-    assert spy_numpy_expansion.call_count == 1
\ No newline at end of file
+    for stage in ("decode", "resize", "queue_wait", "forward"):
+        assert REGISTRY.get_sample_value(
+            "prediction_stage_duration_seconds_count", {"stage": stage, **labels}
+        ) == 1
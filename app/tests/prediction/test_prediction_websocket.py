@@ -0,0 +1,67 @@
+import base64
+from contextlib import nullcontext
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.routes import prediction_routes
+from app.routes.prediction_routes import WS_FRAME_HEADER
+
+
+@pytest.fixture
+def client(monkeypatch, prediction_service):
+    prediction_service.binary_model.predict.side_effect = lambda batch: np.full((len(batch), 1), 0.6)
+    registry = SimpleNamespace(is_ready=True, lease=lambda: nullcontext(prediction_service))
+    monkeypatch.setattr(prediction_routes, "get_model_registry", lambda: registry)
+    monkeypatch.setattr(prediction_routes.settings, "wildlens_prediction_api_key", "test-key")
+
+    app = FastAPI()
+    app.include_router(prediction_routes.router)
+    return TestClient(app)
+
+
+def connect(client):
+    return client.websocket_connect("/predictions/ws", headers={"Authorization": "Key test-key"})
+
+
+def test_binary_frames_are_pipelined_and_answered_by_request_id(client, valid_image_file):
+    image_data = valid_image_file.file.read()
+
+    with connect(client) as websocket:
+        for request_id in (7, 8, 9):
+            websocket.send_bytes(WS_FRAME_HEADER.pack(request_id) + image_data)
+        responses = [websocket.receive_json() for _ in range(3)]
+
+    assert sorted(response["id"] for response in responses) == [7, 8, 9]
+    for response in responses:
+        assert response["predictions"] == pytest.approx([0.6])
+
+
+def test_binary_frame_errors_are_reported_for_their_request_id(client):
+    with connect(client) as websocket:
+        websocket.send_bytes(WS_FRAME_HEADER.pack(3) + b"not an image")
+        response = websocket.receive_json()
+
+    assert response["id"] == 3
+    assert "error" in response
+
+
+def test_json_frames_are_still_supported(client, valid_image_file):
+    data = base64.b64encode(valid_image_file.file.read()).decode()
+
+    with connect(client) as websocket:
+        websocket.send_json({"filename": "image.jpg", "data": data})
+        response = websocket.receive_json()
+
+    assert response["predictions"] == pytest.approx([0.6])
+
+
+@pytest.mark.parametrize("authorization", ["Key wrong-key", "Key test-key-and-more", "test-key"])
+def test_connections_with_an_invalid_api_key_are_refused(client, authorization):
+    with client.websocket_connect("/predictions/ws", headers={"Authorization": authorization}) as websocket:
+        response = websocket.receive_json()
+
+    assert response == {"error": "Invalid API Key"}
@@ -0,0 +1,107 @@
+import asyncio
+from unittest.mock import Mock
+
+import numpy as np
+import pytest
+
+from app.services import model_registry as model_registry_module
+from app.services.model_registry import ModelRegistry
+
+
+def file_loader(default_path):
+    def load(model_path=None):
+        path = model_path or default_path
+        with open(path) as model_file:
+            version = model_file.read()
+        model = Mock(input_shape=(None, 32, 32, 3), version=version, source_path=path)
+        model.predict.side_effect = lambda batch: np.full((len(batch), 1), 0.5)
+        return model
+    return load
+
+
+@pytest.fixture
+def model_files(tmp_path):
+    binary_path = tmp_path / "binary.keras"
+    multiclass_path = tmp_path / "multiclass.keras"
+    binary_path.write_text("b1")
+    multiclass_path.write_text("m1")
+    return binary_path, multiclass_path
+
+
+@pytest.fixture
+def registry(model_files):
+    binary_path, multiclass_path = model_files
+    return ModelRegistry(
+        binary_loader=file_loader(str(binary_path)),
+        multiclass_loader=file_loader(str(multiclass_path))
+    )
+
+
+def test_reload_swaps_models_while_in_flight_requests_finish_on_the_previous_version(registry, model_files):
+    binary_path, _ = model_files
+
+    async def scenario():
+        await registry.load()
+        with registry.lease() as previous_service:
+            binary_path.write_text("b2")
+            versions = await registry.reload(["binary"])
+            await asyncio.sleep(0.1)
+            # Still leased, the previous version keeps running
+            assert previous_service.binary_batcher.is_running
+            assert registry.prediction_service is not previous_service
+        await asyncio.sleep(0.2)
+        stopped = not previous_service.binary_batcher.is_running
+        await registry.close()
+        return versions, stopped
+
+    versions, stopped = asyncio.run(scenario())
+
+    assert versions == {"binary": "b2", "multiclass": "m1"}
+    assert stopped
+
+
+def test_reload_keeps_the_models_that_did_not_change_and_the_cache(registry):
+    async def scenario():
+        await registry.load()
+        previous_service = registry.prediction_service
+        await registry.reload(["binary"])
+        service = registry.prediction_service
+        await registry.close()
+        return previous_service, service
+
+    previous_service, service = asyncio.run(scenario())
+
+    assert service.multiclass_model is previous_service.multiclass_model
+    assert service.binary_model is not previous_service.binary_model
+    assert service.cache is previous_service.cache
+
+
+def test_failed_reload_keeps_serving_the_previous_version(registry, tmp_path):
+    async def scenario():
+        await registry.load()
+        with pytest.raises(FileNotFoundError):
+            await registry.reload(model_paths={"binary": str(tmp_path / "missing.keras")})
+        versions = registry.prediction_service.model_versions
+        await registry.close()
+        return versions
+
+    assert asyncio.run(scenario()) == {"binary": "b1", "multiclass": "m1"}
+    assert registry.model_paths["binary"] is None
+
+
+def test_changed_model_files_are_reloaded_once_they_are_stable(registry, model_files, monkeypatch):
+    monkeypatch.setattr(model_registry_module.settings, "model_watch_interval_seconds", 0.02)
+    _, multiclass_path = model_files
+
+    async def scenario():
+        await registry.load()
+        multiclass_path.write_text("m2-longer")
+        for _ in range(100):
+            await asyncio.sleep(0.02)
+            if registry.prediction_service.multiclass_model_version == "m2-longer":
+                break
+        versions = registry.prediction_service.model_versions
+        await registry.close()
+        return versions
+
+    assert asyncio.run(scenario()) == {"binary": "b1", "multiclass": "m2-longer"}
@@ -0,0 +1,83 @@
+import logging
+import os
+from functools import partial
+
+import pytest
+
+from app import main
+from app.services import prometeus_metrics_service
+
+
+@pytest.fixture
+def metrics_directory(monkeypatch, tmp_path):
+    directory = tmp_path / "prometheus"
+    monkeypatch.setenv("PROMETHEUS_MULTIPROC_DIR", str(directory))
+    return directory
+
+
+@pytest.fixture
+def uvicorn_calls(monkeypatch, metrics_directory):
+    calls = []
+    monkeypatch.setattr(main.uvicorn, "run", lambda app, **options: calls.append((app, options)))
+    return calls
+
+
+def test_several_workers_import_the_application_in_every_process(monkeypatch, uvicorn_calls, caplog):
+    monkeypatch.setattr(main.settings, "app_workers", 3)
+    monkeypatch.setattr(main.settings, "prediction_model_backend", "keras")
+
+    with caplog.at_level(logging.WARNING):
+        main.run()
+
+    app, options = uvicorn_calls[0]
+    assert app == "app.main:app"
+    assert options["workers"] == 3
+    assert "own copy of the model weights" in caplog.text
+
+
+def test_workers_sharing_memory_mapped_tflite_weights_are_not_warned(monkeypatch, uvicorn_calls, caplog):
+    monkeypatch.setattr(main.settings, "app_workers", 2)
+    monkeypatch.setattr(main.settings, "prediction_model_backend", "tflite")
+    monkeypatch.setattr(main.settings, "prediction_tflite_shared_weights", True)
+
+    with caplog.at_level(logging.WARNING):
+        main.run()
+
+    assert uvicorn_calls[0][1]["workers"] == 2
+    assert "own copy of the model weights" not in caplog.text
+
+
+def test_a_single_worker_serves_the_imported_application(monkeypatch, uvicorn_calls):
+    monkeypatch.setattr(main.settings, "app_workers", 1)
+
+    main.run()
+
+    assert uvicorn_calls[0][0] is main.app
+    assert "workers" not in uvicorn_calls[0][1]
+
+
+def test_workers_aggregate_their_metrics_in_a_fresh_directory(monkeypatch, uvicorn_calls, metrics_directory):
+    monkeypatch.setattr(main.settings, "app_workers", 2)
+    metrics_directory.mkdir()
+    (metrics_directory / "counter_1234.db").write_bytes(b"stale")
+
+    main.run()
+
+    assert os.environ["PROMETHEUS_MULTIPROC_DIR"] == str(metrics_directory)
+    assert metrics_directory.is_dir()
+    assert list(metrics_directory.iterdir()) == []
+
+
+def test_workers_aggregate_their_metrics_by_default(monkeypatch, uvicorn_calls, tmp_path):
+    monkeypatch.setattr(main.settings, "app_workers", 2)
+    monkeypatch.delenv("PROMETHEUS_MULTIPROC_DIR")
+    default_directory = tmp_path / "default"
+    monkeypatch.setattr(
+        main, "prepare_multiprocess_directory",
+        partial(prometeus_metrics_service.prepare_multiprocess_directory, str(default_directory))
+    )
+
+    main.run()
+
+    assert os.environ["PROMETHEUS_MULTIPROC_DIR"] == str(default_directory)
+    assert default_directory.is_dir()
@@ -0,0 +1,62 @@
+import numpy as np
+import pytest
+
+from app.services.embedding_index import EmbeddingIndex
+
+
+def clustered_embeddings(count: int, dimension: int = 16, clusters: int = 8, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dimension))
+    return centers[rng.integers(0, clusters, count)] + 0.3 * rng.normal(size=(count, dimension))
+
+
+def references(count: int) -> list[dict]:
+    return [{"reference": f"image_{row}.jpg", "label": None} for row in range(count)]
+
+
+def test_exact_search_returns_the_most_similar_references_first(tmp_path):
+    embeddings = clustered_embeddings(200)
+    EmbeddingIndex.build(str(tmp_path), embeddings, references(200), "m1")
+    index = EmbeddingIndex(str(tmp_path))
+
+    matches = index.search(embeddings[42] * 3.0, k=5)
+
+    assert not index.is_approximate
+    assert matches[0]["reference"] == "image_42.jpg"
+    assert matches[0]["score"] == pytest.approx(1.0, abs=1e-3)
+    assert [match["score"] for match in matches] == sorted((match["score"] for match in matches), reverse=True)
+
+
+def test_vectors_are_memory_mapped_as_float16(tmp_path):
+    EmbeddingIndex.build(str(tmp_path), clustered_embeddings(10), references(10), "m1")
+    index = EmbeddingIndex(str(tmp_path))
+
+    assert isinstance(index.vectors, np.memmap)
+    assert index.vectors.dtype == np.float16
+    assert index.model_version == "m1"
+    assert len(index.search(np.ones(16), k=50)) == 10
+
+
+@pytest.mark.parametrize("pq_subspaces", [0, 4])
+def test_approximate_search_finds_the_exact_neighbours(tmp_path, pq_subspaces):
+    embeddings = clustered_embeddings(2000)
+    EmbeddingIndex.build(str(tmp_path / "exact"), embeddings, references(2000), "m1")
+    EmbeddingIndex.build(
+        str(tmp_path / "ivf"), embeddings, references(2000), "m1", ivf_lists=16, pq_subspaces=pq_subspaces
+    )
+    exact, approximate = EmbeddingIndex(str(tmp_path / "exact")), EmbeddingIndex(str(tmp_path / "ivf"))
+
+    queries = clustered_embeddings(20, seed=1)
+    recall = np.mean([
+        len({match["reference"] for match in exact.search(query, k=10)}
+            & {match["reference"] for match in approximate.search(query, k=10, probes=4, rerank=100)}) / 10
+        for query in queries
+    ])
+
+    assert approximate.is_approximate
+    assert recall >= 0.9
+
+
+def test_product_quantization_needs_a_divisible_embedding_size(tmp_path):
+    with pytest.raises(ValueError):
+        EmbeddingIndex.build(str(tmp_path), clustered_embeddings(300), references(300), "m1", ivf_lists=4, pq_subspaces=5)
@@ -0,0 +1,117 @@
+import asyncio
+import io
+from contextlib import nullcontext
+from types import SimpleNamespace
+from unittest.mock import Mock
+
+import numpy as np
+import pytest
+from PIL import Image
+from fastapi import FastAPI, HTTPException
+from fastapi.testclient import TestClient
+
+from app.routes import prediction_routes
+from app.services import model_registry as model_registry_module
+from app.services.embedding_index import EmbeddingIndex
+from app.services.model_registry import ModelRegistry
+from app.services.prediction_service import PredictionService
+
+
+@pytest.fixture
+def image_bytes():
+    content = io.BytesIO()
+    Image.new("RGB", (100, 100), color="white").save(content, format="JPEG")
+    return content.getvalue()
+
+
+@pytest.fixture
+def embedding_index(tmp_path):
+    # One reference embedding per axis
+    EmbeddingIndex.build(
+        str(tmp_path),
+        np.eye(4),
+        [{"reference": f"Renard_{row}.jpg", "label": "Renard"} for row in range(4)],
+        "multiclass-v1"
+    )
+    return EmbeddingIndex(str(tmp_path))
+
+
+def embedder():
+    model = Mock(input_shape=(None, 224, 224, 3), version="multiclass-v1")
+    model.predict.side_effect = lambda batch: np.tile([0.1, 0.9, 0.2, 0.0], (len(batch), 1))
+    return model
+
+
+def similar_service(embedding_index, multiclass_version="multiclass-v1"):
+    return PredictionService(
+        binary_model=Mock(input_shape=(None, 224, 224, 3), version="binary-v1"),
+        multiclass_model=Mock(input_shape=(None, 224, 224, 3), version=multiclass_version),
+        embedder=embedder(),
+        embedding_index=embedding_index
+    )
+
+
+def route_client(monkeypatch, prediction_service):
+    registry = SimpleNamespace(is_ready=True, lease=lambda: nullcontext(prediction_service))
+    monkeypatch.setattr(prediction_routes, "get_model_registry", lambda: registry)
+    app = FastAPI()
+    app.include_router(prediction_routes.router)
+    return TestClient(app)
+
+
+def test_similar_route_returns_the_closest_references(monkeypatch, embedding_index, image_bytes):
+    client = route_client(monkeypatch, similar_service(embedding_index))
+
+    response = client.post(
+        "/predictions/similar",
+        params={"k": 2},
+        files={"image_file": ("image.jpg", image_bytes, "image/jpeg")}
+    )
+
+    assert response.status_code == 200
+    content = response.json()
+    assert [match["reference"] for match in content["matches"]] == ["Renard_1.jpg", "Renard_2.jpg"]
+    assert content["matches"][0]["label"] == "Renard"
+    assert content["model_version"] == "multiclass-v1"
+    assert content["approximate"] is False
+
+
+def test_index_of_another_model_version_is_not_searched(embedding_index, image_bytes):
+    service = similar_service(embedding_index, multiclass_version="multiclass-v2")
+
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(service.find_similar(image_bytes, k=2))
+
+    assert error.value.status_code == 503
+    service.embedder.predict.assert_not_called()
+
+
+def test_similar_route_is_unavailable_without_an_index(monkeypatch, image_bytes):
+    client = route_client(monkeypatch, similar_service(None))
+
+    response = client.post(
+        "/predictions/similar",
+        files={"image_file": ("image.jpg", image_bytes, "image/jpeg")}
+    )
+
+    assert response.status_code == 503
+
+
+def test_registry_embeds_with_the_loaded_multiclass_model(monkeypatch, embedding_index):
+    monkeypatch.setattr(model_registry_module.settings, "embedding_index_path", embedding_index.directory)
+    monkeypatch.setattr(model_registry_module.settings, "model_watch_interval_seconds", 0)
+
+    def loader(model_path=None):
+        return Mock(input_shape=(None, 32, 32, 3), version="multiclass-v1", source_path=None)
+
+    registry = ModelRegistry(binary_loader=loader, multiclass_loader=loader, embedder_factory=lambda model: embedder())
+
+    async def scenario():
+        await registry.load()
+        service = registry.prediction_service
+        loaded = service.embedder is not None and service.embedding_index is registry.embedding_index
+        await registry.close()
+        return loaded
+
+    assert asyncio.run(scenario())
+    assert len(registry.embedding_index) == 4
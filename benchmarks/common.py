@@ -0,0 +1,76 @@
+import json
+import os
+import pathlib
+import platform
+import subprocess
+import time
+from typing import Callable
+
+import numpy as np
+
+PROJECT_ROOT = pathlib.Path(__file__).resolve().parent.parent
+SAMPLE_IMAGES_DIR = PROJECT_ROOT / "prediction_models"
+
+
+def configure_environment():
+    # Benchmarks run with the testing settings profile, which needs no real key or model files
+    os.environ.setdefault("ENVIRONMENT", "testing")
+    os.environ.setdefault("WILDLENS_PREDICTION_API_KEY", "benchmark-key")
+    # The routes are measured on their own, without job workers polling a queue database
+    os.environ.setdefault("JOBS_ENABLED", "false")
+
+
+def sample_image_paths() -> list[pathlib.Path]:
+    return sorted(SAMPLE_IMAGES_DIR.glob("*.jpg"))
+
+
+def summarize_latencies(latencies_seconds, elapsed_seconds: float, items_per_call: int = 1) -> dict:
+    latencies_ms = np.asarray(latencies_seconds) * 1000
+    return {
+        "calls": len(latencies_ms),
+        "throughput_per_second": len(latencies_ms) * items_per_call / elapsed_seconds,
+        "mean_ms": float(latencies_ms.mean()),
+        "p50_ms": float(np.percentile(latencies_ms, 50)),
+        "p95_ms": float(np.percentile(latencies_ms, 95)),
+        "p99_ms": float(np.percentile(latencies_ms, 99)),
+    }
+
+
+def time_calls(fn: Callable[[], object], repeat: int, warmup: int = 3, items_per_call: int = 1) -> dict:
+    for _ in range(warmup):
+        fn()
+
+    latencies = []
+    started = time.perf_counter()
+    for _ in range(repeat):
+        call_started = time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter() - call_started)
+    return summarize_latencies(latencies, time.perf_counter() - started, items_per_call)
+
+
+def _git_revision() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=PROJECT_ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def write_report(name: str, results: dict, output: str = None):
+    """
+    Prints the results as JSON, with enough context to compare runs of different builds.
+    """
+    report = {
+        "benchmark": name,
+        "revision": _git_revision(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "results": results,
+    }
+    content = json.dumps(report, indent=2)
+    if output:
+        pathlib.Path(output).write_text(content)
+    print(content)
@@ -0,0 +1,117 @@
+"""
+In-process load generator driving the full application (middlewares, routes, batching)
+with stand-in models, at a configurable concurrency.
+
+    python -m benchmarks.load_test --concurrency 16 --requests 500 --models numpy
+    python -m benchmarks.load_test --endpoints ws --concurrency 8 --models keras
+"""
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.common import configure_environment, sample_image_paths, summarize_latencies, write_report
+
+configure_environment()
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+from app.config import get_settings  # noqa: E402
+from app.main import create_app  # noqa: E402
+from app.routes.prediction_routes import WS_FRAME_HEADER  # noqa: E402
+from app.services.model_registry import get_model_registry  # noqa: E402
+from benchmarks.stand_in_models import stand_in_models  # noqa: E402
+
+settings = get_settings()
+AUTH_HEADERS = {"Authorization": f"Key {settings.wildlens_prediction_api_key}"}
+
+
+def wait_until_ready(client: TestClient, timeout_seconds: float = 120):
+    deadline = time.monotonic() + timeout_seconds
+    while client.get("/health/ready").status_code != 200:
+        if time.monotonic() > deadline:
+            raise TimeoutError("Models did not become ready")
+        time.sleep(0.1)
+
+
+def run_http(client: TestClient, path: str, images: list[bytes], requests: int, concurrency: int) -> dict:
+    def one_request(i: int) -> float:
+        started = time.perf_counter()
+        response = client.post(path, headers=AUTH_HEADERS, files={"image_file": ("image.jpg", images[i % len(images)])})
+        response.raise_for_status()
+        return time.perf_counter() - started
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        latencies = list(executor.map(one_request, range(requests)))
+    return summarize_latencies(latencies, time.perf_counter() - started)
+
+
+def run_websocket(client: TestClient, images: list[bytes], requests: int, concurrency: int) -> dict:
+    # One connection per client, each sending its frames one after the other
+    per_connection = max(1, requests // concurrency)
+
+    def one_connection(connection: int) -> list[float]:
+        latencies = []
+        with client.websocket_connect("/predictions/ws", headers=AUTH_HEADERS) as websocket:
+            for i in range(per_connection):
+                started = time.perf_counter()
+                websocket.send_bytes(WS_FRAME_HEADER.pack(i) + images[(connection + i) % len(images)])
+                response = websocket.receive_json()
+                if "error" in response:
+                    raise RuntimeError(response["error"])
+                latencies.append(time.perf_counter() - started)
+        return latencies
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        latencies = [latency for result in executor.map(one_connection, range(concurrency)) for latency in result]
+    return summarize_latencies(latencies, time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--endpoints", nargs="+", default=["binary", "multiclass", "ws"],
+                        choices=["binary", "multiclass", "cascade", "ws"])
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--models", choices=["numpy", "keras"], default="numpy",
+                        help="numpy stand-ins need no TensorFlow, keras ones run real forward passes")
+    parser.add_argument("--input-size", type=int, default=224)
+    parser.add_argument("--disable-cache", action="store_true",
+                        help="The sample images repeat, so the prediction cache would serve most requests")
+    parser.add_argument("--output", help="Also write the JSON report to this file")
+    args = parser.parse_args()
+
+    if args.disable_cache:
+        settings.prediction_cache_enabled = False
+
+    binary_model, multiclass_model = stand_in_models(args.models, args.input_size, settings.prediction_max_batch_size)
+    registry = get_model_registry()
+    registry.loaders = {"binary": lambda path: binary_model, "multiclass": lambda path: multiclass_model}
+    registry.configure = None
+
+    images = [path.read_bytes() for path in sample_image_paths()]
+
+    results = {}
+    with TestClient(create_app()) as client:
+        wait_until_ready(client)
+        for endpoint in args.endpoints:
+            if endpoint == "ws":
+                results[endpoint] = run_websocket(client, images, args.requests, args.concurrency)
+            else:
+                results[endpoint] = run_http(
+                    client, f"/predictions/{endpoint}", images, args.requests, args.concurrency
+                )
+
+    results["config"] = {
+        "models": args.models,
+        "concurrency": args.concurrency,
+        "max_batch_size": settings.prediction_max_batch_size,
+        "max_batch_wait_ms": settings.prediction_max_batch_wait_ms,
+        "cache_enabled": settings.prediction_cache_enabled,
+    }
+    write_report("load_test", results, args.output)
+
+
+if __name__ == "__main__":
+    main()
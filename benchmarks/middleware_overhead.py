@@ -0,0 +1,116 @@
+"""
+Measures the per-request overhead of the authentication and exception middlewares,
+comparing the former BaseHTTPMiddleware implementations with the pure ASGI ones.
+
+    python -m benchmarks.middleware_overhead --requests 2000 --upload-kb 512
+"""
+import argparse
+import asyncio
+import os
+import time
+
+from benchmarks.common import configure_environment, summarize_latencies, write_report
+
+configure_environment()
+
+import httpx  # noqa: E402
+from fastapi import FastAPI, HTTPException, UploadFile  # noqa: E402
+from starlette.middleware.base import BaseHTTPMiddleware  # noqa: E402
+from starlette.responses import JSONResponse  # noqa: E402
+
+from app.config import get_settings  # noqa: E402
+from app.middlewares.auth_middleware import AuthMiddleware  # noqa: E402
+from app.middlewares.exception_logging_middleware import ExceptionLoggingMiddleware  # noqa: E402
+from app.services.auth_service import extract_api_key  # noqa: E402
+
+settings = get_settings()
+
+
+class BaseHTTPAuthMiddleware(BaseHTTPMiddleware):
+    # Previous implementation, kept as the baseline
+    async def dispatch(self, request, call_next):
+        if request.url.path.startswith(tuple(settings.excluded_paths)):
+            return await call_next(request)
+        auth_header = request.headers.get("Authorization")
+        if not auth_header:
+            raise HTTPException(status_code=401, detail="API Key is required")
+        if extract_api_key(auth_header) != settings.wildlens_prediction_api_key:
+            raise HTTPException(status_code=401, detail="Invalid API Key")
+        return await call_next(request)
+
+
+class BaseHTTPExceptionLoggingMiddleware(BaseHTTPMiddleware):
+    # Previous implementation, kept as the baseline
+    async def dispatch(self, request, call_next):
+        try:
+            return await call_next(request)
+        except HTTPException as http_exc:
+            return JSONResponse(status_code=http_exc.status_code, content={"detail": http_exc.detail})
+        except Exception:
+            return JSONResponse(status_code=500, content={"detail": "An unexpected error occurred."})
+
+
+def create_benchmark_app(middlewares) -> FastAPI:
+    app = FastAPI()
+
+    @app.post("/predictions/upload")
+    async def upload(image_file: UploadFile):
+        return {"size": len(await image_file.read())}
+
+    for middleware in middlewares:
+        app.add_middleware(middleware)
+    return app
+
+
+async def measure(app: FastAPI, requests: int, concurrency: int, payload: bytes) -> dict:
+    latencies = []
+    semaphore = asyncio.Semaphore(concurrency)
+    headers = {"Authorization": f"Key {settings.wildlens_prediction_api_key}"}
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://benchmark") as client:
+        async def one_request():
+            async with semaphore:
+                started = time.perf_counter()
+                response = await client.post(
+                    "/predictions/upload", headers=headers, files={"image_file": ("image.jpg", payload)}
+                )
+                latencies.append(time.perf_counter() - started)
+                response.raise_for_status()
+
+        # Warm up code paths before measuring
+        await asyncio.gather(*(one_request() for _ in range(min(50, requests))))
+        latencies.clear()
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one_request() for _ in range(requests)))
+        elapsed = time.perf_counter() - started
+
+    return summarize_latencies(latencies, elapsed)
+
+
+async def run(args) -> dict:
+    payload = os.urandom(args.upload_kb * 1024)
+    variants = {
+        "no_middleware": [],
+        "base_http_middleware": [BaseHTTPAuthMiddleware, BaseHTTPExceptionLoggingMiddleware],
+        "pure_asgi_middleware": [AuthMiddleware, ExceptionLoggingMiddleware],
+    }
+    return {
+        name: await measure(create_benchmark_app(middlewares), args.requests, args.concurrency, payload)
+        for name, middlewares in variants.items()
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--upload-kb", type=int, default=256)
+    parser.add_argument("--output", help="Also write the JSON report to this file")
+    args = parser.parse_args()
+
+    write_report("middleware_overhead", asyncio.run(run(args)), args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+"""
+Forward pass time per batch size of tiny generated Keras stand-in models,
+comparing keras Model.predict with the compiled inference wrapper.
+
+    python -m benchmarks.model_forward --batch-sizes 1 2 4 8 16 --repeat 30
+"""
+import argparse
+
+from benchmarks.common import configure_environment, time_calls, write_report
+
+configure_environment()
+
+import numpy as np  # noqa: E402
+
+from app.services.inference_service import CompiledClassifier  # noqa: E402
+from benchmarks.stand_in_models import tiny_keras_model  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32])
+    parser.add_argument("--repeat", type=int, default=30)
+    parser.add_argument("--input-size", type=int, default=224)
+    parser.add_argument("--output", help="Also write the JSON report to this file")
+    args = parser.parse_args()
+
+    results = {}
+    for name, outputs in (("binary", 1), ("multiclass", 13)):
+        model = tiny_keras_model(f"{name}_stand_in", args.input_size, outputs)
+        compiled = CompiledClassifier(model, max(args.batch_sizes))
+        compiled.warmup()
+
+        for batch_size in args.batch_sizes:
+            batch = np.random.default_rng(0).random(
+                (batch_size, args.input_size, args.input_size, 3), dtype=np.float32
+            ) * 255
+            results[f"{name}/keras_predict/batch_{batch_size}"] = time_calls(
+                lambda: model.predict(batch, verbose=0), args.repeat, items_per_call=batch_size
+            )
+            results[f"{name}/compiled/batch_{batch_size}"] = time_calls(
+                lambda: compiled.predict(batch), args.repeat, items_per_call=batch_size
+            )
+
+    write_report("model_forward", results, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""
+Micro-benchmark of prepare_input_tensor over the sample images and generated images
+of several sizes and formats.
+
+    python -m benchmarks.preprocessing --repeat 50 --input-size 224 --decoder turbojpeg
+"""
+import argparse
+import io
+
+from benchmarks.common import configure_environment, sample_image_paths, time_calls, write_report
+
+configure_environment()
+
+import numpy as np  # noqa: E402
+from PIL import Image  # noqa: E402
+
+from app.services.image_decoders import IMAGE_DECODERS, get_image_decoder  # noqa: E402
+from app.services.prediction_service import prepare_input_tensor, settings  # noqa: E402
+
+GENERATED_SIZES = [(640, 480), (1920, 1080), (4000, 3000)]
+GENERATED_FORMATS = ["JPEG", "PNG", "WEBP"]
+
+
+def generated_image(size: tuple[int, int], image_format: str) -> bytes:
+    # Noise compresses poorly, which keeps decode costs close to real photos
+    pixels = np.random.default_rng(0).integers(0, 256, (size[1], size[0], 3), dtype=np.uint8)
+    content = io.BytesIO()
+    Image.fromarray(pixels).save(content, format=image_format)
+    return content.getvalue()
+
+
+def benchmark_images() -> dict[str, bytes]:
+    images = {path.name: path.read_bytes() for path in sample_image_paths()}
+    for size in GENERATED_SIZES:
+        for image_format in GENERATED_FORMATS:
+            images[f"generated_{size[0]}x{size[1]}.{image_format.lower()}"] = generated_image(size, image_format)
+    return images
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--input-size", type=int, default=224)
+    parser.add_argument("--decoder", choices=["auto", *IMAGE_DECODERS], default="auto")
+    parser.add_argument("--output", help="Also write the JSON report to this file")
+    args = parser.parse_args()
+
+    settings.prediction_decoder_backend = args.decoder
+    get_image_decoder.cache_clear()
+
+    target_size = (args.input_size, args.input_size)
+    buffer = np.empty((1, args.input_size, args.input_size, 3), dtype=np.float32)
+
+    results = {}
+    for name, image_data in benchmark_images().items():
+        result = time_calls(lambda: prepare_input_tensor(image_data, target_size, buffer), args.repeat)
+        result["bytes"] = len(image_data)
+        results[name] = result
+
+    write_report("preprocessing", {"decoder": get_image_decoder().name, "images": results}, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+import numpy as np
+
+
+class NumpyStandInModel:
+    """
+    Model with the interface PredictionService expects, without TensorFlow.
+    Its cost grows with the batch like a real forward pass, through a reduction over every pixel.
+    """
+
+    def __init__(self, name: str, input_size: int, outputs: int):
+        self.name = name
+        self.input_shape = (None, input_size, input_size, 3)
+        self._weights = np.random.default_rng(0).random((3, outputs), dtype=np.float32)
+
+    def warmup(self):
+        self.predict(np.zeros((1, *self.input_shape[1:]), dtype=np.float32))
+
+    def predict(self, batch):
+        features = batch.mean(axis=(1, 2)) / 255
+        logits = features @ self._weights
+        if logits.shape[1] == 1:
+            return 1 / (1 + np.exp(-logits))
+        exponentials = np.exp(logits - logits.max(axis=1, keepdims=True))
+        return exponentials / exponentials.sum(axis=1, keepdims=True)
+
+
+def tiny_keras_model(name: str, input_size: int, outputs: int):
+    # Small convolutional network standing in for the real classifiers, built without any trained weights
+    import keras
+
+    return keras.Sequential([
+        keras.Input(shape=(input_size, input_size, 3)),
+        keras.layers.Rescaling(1 / 255),
+        keras.layers.Conv2D(16, 3, strides=2, activation="relu"),
+        keras.layers.Conv2D(32, 3, strides=2, activation="relu"),
+        keras.layers.Conv2D(64, 3, strides=2, activation="relu"),
+        keras.layers.GlobalAveragePooling2D(),
+        keras.layers.Dense(outputs, activation="sigmoid" if outputs == 1 else "softmax"),
+    ], name=name)
+
+
+def stand_in_models(kind: str, input_size: int, max_batch_size: int):
+    """
+    Returns (binary model, multiclass model) stand-ins, either numpy ones or tiny compiled Keras ones.
+    """
+    if kind == "numpy":
+        return (
+            NumpyStandInModel("binary_stand_in", input_size, 1),
+            NumpyStandInModel("multiclass_stand_in", input_size, 13),
+        )
+
+    from app.services.inference_service import CompiledClassifier
+    return (
+        CompiledClassifier(tiny_keras_model("binary_stand_in", input_size, 1), max_batch_size),
+        CompiledClassifier(tiny_keras_model("multiclass_stand_in", input_size, 13), max_batch_size),
+    )
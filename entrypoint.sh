@@ -1,3 +1,5 @@
 #!/bin/sh
 export APP_PORT="${APP_PORT:-$FALLBACK_PORT}"
-exec python -m app.main
\ No newline at end of file
+export APP_WORKERS="${APP_WORKERS:-1}"
+
+exec python -m app.main